@@ -1,20 +1,183 @@
 const express    = require('express')
 const app = express()
-const { exec } = require('child_process')
+const { spawn } = require('child_process')
+const os = require('os')
+const path = require('path')
+const readline = require('readline')
 const bodyParser = require('body-parser')
 const cors = require('cors')
-const fs = require('fs')
-const { Store } = require("fs-json-store");
 const moment = require('moment')
-const stringHash = require("string-hash");
 
-// Creating data cache directory for the current deployment
-const upTime = new Date().toISOString()
-const DATA_DIR = `./data/production`
-if (!fs.existsSync(DATA_DIR)){
-    fs.mkdirSync(DATA_DIR);
+// Pool of long-lived ../simulation/worker.py processes, so that a simulation
+// does not have to wait for Python to start and import its dependencies.
+const WORKERS = parseInt(process.env.SIMULATION_WORKERS) || os.cpus().length
+const MAX_QUEUE = parseInt(process.env.SIMULATION_MAX_QUEUE) || 32
+const JOB_TIMEOUT = parseInt(process.env.SIMULATION_JOB_TIMEOUT) || 170000 // just under the 3min server timeout
+// A worker that dies (or cannot be started) is respawned after
+// RESPAWN_DELAY, doubled for every other one that died since a worker last
+// answered, up to MAX_RESPAWN_DELAY. After MAX_RESPAWNS of them the pool gives
+// up on respawning.
+const RESPAWN_DELAY = 1000
+const MAX_RESPAWN_DELAY = 60000
+const MAX_RESPAWNS = parseInt(process.env.SIMULATION_MAX_RESPAWNS) || 10
+// The workers keep the results of every configuration they have simulated
+// here (see ../simulation/cache.py), shared between them and across restarts.
+const CACHE_DIR = process.env.SIMULATION_CACHE_DIR || path.resolve('./data/results')
+
+class WorkerPool {
+    constructor(size, maxQueue, jobTimeout, maxRespawns) {
+        this.maxQueue = maxQueue
+        this.jobTimeout = jobTimeout
+        this.maxRespawns = maxRespawns
+        this.queue = []
+        this.nextId = 0
+        this.workers = []
+        // Workers that died since a worker last answered, and respawns waiting
+        // for their delay
+        this.failures = 0
+        this.respawning = 0
+        for (let i = 0; i < size; i++) this.workers.push(this.spawnWorker())
+    }
+
+    spawnWorker() {
+        const worker = {
+            proc: spawn('python3', ['worker.py'], {
+                cwd: '../simulation',
+                env: Object.assign({}, process.env, { SIMULATION_CACHE_DIR: CACHE_DIR })
+            }),
+            job: null
+        }
+        // python3 could not be started, or the worker died before reading its
+        // job (EPIPE)
+        worker.proc.on('error', e => this.retire(worker, e))
+        worker.proc.stdin.on('error', e => this.retire(worker, e))
+        worker.proc.stderr.on('data', data => process.stderr.write(data))
+        readline.createInterface({ input: worker.proc.stdout }).on('line', line => {
+            let response
+            try {
+                response = JSON.parse(line)
+            } catch (e) {
+                return console.log('worker: unexpected output', line)
+            }
+            const job = worker.job
+            if (!job || job.id !== response.id) return
+            this.failures = 0
+            if (response.progress) {
+                if (job.onProgress) job.onProgress(response.progress)
+                return
+            }
+            this.finish(worker, response.error ? new Error(response.error) : null, response.result)
+        })
+        worker.proc.on('exit', code => this.retire(worker, new Error('worker exited with code ' + code)))
+        return worker
+    }
+
+    // A worker died: its job fails, and it is respawned after a delay that
+    // grows with the failures in a row, unless there were too many of them.
+    retire(worker, error) {
+        if (worker.retired) return
+        worker.retired = true
+        console.log('worker failed:', error.message)
+        worker.proc.kill()
+        this.workers = this.workers.filter(w => w !== worker)
+        if (worker.job) this.finish(worker, error)
+        if (++this.failures > this.maxRespawns) {
+            console.log('workers failed', this.failures, 'times in a row, not respawning')
+            return this.failIfNoWorkers()
+        }
+        this.respawning++
+        setTimeout(() => {
+            this.respawning--
+            this.workers.push(this.spawnWorker())
+            this.dispatch()
+        }, Math.min(RESPAWN_DELAY * 2 ** (this.failures - 1), MAX_RESPAWN_DELAY))
+    }
+
+    // Rejects every queued job if no worker is left to run them.
+    failIfNoWorkers() {
+        if (this.workers.length || this.respawning) return
+        for (const job of this.queue.splice(0)) {
+            clearTimeout(job.timer)
+            job.reject(this.noWorkersError())
+        }
+    }
+
+    noWorkersError() {
+        const e = new Error('no simulation workers left')
+        e.code = 'NO_WORKERS'
+        return e
+    }
+
+    // Resolves with the result dict of simrunner.py, or rejects with an error
+    // whose code is 'QUEUE_FULL', 'NO_WORKERS', 'TIMEOUT', 'CANCELLED' or
+    // undefined (the job failed). The timeout counts from now, time spent
+    // waiting in the queue included. With args.stream, onProgress is called
+    // with every timestep's values as they come. Aborting signal cancels the
+    // job, killing its worker if it is already running.
+    run(args, { onProgress, signal } = {}) {
+        return new Promise((resolve, reject) => {
+            if (this.queue.length >= this.maxQueue) {
+                const e = new Error('too many simulations queued')
+                e.code = 'QUEUE_FULL'
+                return reject(e)
+            }
+            if (!this.workers.length && !this.respawning) return reject(this.noWorkersError())
+            const job = { id: this.nextId++, args, onProgress, resolve, reject }
+            job.timer = setTimeout(() => {
+                const e = new Error('simulation timed out')
+                e.code = 'TIMEOUT'
+                this.cancel(job, e)
+            }, this.jobTimeout)
+            if (signal) signal.addEventListener('abort', () => {
+                const e = new Error('simulation cancelled')
+                e.code = 'CANCELLED'
+                this.cancel(job, e)
+            })
+            this.queue.push(job)
+            this.dispatch()
+        })
+    }
+
+    cancel(job, error) {
+        if (this.queue.includes(job)) {
+            this.queue = this.queue.filter(j => j !== job)
+            clearTimeout(job.timer)
+            return job.reject(error)
+        }
+        const worker = this.workers.find(w => w.job === job)
+        if (worker) this.abandon(worker, error)
+    }
+
+    // Kills a worker that is still busy with its job and replaces it.
+    abandon(worker, error) {
+        worker.retired = true
+        worker.proc.kill()
+        this.workers = this.workers.filter(w => w !== worker)
+        this.workers.push(this.spawnWorker())
+        this.finish(worker, error)
+    }
+
+    dispatch() {
+        for (const worker of this.workers) {
+            if (worker.job || this.queue.length === 0) continue
+            const job = this.queue.shift()
+            worker.job = job
+            worker.proc.stdin.write(JSON.stringify({ id: job.id, args: job.args }) + '\n')
+        }
+    }
+
+    finish(worker, error, result) {
+        const job = worker.job
+        worker.job = null
+        clearTimeout(job.timer)
+        if (error) job.reject(error)
+        else job.resolve(result)
+        this.dispatch()
+    }
 }
 
+const pool = new WorkerPool(WORKERS, MAX_QUEUE, JOB_TIMEOUT, MAX_RESPAWNS)
+
 app.use(cors())
 app.use(bodyParser.json())
 
@@ -22,56 +185,92 @@ const server = app.listen(5000)
 
 server.setTimeout(180000) // 3min
 
+// Turns the request body into worker arguments, and the simrunner.py command
+// line they stand for (for the logs). Results are cached by the workers, see
+// CACHE_DIR.
+function simulationRequest(body) {
+    let command = `python3 ../simulation/simrunner.py `;
+    const args = {}
+    ;[
+        'hatchers',
+        'proposals',
+        'hatch_tribute',
+        'vesting_80p_unlocked',
+        'exit_tribute',
+        'kappa',
+        'days_to_80p_of_max_voting_weight',
+        'max_proposal_request',
+        'timesteps_days',
+        'random_seed'
+    ].forEach(arg => {
+        if (!body[arg]) {
+            throw new Error('missing parameter : ' + arg)
+        }
+        args[arg] = body[arg]
+        command += '--' + arg + ' ' + body[arg] + ' '
+    })
+    return { args, command }
+}
+
 app.post('/cadcad', function(req, res) {
     console.log('/cadcad', req.body)
-    let SIMULATION_COMMAND = `python3 ../simulation/simrunner.py `;
+    let SIMULATION_COMMAND, args
     try {
-        [
-            'hatchers',
-            'proposals',
-            'hatch_tribute',
-            'vesting_80p_unlocked',
-            'exit_tribute',
-            'kappa',
-            'days_to_80p_of_max_voting_weight',
-            'max_proposal_request',
-            'timesteps_days',
-            'random_seed'
-        ].forEach(arg => {
-            if (!req.body[arg]) {
-                throw new Error('missing parameter : ' + arg)
-            }
-            return SIMULATION_COMMAND += '--' + arg + ' ' + req.body[arg] + ' '
-        })
+        ({ args, command: SIMULATION_COMMAND } = simulationRequest(req.body))
     } catch (e) {
         return res.status(400).send(e.message)
     }
 
-    const simulationId = stringHash(SIMULATION_COMMAND)
-    const cacheFile = `${DATA_DIR}/${simulationId}.json`
-    if (!fs.existsSync(cacheFile)) {
-        console.log(SIMULATION_COMMAND + ' PROCESSING')
-        const startTime = moment()
-        exec(SIMULATION_COMMAND, (error, stdout, stderr) => {
-            console.log(req.body, stdout, error, stderr)
-            const endTime = moment()
-            var timeDiff = endTime.diff(startTime, 'seconds')
-            console.log('Total execution time (sec): ', timeDiff)
-            if (error) return res.status(500).send(stderr)
-            try {
-                const lines = stdout.split(/\n/).filter(n => n)
-                const json_output = JSON.parse(lines[lines.length - 1])
-                const store = new Store({file: cacheFile})
-                store.write([req.body, json_output, { execTimeinSec: timeDiff }])
-                res.json(json_output)
-            } catch (e) {
-                if (e) res.status(500).send(stdout)
-            }
+    console.log(SIMULATION_COMMAND + ' PROCESSING')
+    const startTime = moment()
+    pool.run(args).then(json_output => {
+        const endTime = moment()
+        var timeDiff = endTime.diff(startTime, 'seconds')
+        console.log('Total execution time (sec): ', timeDiff)
+        res.json(json_output)
+    }).catch(e => {
+        console.log(req.body, e.message)
+        if (e.code === 'QUEUE_FULL' || e.code === 'NO_WORKERS') return res.status(503).send(e.message)
+        if (e.code === 'TIMEOUT') return res.status(504).send(e.message)
+        res.status(500).send(e.message)
+    })
+});
 
-        })
-    } else {
-        console.log(SIMULATION_COMMAND + ' CACHED')
-        const store = new Store({file: cacheFile})
-        store.read().then((data) => res.json(data[1]))
+// Same as /cadcad, but answers with newline delimited JSON: one
+// {"timestep", "funding_pool", "token_price", "sentiment"} line per timestep as
+// soon as it is simulated, then a {"result": ...} line with what /cadcad
+// returns (or an {"error": ...} line). Closing the connection cancels the
+// simulation.
+app.post('/cadcad/stream', function(req, res) {
+    console.log('/cadcad/stream', req.body)
+    let SIMULATION_COMMAND, args
+    try {
+        ({ args, command: SIMULATION_COMMAND } = simulationRequest(req.body))
+    } catch (e) {
+        return res.status(400).send(e.message)
     }
+
+    res.set('Content-Type', 'application/x-ndjson')
+    console.log(SIMULATION_COMMAND + ' STREAMING')
+    const startTime = moment()
+    const controller = new AbortController()
+    res.on('close', () => {
+        if (!res.writableFinished) controller.abort()
+    })
+    pool.run(Object.assign({}, args, { stream: true }), {
+        onProgress: progress => res.write(JSON.stringify(progress) + '\n'),
+        signal: controller.signal
+    }).then(json_output => {
+        const timeDiff = moment().diff(startTime, 'seconds')
+        console.log('Total execution time (sec): ', timeDiff)
+        res.end(JSON.stringify({ result: json_output }) + '\n')
+    }).catch(e => {
+        console.log(req.body, e.message)
+        if (e.code === 'CANCELLED') return
+        if (!res.headersSent) {
+            if (e.code === 'QUEUE_FULL' || e.code === 'NO_WORKERS') return res.status(503).send(e.message)
+            if (e.code === 'TIMEOUT') return res.status(504).send(e.message)
+        }
+        res.end(JSON.stringify({ error: e.message }) + '\n')
+    })
 });
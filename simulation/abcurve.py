@@ -1,3 +1,5 @@
+import numpy as np
+
 # value function for a given state (reserve,supply)
 def invariant(reserve, supply, kappa):
     return (supply**kappa)/reserve
@@ -75,3 +77,21 @@ class AugmentedBondingCurve:
 
     def get_token_supply(self, current_reserve):
         return supply(current_reserve, self.kappa, self.invariant)
+
+    # What-if analysis: the same equations over arrays of amounts (or of
+    # reserves), evaluated at once by NumPy instead of call by call. Each
+    # element is what deposit()/burn()/get_token_price() would return for it
+    # alone, against the same reserve and supply, give or take the ulp or so
+    # that NumPy's power may round differently.
+
+    def deposit_many(self, dai, current_reserve, current_token_supply):
+        # Returns the tokens each amount of DAI would mint, and their realized prices
+        return mint(np.asarray(dai, dtype=float), current_reserve, current_token_supply, self.kappa, self.invariant)
+
+    def burn_many(self, tokens_millions, current_reserve, current_token_supply):
+        # Returns the DAI each amount of tokens would return (excluding exit tribute), and their realized prices
+        return withdraw(np.asarray(tokens_millions, dtype=float), current_reserve, current_token_supply, self.kappa,
+                        self.invariant)
+
+    def get_token_prices(self, reserves):
+        return spot_price(np.asarray(reserves, dtype=float), self.kappa, self.invariant)
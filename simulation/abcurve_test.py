@@ -1,6 +1,8 @@
 from abcurve import AugmentedBondingCurve, invariant, supply, spot_price, mint, withdraw
 import unittest
 
+import numpy as np
+
 
 class TestOriginalEquations(unittest.TestCase):
     def test_magnitude_orders(self):
@@ -48,3 +50,44 @@ class TestAugmentedBondingCurve(unittest.TestCase):
         dai_million_returned, realized_price = abc.burn(0.5, 1, 1)
         self.assertEqual(dai_million_returned, 0.75)
         self.assertEqual(realized_price, 1.5)
+
+
+class TestAugmentedBondingCurveMany(unittest.TestCase):
+    """
+    The array versions against the scalar functions, over amounts and reserves
+    spanning many orders of magnitude. NumPy's power may round differently
+    from Python's by an ulp or so. The minted tokens and returned DAI are a
+    difference between two supplies (reserves), so that ulp is one of the
+    supply (reserve), and the realized price of a tiny amount inherits it.
+    """
+    def assertWithinUlps(self, actual, expected, magnitude, realized_prices, expected_prices):
+        bound = 1e-13 * magnitude
+        self.assertLessEqual(np.max(np.abs(actual - expected)), bound)
+        self.assertTrue(np.all(np.abs(realized_prices - expected_prices) <= expected_prices * bound / np.abs(expected)))
+
+    def setUp(self):
+        self.reserve = 3e6
+        self.supply = 1.2e6
+        self.amounts = np.geomspace(1e-3, 1e6, 200)
+
+    def test_deposit_many(self):
+        for kappa in [2, 3, 6]:
+            abc = AugmentedBondingCurve(self.reserve, self.supply, kappa=kappa)
+            tokens, realized_prices = abc.deposit_many(self.amounts, self.reserve, self.supply)
+            expected = np.array([abc.deposit(dai, self.reserve, self.supply) for dai in self.amounts])
+            self.assertWithinUlps(tokens, expected[:, 0], self.supply, realized_prices, expected[:, 1])
+
+    def test_burn_many(self):
+        for kappa in [2, 3, 6]:
+            abc = AugmentedBondingCurve(self.reserve, self.supply, kappa=kappa)
+            amounts = self.amounts[self.amounts < self.supply]
+            dai, realized_prices = abc.burn_many(amounts, self.reserve, self.supply)
+            expected = np.array([abc.burn(tokens, self.reserve, self.supply) for tokens in amounts])
+            self.assertWithinUlps(dai, expected[:, 0], self.reserve, realized_prices, expected[:, 1])
+
+    def test_get_token_prices(self):
+        abc = AugmentedBondingCurve(self.reserve, self.supply, kappa=2)
+        reserves = np.geomspace(1, 1e9, 200)
+        np.testing.assert_allclose(abc.get_token_prices(reserves), [abc.get_token_price(r) for r in reserves],
+                                   rtol=1e-12)
+        self.assertEqual(abc.get_token_prices([1, 2]).tolist(), [2 / abc.invariant**.5, 2.8284271247461903 / abc.invariant**.5])
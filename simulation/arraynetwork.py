@@ -0,0 +1,714 @@
+"""
+ArrayNetwork is an alternative state backend to the networkx DiGraph that the
+simulation normally runs on.
+
+Participants, Proposals and support edges are kept in struct-of-arrays NumPy
+columns, and every node/edge gets a stable integer row that never changes while
+it is alive. The Participant/Proposal objects themselves are still stored
+alongside (the policies call their methods), but anything that only needs to
+know what kind of node something is, or what is stored on a support edge, is
+answered from the columns instead of walking a filtered subgraph view.
+
+The ids of Participants, and of Proposals grouped by ProposalStatus, are also
+kept in incremental indexes that are updated as nodes are added/removed and as
+Proposals change status, so asking for e.g. the CANDIDATE Proposals costs
+O(result) instead of O(nodes). The aggregates that the policies ask for every
+substep (average sentiment, median affinity, total funds requested) are kept
+up to date the same way, see avg_sentiment().
+
+ArrayNetwork implements the subset of the nx.DiGraph API that the policies and
+network_utils use (network.nodes[i]["item"], network.edges[i, j]["support"],
+network[i][j], network.adj, in_edges(), add_node(), add_edge(), remove_node()
+...), so the existing policies run against it unchanged. The DiGraph is only
+materialised on demand, through to_digraph().
+"""
+from array import array
+from bisect import bisect_left, insort
+from collections.abc import Mapping, MutableMapping
+from functools import partial
+from typing import List, Tuple
+
+import networkx as nx
+import numpy as np
+
+from entities import Participant, ParticipantSupport, Proposal, ProposalStatus
+
+NODE_OTHER = 0
+NODE_PARTICIPANT = 1
+NODE_PROPOSAL = 2
+
+INITIAL_CAPACITY = 64
+
+
+def _node_kind(item) -> int:
+    if isinstance(item, Participant):
+        return NODE_PARTICIPANT
+    if isinstance(item, Proposal):
+        return NODE_PROPOSAL
+    return NODE_OTHER
+
+
+def _grow(column: np.ndarray, size: int) -> np.ndarray:
+    """
+    Returns a copy of column with room for at least size rows, doubling the
+    capacity so that appending stays amortized O(1).
+    """
+    capacity = len(column)
+    if size <= capacity:
+        return column
+    while capacity < size:
+        capacity *= 2
+    grown = np.zeros(capacity, dtype=column.dtype)
+    grown[:len(column)] = column
+    return grown
+
+
+def _copy_graph_attrs(graph: dict) -> dict:
+    """
+    Copies the graph attributes that the network changes in place, so that a
+    converted network does not share them with the original. token_batches is
+    shared, like the Participants whose holdings it keeps.
+    """
+    attrs = dict(graph)
+    if "latent_affinities" in attrs:
+        attrs["latent_affinities"] = {idx: array("d", a) for idx, a in attrs["latent_affinities"].items()}
+    if "archived_support" in attrs:
+        attrs["archived_support"] = dict(attrs["archived_support"])
+    if "votes" in attrs:
+        candidates, votes = attrs["votes"]
+        attrs["votes"] = (candidates, dict(votes))
+    return attrs
+
+
+class SupportEdge(MutableMapping):
+    """
+    Dict-like view of a single support edge, so that code written against the
+    DiGraph (edge["support"], edge["type"]) keeps working. Reading "support"
+    builds a ParticipantSupport out of the columns, writing it stores the
+    fields back into the columns.
+    """
+    __slots__ = ("_network", "_row")
+    _keys = ("support", "type")
+
+    def __init__(self, network, row: int):
+        self._network = network
+        self._row = row
+
+    def __getitem__(self, key):
+        if key == "type":
+            return "support"
+        if key == "support":
+            return self._network._get_support(self._row)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == "support":
+            self._network._set_support(self._row, value)
+        elif key == "type":
+            if value != "support":
+                raise ValueError("A support edge cannot be changed into a {} edge".format(value))
+        else:
+            raise KeyError(key)
+
+    def __delitem__(self, key):
+        raise TypeError("Attributes of a support edge cannot be deleted")
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class NodeDataView:
+    """
+    Mimics networkx's NodeDataView: iterating gives (idx, data) pairs, and
+    indexing gives the data of a single node.
+    """
+
+    def __init__(self, network, data, default=None):
+        self._network = network
+        self._data = data
+        self._default = default
+
+    def __iter__(self):
+        for idx, attrs in self._network._node_items():
+            yield idx, attrs.get(self._data, self._default)
+
+    def __len__(self):
+        return len(self._network)
+
+    def __getitem__(self, idx):
+        return self._network.nodes[idx].get(self._data, self._default)
+
+    def __contains__(self, idx):
+        return idx in self._network
+
+
+class NodeView(Mapping):
+    def __init__(self, network):
+        self._network = network
+
+    def __getitem__(self, idx):
+        return self._network._node_attrs[self._network._row_of[idx]]
+
+    def __iter__(self):
+        return iter(list(self._network._row_of))
+
+    def __len__(self):
+        return len(self._network._row_of)
+
+    def __contains__(self, idx):
+        return idx in self._network._row_of
+
+    def __call__(self, data=False, default=None):
+        if data is False:
+            return self
+        if data is True:
+            return list(self._network._node_items())
+        return NodeDataView(self._network, data, default)
+
+
+class EdgeView:
+    def __init__(self, network):
+        self._network = network
+
+    def __getitem__(self, e):
+        return self._network._edge_attrs(self._network._edge_row(*e))
+
+    def __iter__(self):
+        return iter(self._network._edge_list())
+
+    def __len__(self):
+        return len(self._network._edge_row_of)
+
+    def __contains__(self, e):
+        return tuple(e) in self._network._edge_row_of
+
+    def __call__(self, data=False, default=None):
+        return self._network._edge_list(data=data, default=default)
+
+
+class AdjacencyView(Mapping):
+    """
+    The successors of one node, and the edge attributes leading to them.
+    network[i][j] and network.adj[i][j] both end up here.
+    """
+
+    def __init__(self, network, edges: dict):
+        self._network = network
+        self._edges = edges
+
+    def __getitem__(self, j):
+        return self._network._edge_attrs(self._edges[j])
+
+    def __iter__(self):
+        return iter(list(self._edges))
+
+    def __len__(self):
+        return len(self._edges)
+
+    def __contains__(self, j):
+        return j in self._edges
+
+
+class AdjacencyOuterView(Mapping):
+    def __init__(self, network):
+        self._network = network
+
+    def __getitem__(self, i):
+        return self._network[i]
+
+    def __iter__(self):
+        return iter(self._network.nodes)
+
+    def __len__(self):
+        return len(self._network)
+
+
+class ArrayNetwork:
+    def __init__(self):
+        # Node columns. A node's row never changes while it is alive; removed
+        # nodes leave a dead row behind.
+        self._node_count = 0
+        self._node_id = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self._node_kind = np.zeros(INITIAL_CAPACITY, dtype=np.int8)
+        self._node_alive = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self._node_attrs = []
+        self._row_of = {}
+
+        # Per node row: {neighbour idx: edge row}, in insertion order (just
+        # like DiGraph's adjacency dicts).
+        self._succ = []
+        self._pred = []
+
+        # Incremental indexes, dicts used as insertion ordered sets of node
+        # ids. Proposals tell the network about status transitions through
+        # the observer kept in _status_observer_of.
+        self._participant_ids = {}
+        self._proposal_ids_by_status = {status: {} for status in ProposalStatus}
+        self._status_observer_of = {}
+
+        # Participants' sentiment per node row, kept up to date through the
+        # observers in _sentiment_observer_of.
+        self._sentiment = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        self._sentiment_observer_of = {}
+
+        # Cached aggregates, None when they have to be computed again.
+        self._avg_sentiment = None
+        self._total_funds_requested = None
+        self.avg_sentiment_recomputations_avoided = 0
+
+        # Edge columns. Support edges keep their ParticipantSupport fields in
+        # the columns, other edge types (conflict, influence) keep a plain
+        # attribute dict in _edge_extra.
+        self._edge_count = 0
+        self._edge_src = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self._edge_dst = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self._edge_alive = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self._edge_is_support = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self._affinity = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        self._tokens = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        self._conviction = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        self._is_author = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self._edge_extra = []
+        self._edge_row_of = {}
+
+        # The affinities of all live support edges, sorted, for the median.
+        # With sparse support edges, the latent affinities of the edges that
+        # were not created are counted too.
+        self._affinity_counted = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self._sorted_affinities = []
+
+        # Graph attributes, like DiGraph.graph
+        self.graph = {}
+
+    def __repr__(self):
+        return "<{} with {} nodes and {} edges>".format(self.__class__.__name__, len(self), len(self._edge_row_of))
+
+    # DiGraph compatible API
+    def __len__(self):
+        return len(self._row_of)
+
+    def __iter__(self):
+        return iter(list(self._row_of))
+
+    def __contains__(self, idx):
+        return idx in self._row_of
+
+    def __getitem__(self, idx):
+        return AdjacencyView(self, self._succ[self._row_of[idx]])
+
+    @property
+    def nodes(self) -> NodeView:
+        return NodeView(self)
+
+    @property
+    def edges(self) -> EdgeView:
+        return EdgeView(self)
+
+    @property
+    def adj(self) -> AdjacencyOuterView:
+        return AdjacencyOuterView(self)
+
+    def number_of_nodes(self) -> int:
+        return len(self)
+
+    def number_of_edges(self) -> int:
+        return len(self._edge_row_of)
+
+    def has_node(self, idx) -> bool:
+        return idx in self._row_of
+
+    def has_edge(self, i, j) -> bool:
+        return (i, j) in self._edge_row_of
+
+    def get_edge_data(self, i, j, default=None):
+        if (i, j) not in self._edge_row_of:
+            return default
+        return self._edge_attrs(self._edge_row_of[(i, j)])
+
+    def add_node(self, idx, **attr):
+        if idx in self._row_of:
+            row = self._row_of[idx]
+            self._unindex_node(idx, row)
+            self._node_attrs[row].update(attr)
+            self._node_kind[row] = _node_kind(self._node_attrs[row].get("item"))
+            self._index_node(idx, row)
+            return
+
+        row = self._node_count
+        self._ensure_node_capacity(row + 1)
+        self._node_id[row] = idx
+        self._node_kind[row] = _node_kind(attr.get("item"))
+        self._node_alive[row] = True
+        self._node_attrs.append(dict(attr))
+        self._succ.append({})
+        self._pred.append({})
+        self._row_of[idx] = row
+        self._node_count += 1
+        self._index_node(idx, row)
+
+    def add_edge(self, i, j, **attr):
+        """
+        Like DiGraph.add_edge(), adding an edge that already exists updates its
+        attributes in place, keeping its position in the adjacency order.
+
+        Unlike DiGraph.add_edge(), both nodes must already exist.
+        """
+        if i not in self._row_of or j not in self._row_of:
+            raise nx.NetworkXError("Both nodes of edge ({}, {}) must be added before the edge".format(i, j))
+
+        if (i, j) in self._edge_row_of:
+            row = self._edge_row_of[(i, j)]
+            if attr.get("type") == "support" and not self._edge_is_support[row]:
+                self._edge_is_support[row] = True
+                self._edge_extra[row] = None
+            self._update_edge(row, attr)
+            self._count_affinity(row)
+            return
+
+        row = self._edge_count
+        self._ensure_edge_capacity(row + 1)
+        src_row = self._row_of[i]
+        dst_row = self._row_of[j]
+        self._edge_src[row] = src_row
+        self._edge_dst[row] = dst_row
+        self._edge_alive[row] = True
+        self._edge_is_support[row] = attr.get("type") == "support"
+        self._affinity[row] = 0
+        self._tokens[row] = 0
+        self._conviction[row] = 0
+        self._is_author[row] = False
+        self._affinity_counted[row] = False
+        self._edge_extra.append(None if self._edge_is_support[row] else {})
+        self._edge_row_of[(i, j)] = row
+        self._succ[src_row][j] = row
+        self._pred[dst_row][i] = row
+        self._edge_count += 1
+        self._update_edge(row, attr)
+        self._count_affinity(row)
+
+    def remove_node(self, idx):
+        if idx not in self._row_of:
+            raise nx.NetworkXError("The node {} is not in the graph.".format(idx))
+        self._unindex_node(idx, self._row_of[idx])
+        row = self._row_of.pop(idx)
+        self._node_alive[row] = False
+
+        for j, edge_row in self._succ[row].items():
+            self._edge_alive[edge_row] = False
+            self._uncount_affinity(edge_row)
+            if self._edge_dst[edge_row] != row:
+                del self._pred[self._edge_dst[edge_row]][idx]
+            del self._edge_row_of[(idx, j)]
+        for i, edge_row in self._pred[row].items():
+            self._edge_alive[edge_row] = False
+            self._uncount_affinity(edge_row)
+            if self._edge_src[edge_row] != row:
+                del self._succ[self._edge_src[edge_row]][idx]
+            self._edge_row_of.pop((i, idx), None)
+        self._succ[row] = {}
+        self._pred[row] = {}
+        for affinity in self.graph.get("latent_affinities", {}).pop(idx, ()):
+            self._uncount(affinity)
+
+    def remove_edge(self, i, j):
+        if (i, j) not in self._edge_row_of:
+            raise nx.NetworkXError("The edge {}-{} is not in the graph".format(i, j))
+        row = self._edge_row_of.pop((i, j))
+        self._edge_alive[row] = False
+        self._uncount_affinity(row)
+        del self._succ[self._row_of[i]][j]
+        del self._pred[self._row_of[j]][i]
+
+    def in_edges(self, j, data=False, default=None):
+        pred = self._pred[self._row_of[j]]
+        if data is False:
+            return [(i, j) for i in pred]
+        if data is True:
+            return [(i, j, self._edge_attrs(row)) for i, row in pred.items()]
+        return [(i, j, self._edge_attrs(row).get(data, default)) for i, row in pred.items()]
+
+    def out_edges(self, i, data=False, default=None):
+        succ = self._succ[self._row_of[i]]
+        if data is False:
+            return [(i, j) for j in succ]
+        if data is True:
+            return [(i, j, self._edge_attrs(row)) for j, row in succ.items()]
+        return [(i, j, self._edge_attrs(row).get(data, default)) for j, row in succ.items()]
+
+    # Columnar queries, used by network_utils
+    def participants(self) -> List[Tuple[int, Participant]]:
+        return self._items_of(self._participant_ids)
+
+    def proposals(self, status=None) -> List[Tuple[int, Proposal]]:
+        if status:
+            return self._items_of(self._proposal_ids_by_status[status])
+        return self._items_of_kind(NODE_PROPOSAL)
+
+    def support_edge_rows(self, participant_idx: int = None) -> np.ndarray:
+        """
+        Returns the rows of all live support edges, ordered like DiGraph.edges()
+        would order them (by source node, then by insertion).
+        """
+        n = self._edge_count
+        mask = self._edge_alive[:n] & self._edge_is_support[:n]
+        if participant_idx is not None:
+            mask &= self._edge_src[:n] == self._row_of[participant_idx]
+        rows = np.flatnonzero(mask)
+        return rows[np.argsort(self._edge_src[rows], kind="stable")]
+
+    def support_edges(self, participant_idx: int = None) -> List[Tuple[int, int]]:
+        return self.edges_of_rows(self.support_edge_rows(participant_idx))
+
+    def support_edge_rows_to(self, status) -> np.ndarray:
+        """
+        Returns the rows of all live support edges that point to a Proposal
+        with the given status.
+        """
+        with_status = np.zeros(self._node_count, dtype=bool)
+        with_status[[self._row_of[idx] for idx in self._proposal_ids_by_status[status]]] = True
+        rows = self.support_edge_rows()
+        return rows[with_status[self._edge_dst[rows]]]
+
+    def update_conviction(self, alpha: float, status) -> np.ndarray:
+        """
+        conviction = tokens + alpha * prior conviction, computed in one go for
+        every support edge to a Proposal with the given status. Returns the
+        rows that were updated.
+        """
+        rows = self.support_edge_rows_to(status)
+        self._conviction[rows] = self._tokens[rows] + alpha * self._conviction[rows]
+        return rows
+
+    def edges_of_rows(self, rows: np.ndarray) -> List[Tuple[int, int]]:
+        return list(zip(self._node_id[self._edge_src[rows]].tolist(), self._node_id[self._edge_dst[rows]].tolist()))
+
+    def edges_by_type(self, edge_type: str, participant_idx: int = None) -> List[Tuple[int, int]]:
+        if edge_type == "support":
+            return self.support_edges(participant_idx)
+        return [(i, j) for i, j, t in self._edge_list(data="type")
+                if t == edge_type and (participant_idx is None or i == participant_idx)]
+
+    def affinities(self) -> np.ndarray:
+        return self._affinity[self.support_edge_rows()]
+
+    def avg_sentiment(self) -> float:
+        """
+        The average sentiment of the Participants. It is only computed again
+        after a Participant joined, left or changed its sentiment, and then
+        summed in node order like calc_avg_sentiment() does on a DiGraph, so
+        that the result is bit-for-bit the same.
+        """
+        if self._avg_sentiment is not None:
+            self.avg_sentiment_recomputations_avoided += 1
+        else:
+            n = self._node_count
+            rows = np.flatnonzero(self._node_alive[:n] & (self._node_kind[:n] == NODE_PARTICIPANT))
+            # cumsum adds one value after the other, unlike sum()
+            sentiment_total = np.cumsum(self._sentiment[rows])[-1] if len(rows) else 0.0
+            self._avg_sentiment = float(sentiment_total) / len(rows)
+        return self._avg_sentiment
+
+    def add_latent_affinity(self, participant_idx: int, affinity: float):
+        self.graph.setdefault("latent_affinities", {}).setdefault(participant_idx, array("d")).append(affinity)
+        insort(self._sorted_affinities, float(affinity))
+
+    def pop_latent_affinity(self, participant_idx: int) -> float:
+        affinity = self.graph["latent_affinities"][participant_idx].pop()
+        self._uncount(affinity)
+        return affinity
+
+    def median_affinity(self) -> float:
+        """
+        The median affinity of all support edges, from the sorted affinities
+        kept up to date as support edges come and go, in O(1).
+        """
+        affinities = self._sorted_affinities
+        if len(affinities) == 0:
+            raise Exception("The network has 0 support edges!")
+        middle = len(affinities) // 2
+        if len(affinities) % 2:
+            return np.float64(affinities[middle])
+        # The way np.median() averages the two middle values
+        return np.mean(affinities[middle - 1:middle + 1])
+
+    def total_funds_requested(self) -> float:
+        """
+        The funds requested by all CANDIDATE Proposals, only summed again after
+        a Proposal was added, removed or changed status.
+        """
+        if self._total_funds_requested is None:
+            self._total_funds_requested = np.sum(
+                [p.funds_requested for _, p in self.proposals(status=ProposalStatus.CANDIDATE)])
+        return self._total_funds_requested
+
+    def total_conviction(self, proposal_idx: int) -> float:
+        # Summed in the same order as DiGraph.in_edges(), so that the result is
+        # bit-for-bit the same as with the DiGraph backend.
+        pred = self._pred[self._row_of[proposal_idx]]
+        rows = [row for row in pred.values() if self._edge_is_support[row]]
+        return np.sum(self._conviction[rows])
+
+    def to_digraph(self) -> nx.DiGraph:
+        """
+        Materialises the network as a networkx DiGraph, e.g. for export or
+        plotting. The Participant/Proposal objects are shared, not copied.
+        """
+        g = nx.DiGraph()
+        g.graph.update(_copy_graph_attrs(self.graph))
+        for idx, attrs in self._node_items():
+            g.add_node(idx, **attrs)
+        for i, j, attrs in self._edge_list(data=True):
+            g.add_edge(i, j, **dict(attrs))
+        return g
+
+    @classmethod
+    def from_digraph(cls, g: nx.DiGraph):
+        n = cls()
+        n.graph.update(_copy_graph_attrs(g.graph))
+        latent_affinities = n.graph.pop("latent_affinities", {})
+        for idx, affinities in latent_affinities.items():
+            for affinity in affinities:
+                n.add_latent_affinity(idx, affinity)
+        for idx, attrs in g.nodes(data=True):
+            n.add_node(idx, **attrs)
+        for i, j, attrs in g.edges(data=True):
+            n.add_edge(i, j, **attrs)
+        return n
+
+    # Internals
+    def _ensure_node_capacity(self, size: int):
+        self._node_id = _grow(self._node_id, size)
+        self._node_kind = _grow(self._node_kind, size)
+        self._node_alive = _grow(self._node_alive, size)
+        self._sentiment = _grow(self._sentiment, size)
+
+    def _ensure_edge_capacity(self, size: int):
+        self._edge_src = _grow(self._edge_src, size)
+        self._edge_dst = _grow(self._edge_dst, size)
+        self._edge_alive = _grow(self._edge_alive, size)
+        self._edge_is_support = _grow(self._edge_is_support, size)
+        self._affinity = _grow(self._affinity, size)
+        self._tokens = _grow(self._tokens, size)
+        self._conviction = _grow(self._conviction, size)
+        self._is_author = _grow(self._is_author, size)
+        self._affinity_counted = _grow(self._affinity_counted, size)
+
+    def _node_items(self):
+        return [(idx, self._node_attrs[row]) for idx, row in self._row_of.items()]
+
+    def _items_of_kind(self, kind: int) -> list:
+        n = self._node_count
+        rows = np.flatnonzero(self._node_alive[:n] & (self._node_kind[:n] == kind))
+        return [(idx, self._node_attrs[row]["item"]) for idx, row in zip(self._node_id[rows].tolist(), rows.tolist())]
+
+    def _in_node_order(self, ids: dict) -> List[int]:
+        # Proposals join a status index when they transition, not in node
+        # order. Sorting only the ids in the index keeps this O(result) while
+        # still listing nodes in the same order as the DiGraph would.
+        return sorted(ids, key=self._row_of.__getitem__)
+
+    def _items_of(self, ids: dict) -> list:
+        return [(idx, self._node_attrs[self._row_of[idx]]["item"]) for idx in self._in_node_order(ids)]
+
+    def _index_node(self, idx, row: int):
+        item = self._node_attrs[row].get("item")
+        if self._node_kind[row] == NODE_PARTICIPANT:
+            self._participant_ids[idx] = None
+            self._sentiment[row] = item.sentiment
+            observer = partial(self._on_sentiment_change, row)
+            self._sentiment_observer_of[idx] = observer
+            item.observe_sentiment_changes(observer)
+            self._avg_sentiment = None
+        elif self._node_kind[row] == NODE_PROPOSAL:
+            self._proposal_ids_by_status[item.status][idx] = None
+            observer = partial(self._on_proposal_status_change, idx)
+            self._status_observer_of[idx] = observer
+            item.observe_status_changes(observer)
+            self._total_funds_requested = None
+
+    def _unindex_node(self, idx, row: int):
+        if self._node_kind[row] == NODE_PARTICIPANT:
+            del self._participant_ids[idx]
+            item = self._node_attrs[row]["item"]
+            item.unobserve_sentiment_changes(self._sentiment_observer_of.pop(idx))
+            self._avg_sentiment = None
+        elif self._node_kind[row] == NODE_PROPOSAL:
+            item = self._node_attrs[row]["item"]
+            del self._proposal_ids_by_status[item.status][idx]
+            item.unobserve_status_changes(self._status_observer_of.pop(idx))
+            self._total_funds_requested = None
+
+    def _on_proposal_status_change(self, idx, old_status, new_status):
+        del self._proposal_ids_by_status[old_status][idx]
+        self._proposal_ids_by_status[new_status][idx] = None
+        if ProposalStatus.CANDIDATE in (old_status, new_status):
+            self._total_funds_requested = None
+
+    def _on_sentiment_change(self, row, old_sentiment, new_sentiment):
+        self._sentiment[row] = new_sentiment
+        self._avg_sentiment = None
+
+    def _count_affinity(self, row: int):
+        if self._edge_is_support[row] and not self._affinity_counted[row]:
+            insort(self._sorted_affinities, float(self._affinity[row]))
+            self._affinity_counted[row] = True
+
+    def _uncount_affinity(self, row: int):
+        if self._affinity_counted[row]:
+            self._uncount(self._affinity[row])
+            self._affinity_counted[row] = False
+
+    def _uncount(self, affinity: float):
+        affinities = self._sorted_affinities
+        del affinities[bisect_left(affinities, float(affinity))]
+
+    def _edge_row(self, i, j) -> int:
+        try:
+            return self._edge_row_of[(i, j)]
+        except KeyError:
+            raise KeyError("The edge {}-{} is not in the graph.".format(i, j))
+
+    def _edge_attrs(self, row: int):
+        if self._edge_is_support[row]:
+            return SupportEdge(self, row)
+        return self._edge_extra[row]
+
+    def _edge_list(self, data=False, default=None) -> list:
+        answer = []
+        for i in self._row_of:
+            for j, row in self._succ[self._row_of[i]].items():
+                if data is False:
+                    answer.append((i, j))
+                elif data is True:
+                    answer.append((i, j, self._edge_attrs(row)))
+                else:
+                    answer.append((i, j, self._edge_attrs(row).get(data, default)))
+        return answer
+
+    def _update_edge(self, row: int, attr: dict):
+        if self._edge_is_support[row]:
+            if "support" in attr:
+                self._set_support(row, attr["support"])
+        else:
+            self._edge_extra[row].update(attr)
+
+    def _get_support(self, row: int) -> ParticipantSupport:
+        return ParticipantSupport(affinity=float(self._affinity[row]), tokens=float(self._tokens[row]),
+                                  conviction=float(self._conviction[row]), is_author=bool(self._is_author[row]))
+
+    def _set_support(self, row: int, support: ParticipantSupport):
+        recount = self._affinity_counted[row] and support.affinity != self._affinity[row]
+        if recount:
+            self._uncount_affinity(row)
+        self._affinity[row] = support.affinity
+        self._tokens[row] = support.tokens
+        self._conviction[row] = support.conviction
+        self._is_author[row] = support.is_author
+        if recount:
+            self._count_affinity(row)
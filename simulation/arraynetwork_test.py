@@ -0,0 +1,264 @@
+import copy
+import unittest
+
+import networkx as nx
+import numpy as np
+
+from arraynetwork import ArrayNetwork
+from entities import Participant, ParticipantSupport, Proposal, ProposalStatus
+from hatch import TokenBatch, VestingOptions
+from network_utils import (add_participant, add_proposal, archive_proposal, as_digraph, bootstrap_network,
+                           calc_avg_sentiment, calc_median_affinity, calc_total_conviction,
+                           calc_total_funds_requested,
+                           find_in_edges_of_type_for_proposal, get_edges_by_type, get_participants,
+                           get_proposals, get_proposals_by_participant_and_status,
+                           get_proposals_conviction_list, remove_participant, update_conviction)
+from utils import new_exponential_func, new_gamma_func, new_probability_func, new_random_number_func
+
+
+def new_networks(seed=1, sparse_support=False):
+    """
+    Returns the same bootstrapped network twice, once as a DiGraph and once as
+    an ArrayNetwork.
+    """
+    def bootstrap():
+        return bootstrap_network([TokenBatch(1000, 0, vesting_options=VestingOptions(10, 30)) for _ in range(6)],
+                                 4, 3000, 4e6, 0.2, new_probability_func(seed, legacy=True),
+                                 new_random_number_func(seed, legacy=True), new_gamma_func(seed, legacy=True),
+                                 new_exponential_func(seed, legacy=True), sparse_support=sparse_support)
+    return bootstrap(), ArrayNetwork.from_digraph(bootstrap())
+
+
+def described(items):
+    """
+    The two networks hold different (but equal) Participant/Proposal objects,
+    so compare their attributes instead.
+    """
+    return [(idx, repr(item)) for idx, item in items]
+
+
+class TestArrayNetwork(unittest.TestCase):
+    def setUp(self):
+        self.digraph, self.network = new_networks()
+
+    def test_from_digraph(self):
+        self.assertEqual(list(self.network.nodes), list(self.digraph.nodes))
+        self.assertEqual(list(self.network.edges), list(self.digraph.edges))
+        for i, j in self.digraph.edges:
+            self.assertEqual(self.network.edges[i, j]["type"], self.digraph.edges[i, j]["type"])
+            self.assertEqual(self.network.edges[i, j].get("support"), self.digraph.edges[i, j].get("support"))
+
+    def test_to_digraph(self):
+        g = self.network.to_digraph()
+        self.assertIsInstance(g, nx.DiGraph)
+        self.assertEqual(described(g.nodes(data="item")), described(self.digraph.nodes(data="item")))
+        self.assertEqual(list(g.edges(data=True)), list(self.digraph.edges(data=True)))
+        self.assertIs(as_digraph(self.digraph), self.digraph)
+
+    def test_network_utils_give_the_same_answers(self):
+        self.assertEqual(described(get_participants(self.network)), described(get_participants(self.digraph)))
+        self.assertEqual(described(get_proposals(self.network)), described(get_proposals(self.digraph)))
+        self.assertEqual(list(get_edges_by_type(self.network, "support")),
+                         list(get_edges_by_type(self.digraph, "support")))
+        self.assertEqual(list(get_edges_by_type(self.network, "support", 2)),
+                         list(get_edges_by_type(self.digraph, "support", 2)))
+        self.assertEqual(list(get_edges_by_type(self.network, "conflict")),
+                         list(get_edges_by_type(self.digraph, "conflict")))
+        self.assertEqual(calc_median_affinity(self.network), calc_median_affinity(self.digraph))
+        self.assertEqual(calc_total_funds_requested(self.network), calc_total_funds_requested(self.digraph))
+        self.assertEqual(find_in_edges_of_type_for_proposal(self.network, 7, "support"),
+                         find_in_edges_of_type_for_proposal(self.digraph, 7, "support"))
+        self.assertEqual(list(get_proposals_by_participant_and_status(self.network, 0)),
+                         list(get_proposals_by_participant_and_status(self.digraph, 0)))
+
+    def test_support_edge_is_stored_in_columns(self):
+        edge = self.network.edges[0, 6]
+        edge["support"] = edge["support"]._replace(tokens=10, conviction=5)
+        self.assertEqual(self.network[0][6]["support"].tokens, 10)
+        self.assertEqual(self.network.adj[0][6]["support"].conviction, 5)
+        self.assertEqual(calc_total_conviction(self.network, 6), 5)
+        self.assertEqual(get_proposals_conviction_list(self.network).count(5), 1)
+
+    def test_update_conviction_matches_digraph(self):
+        self.digraph.nodes[7]["item"].status = ProposalStatus.ACTIVE
+        self.network.nodes[7]["item"].status = ProposalStatus.ACTIVE
+        for network in [self.digraph, self.network]:
+            for k, (i, j) in enumerate(get_edges_by_type(network, "support")):
+                network.edges[i, j]["support"] = network.edges[i, j]["support"]._replace(tokens=k * 1.5, conviction=k / 3)
+
+        for _ in range(3):
+            self.assertEqual(update_conviction(self.network, 0.7), update_conviction(self.digraph, 0.7))
+        self.assertEqual(get_proposals_conviction_list(self.network), get_proposals_conviction_list(self.digraph))
+
+    def test_add_participant_and_proposal(self):
+        rng = new_random_number_func(2)
+        p = Participant(TokenBatch(0, 100), new_probability_func(2), rng)
+        network, i = add_participant(self.network, p, new_exponential_func(2), rng)
+        self.assertEqual(i, 10)
+        self.assertIs(network.nodes[i]["item"], p)
+        self.assertEqual(len(get_edges_by_type(network, "support", i)), 4)
+
+        network, j = add_proposal(network, Proposal(100, 1000), i, rng)
+        self.assertEqual(j, 11)
+        self.assertEqual(len(network.in_edges(j)), 7)
+        self.assertTrue(network.edges[i, j]["support"].is_author)
+        self.assertEqual(network.edges[i, j]["support"].affinity, 1)
+        self.assertEqual(len(get_proposals(network, status=ProposalStatus.CANDIDATE)), 5)
+
+    def test_remove_node(self):
+        edges_before = len(self.network.edges)
+        self.network.remove_node(0)
+        self.assertNotIn(0, self.network)
+        self.assertEqual(len(self.network.edges), edges_before - 4)
+        self.assertFalse(self.network.has_edge(0, 6))
+        self.assertEqual(len(get_participants(self.network)), 5)
+        self.assertNotIn((0, 6), get_edges_by_type(self.network, "support"))
+        self.assertEqual([i for i, _ in self.network.in_edges(6)], [1, 2, 3, 4, 5])
+
+        # The freed id is handed out again, just like with a DiGraph.
+        self.network.remove_node(9)
+        network, j = add_proposal(self.network, Proposal(100, 1000), 1, new_random_number_func(2))
+        self.assertEqual(j, 9)
+        self.assertEqual(list(self.network.nodes)[-1], 9)
+
+    def test_status_index_follows_transitions(self):
+        for idx in [8, 6]:
+            self.digraph.nodes[idx]["item"].status = ProposalStatus.ACTIVE
+            self.network.nodes[idx]["item"].status = ProposalStatus.ACTIVE
+        for status in ProposalStatus:
+            self.assertEqual(described(get_proposals(self.network, status)),
+                             described(get_proposals(self.digraph, status)))
+        self.assertEqual([idx for idx, _ in get_proposals(self.network, ProposalStatus.ACTIVE)], [6, 8])
+
+        copied = copy.deepcopy(self.network)
+        copied.nodes[7]["item"].status = ProposalStatus.FAILED
+        self.assertEqual([idx for idx, _ in get_proposals(copied, ProposalStatus.FAILED)], [7])
+        self.assertEqual(get_proposals(self.network, ProposalStatus.FAILED), [])
+
+        proposal = self.network.nodes[6]["item"]
+        self.network.remove_node(6)
+        proposal.status = ProposalStatus.COMPLETED
+        self.assertEqual([idx for idx, _ in get_proposals(self.network, ProposalStatus.ACTIVE)], [8])
+        self.assertEqual(get_proposals(self.network, ProposalStatus.COMPLETED), [])
+
+    def test_participant_index(self):
+        self.network.remove_node(2)
+        self.network.add_node(2, item=Proposal(10, 10))
+        self.assertEqual([idx for idx, _ in get_participants(self.network)], [0, 1, 3, 4, 5])
+        self.assertEqual([idx for idx, _ in get_proposals(self.network, ProposalStatus.CANDIDATE)], [6, 7, 8, 9, 2])
+
+    def test_aggregates_follow_mutations(self):
+        def assert_same_aggregates(network, digraph):
+            for calc in [calc_avg_sentiment, calc_median_affinity, calc_total_funds_requested]:
+                self.assertEqual(calc(network), calc(digraph))
+
+        assert_same_aggregates(self.network, self.digraph)
+        for network in [self.network, self.digraph]:
+            network.nodes[1]["item"].sentiment = 0.123
+            network.nodes[7]["item"].status = ProposalStatus.ACTIVE
+        assert_same_aggregates(self.network, self.digraph)
+
+        for network in [self.network, self.digraph]:
+            network.remove_node(3)
+            network.remove_node(8)
+            network.edges[0, 6]["support"] = network.edges[0, 6]["support"]._replace(affinity=0.01)
+            rng = new_random_number_func(2)
+            add_participant(network, Participant(TokenBatch(0, 100), new_probability_func(2), rng),
+                            new_exponential_func(2), rng)
+            add_proposal(network, Proposal(1234, 1000), 0, rng)
+        assert_same_aggregates(self.network, self.digraph)
+
+        copied, copied_digraph = copy.deepcopy(self.network), copy.deepcopy(self.digraph)
+        for network in [copied, copied_digraph]:
+            network.nodes[0]["item"].sentiment = 0.9
+            network.nodes[6]["item"].status = ProposalStatus.FAILED
+        assert_same_aggregates(copied, copied_digraph)
+        assert_same_aggregates(self.network, self.digraph)
+        self.assertNotEqual(calc_avg_sentiment(copied), calc_avg_sentiment(self.network))
+
+        avoided = self.network.avg_sentiment_recomputations_avoided
+        calc_avg_sentiment(self.network)
+        self.assertEqual(self.network.avg_sentiment_recomputations_avoided, avoided + 1)
+
+        # A removed Participant no longer counts, even if its sentiment changes
+        participant = self.network.nodes[2]["item"]
+        self.network.remove_node(2)
+        self.digraph.remove_node(2)
+        participant.sentiment = 0
+        assert_same_aggregates(self.network, self.digraph)
+
+    def test_median_affinity(self):
+        network = ArrayNetwork()
+        rng = new_random_number_func(3)
+        for i in range(4):
+            network.add_node(i, item=Participant(TokenBatch(0, 1), new_probability_func(3), rng))
+        network.add_node(4, item=Proposal(10, 10))
+        with self.assertRaises(Exception):
+            calc_median_affinity(network)
+        for i, affinity in enumerate([0.4, 0.1, 0.3]):
+            network.add_edge(i, 4, support=ParticipantSupport(affinity=affinity), type="support")
+        self.assertEqual(calc_median_affinity(network), 0.3)
+        network.add_edge(3, 4, support=ParticipantSupport(affinity=0.2), type="support")
+        self.assertEqual(calc_median_affinity(network), np.median([0.4, 0.1, 0.3, 0.2]))
+        network.remove_node(0)
+        self.assertEqual(calc_median_affinity(network), 0.2)
+
+    def test_sparse_support_edges(self):
+        digraph, network = new_networks(sparse_support=True)
+        self.assertEqual(list(network.edges), list(digraph.edges))
+        self.assertEqual(calc_median_affinity(network), calc_median_affinity(digraph))
+
+        digraph_rng, network_rng = new_random_number_func(5), new_random_number_func(5)
+        for author in [0, 3]:
+            digraph, _ = add_proposal(digraph, Proposal(10, 10), author, digraph_rng)
+            network, _ = add_proposal(network, Proposal(10, 10), author, network_rng)
+            self.assertEqual(calc_median_affinity(network), calc_median_affinity(digraph))
+        digraph = remove_participant(digraph, 1)
+        network = remove_participant(network, 1)
+        self.assertEqual(calc_median_affinity(network), calc_median_affinity(digraph))
+
+        g = network.to_digraph()
+        self.assertEqual(list(g.edges), list(digraph.edges))
+        self.assertEqual({i: list(a) for i, a in g.graph["latent_affinities"].items()},
+                         {i: list(a) for i, a in digraph.graph["latent_affinities"].items()})
+        self.assertEqual(calc_median_affinity(ArrayNetwork.from_digraph(g)), calc_median_affinity(digraph))
+
+    def test_remove_edge(self):
+        median_affinity = calc_median_affinity(self.network)
+        self.network.remove_edge(0, 6)
+        self.digraph.remove_edge(0, 6)
+        self.assertFalse(self.network.has_edge(0, 6))
+        self.assertEqual(list(self.network.edges), list(self.digraph.edges))
+        self.assertEqual(self.network.support_edges(), list(get_edges_by_type(self.digraph, "support")))
+        self.assertEqual(calc_median_affinity(self.network), calc_median_affinity(self.digraph))
+        self.assertNotEqual(calc_median_affinity(self.network), median_affinity)
+        with self.assertRaises(nx.NetworkXError):
+            self.network.remove_edge(0, 6)
+
+    def test_archive_proposal(self):
+        for network in [self.network, self.digraph]:
+            archive_proposal(network, 7)
+        self.assertEqual(list(self.network.edges), list(self.digraph.edges))
+        self.assertEqual(self.network.graph["archived_support"][7].tolist(),
+                         self.digraph.graph["archived_support"][7].tolist())
+        self.assertEqual(calc_median_affinity(self.network), calc_median_affinity(self.digraph))
+        remove_participant(self.network, 3)
+        remove_participant(self.digraph, 3)
+        self.assertEqual(calc_median_affinity(self.network), calc_median_affinity(self.digraph))
+        self.assertEqual(list(as_digraph(self.network, archived=True).edges(data=True)),
+                         list(as_digraph(self.digraph, archived=True).edges(data=True)))
+
+    def test_columns_grow(self):
+        network = ArrayNetwork()
+        rng = new_random_number_func(3)
+        for i in range(100):
+            network.add_node(i, item=Participant(TokenBatch(0, 1), new_probability_func(3), rng))
+        network.add_node(100, item=Proposal(10, 10))
+        for i in range(100):
+            network.add_edge(i, 100, support=ParticipantSupport(affinity=0.5), type="support")
+        self.assertEqual(len(network.support_edge_rows()), 100)
+        np.testing.assert_array_equal(network.affinities(), np.full(100, 0.5))
+
+    def test_add_edge_requires_nodes(self):
+        with self.assertRaises(nx.NetworkXError):
+            self.network.add_edge(0, 100, type="support")
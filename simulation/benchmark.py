@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Times the partial_state_update_blocks at several population scales, to tell
+which blocks and which policies/state update functions are worth optimising.
+
+For every scale N, a configuration with N hatchers and N proposals is
+bootstrapped and run in place (see engine.states_in_place()) for a few
+timesteps, twice: once to time every block and every function in it, and once
+under tracemalloc to see how much memory each of them allocates. tracemalloc
+slows everything down, which is why the timings come from the first run.
+
+A report can be saved as a baseline and later reports compared against it:
+anything that got slower, or allocates more, by more than the threshold is a
+regression, and the command exits with status 1.
+
+    python benchmark.py --scales 5,50,500 -T 10 --save_baseline baseline.json
+    python benchmark.py --scales 5,50,500 -T 10 --baseline baseline.json
+"""
+import argparse
+import json
+import sys
+import tracemalloc
+from typing import List
+
+from engine import states_in_place
+from profiling import Meter, metered
+from simulation import CommonsSimulationConfiguration, bootstrap_simulation, partial_state_update_blocks
+
+DEFAULT_SCALES = [5, 50, 500]
+DEFAULT_THRESHOLD = 0.2
+# Differences smaller than these are noise, not regressions.
+MIN_SECONDS = 0.005
+MIN_BYTES = 1 << 20
+
+
+def block_name(substep: int, block: dict) -> str:
+    # Several blocks share a label (Sync state variables), the substep tells
+    # them apart.
+    return "{:02d} {}".format(substep, block["label"])
+
+
+def metered_blocks(blocks: List[dict]):
+    """
+    Returns copies of blocks whose policies and state update functions record
+    themselves in a Meter, and those Meters by "block/kind:name".
+    """
+    meters = {}
+    copies = []
+    for substep, block in enumerate(blocks, start=1):
+        copy = dict(block, policies={}, variables={})
+        for kind in ["policies", "variables"]:
+            for name, f in block[kind].items():
+                meter = meters["{}/{}:{}".format(block_name(substep, block), kind, name)] = Meter()
+                copy[kind][name] = metered(f, meter, kind)
+        copies.append(copy)
+    return copies, meters
+
+
+def run_metered(c: CommonsSimulationConfiguration, blocks: List[dict]) -> dict:
+    """
+    Bootstraps c and runs blocks on it in place, measuring every block (from
+    one substep to the next) and every function.
+    """
+    bootstrap = Meter()
+    bootstrap.start()
+    initial_conditions, simulation_parameters = bootstrap_simulation(c)
+    bootstrap.stop()
+
+    copies, function_meters = metered_blocks(blocks)
+    block_meters = {block_name(substep, block): Meter() for substep, block in enumerate(blocks, start=1)}
+    meters = list(block_meters.values())
+
+    total = Meter()
+    total.start()
+    states = states_in_place(initial_conditions, simulation_parameters, copies)
+    next(states)
+    # Every next() runs one block
+    for step in range(len(simulation_parameters["T"]) * len(meters)):
+        meter = meters[step % len(meters)]
+        meter.start()
+        next(states)
+        meter.stop()
+    total.stop()
+
+    return {
+        "bootstrap": bootstrap.as_dict(),
+        "total": total.as_dict(),
+        "blocks": {name: m.as_dict() for name, m in block_meters.items()},
+        "functions": {name: m.as_dict() for name, m in function_meters.items()},
+    }
+
+
+def benchmark(scales: List[int], timesteps: int, random_seed: int = 1, network_backend="digraph",
+              support_edges="dense", memory=True, blocks: List[dict] = None) -> dict:
+    """
+    Runs blocks (the simulation's partial_state_update_blocks by default) at
+    every scale, and returns the timings, and with memory=True the memory
+    measurements, as a JSON-able report.
+    """
+    blocks = partial_state_update_blocks if blocks is None else blocks
+    configuration = {"timesteps_days": timesteps, "random_seed": random_seed, "network_backend": network_backend,
+                     "support_edges": support_edges}
+
+    def new_configuration(scale):
+        return CommonsSimulationConfiguration(hatchers=scale, proposals=scale, **configuration)
+
+    report = {"configuration": configuration, "scales": {}}
+    for scale in scales:
+        timings = run_metered(new_configuration(scale), blocks)
+        if memory:
+            tracemalloc.start()
+            try:
+                memory_usage = run_metered(new_configuration(scale), blocks)
+            finally:
+                tracemalloc.stop()
+            # Keep the memory measurements, but the timings of the run that
+            # was not slowed down by tracemalloc.
+            for part in ["blocks", "functions"]:
+                for name, measured in memory_usage[part].items():
+                    measured.update(calls=timings[part][name]["calls"], seconds=timings[part][name]["seconds"])
+                    timings[part][name] = measured
+            for part in ["bootstrap", "total"]:
+                timings[part].update(peak_bytes=memory_usage[part]["peak_bytes"],
+                                     retained_bytes=memory_usage[part]["retained_bytes"])
+        report["scales"][str(scale)] = timings
+    return report
+
+
+def compare(report: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """
+    The regressions of report against baseline: every block or function, at
+    every scale both have, that takes more than (1 + threshold) times as long,
+    or allocates more than (1 + threshold) times as much memory at its peak.
+    """
+    if report["configuration"] != baseline["configuration"]:
+        raise ValueError("The baseline was measured with {}, not {}".format(
+            baseline["configuration"], report["configuration"]))
+
+    regressions = []
+    for scale, measured in report["scales"].items():
+        if scale not in baseline["scales"]:
+            continue
+        base = baseline["scales"][scale]
+        entries = [("bootstrap", measured["bootstrap"], base["bootstrap"]),
+                   ("total", measured["total"], base["total"])]
+        for part in ["blocks", "functions"]:
+            entries.extend((name, m, base[part][name]) for name, m in measured[part].items() if name in base[part])
+        for name, m, b in entries:
+            for key, minimum in [("seconds", MIN_SECONDS), ("peak_bytes", MIN_BYTES)]:
+                if m[key] > b[key] * (1 + threshold) and m[key] - b[key] > minimum:
+                    regressions.append("scale {} {}: {} went from {:.4g} to {:.4g}".format(scale, name, key, b[key],
+                                                                                            m[key]))
+    return regressions
+
+
+def summary(report: dict, top: int = 10) -> List[str]:
+    """
+    A few lines per scale, with the blocks and functions that take the longest
+    first.
+    """
+    lines = []
+    for scale, measured in report["scales"].items():
+        lines.append("Scale {}: bootstrap {:.3f}s, {} timesteps {:.3f}s, peak {:.1f} MB".format(
+            scale, measured["bootstrap"]["seconds"], report["configuration"]["timesteps_days"],
+            measured["total"]["seconds"], measured["total"]["peak_bytes"] / 2**20))
+        for part in ["blocks", "functions"]:
+            ranked = sorted(measured[part].items(), key=lambda item: item[1]["seconds"], reverse=True)
+            for name, m in ranked[:top]:
+                lines.append("  {:8.4f}s {:9.2f} MB peak  {}".format(m["seconds"], m["peak_bytes"] / 2**20, name))
+    return lines
+
+
+def _parse_scales(s: str) -> List[int]:
+    return [int(scale) for scale in s.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=_parse_scales, default=DEFAULT_SCALES,
+                        help="Comma separated numbers of hatchers (and of proposals) to run, e.g. 5,50,500,5000")
+    parser.add_argument("-T", "--timesteps_days", type=int, default=10)
+    parser.add_argument("--random_seed", type=int, default=1)
+    parser.add_argument("--network_backend", choices=["digraph", "array"], default="digraph")
+    parser.add_argument("--support_edges", choices=["dense", "sparse"], default="dense")
+    parser.add_argument("--no_memory", action="store_true", help="Only measure time, skip the tracemalloc run")
+    parser.add_argument("--top", type=int, default=10, help="Number of blocks and functions listed per scale")
+    parser.add_argument("-o", "--output", type=str, default=None, help="Write the full report to this JSON file")
+    parser.add_argument("--save_baseline", type=str, default=None, help="Write the report as a baseline")
+    parser.add_argument("--baseline", type=str, default=None, help="Compare the report against this baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="How much slower or bigger than the baseline counts as a regression, 0.2 is 20%%")
+    args = parser.parse_args()
+
+    report = benchmark(args.scales, args.timesteps_days, random_seed=args.random_seed,
+                       network_backend=args.network_backend, support_edges=args.support_edges,
+                       memory=not args.no_memory)
+    print("\n".join(summary(report, args.top)))
+    for path in [args.output, args.save_baseline]:
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        print("\n".join(regressions) if regressions else "No regressions against {}".format(args.baseline))
+        sys.exit(1 if regressions else 0)
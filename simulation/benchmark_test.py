@@ -0,0 +1,37 @@
+import copy
+import unittest
+
+from benchmark import benchmark, compare, summary
+from simulation import partial_state_update_blocks
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_benchmark(self):
+        report = benchmark([5], 3)
+        measured = report["scales"]["5"]
+        self.assertEqual(len(measured["blocks"]), len(partial_state_update_blocks))
+        for m in measured["blocks"].values():
+            self.assertEqual(m["calls"], 3)
+        self.assertIn("13 Participant votes on proposal according to affinity/policies:"
+                      "participants_stake_tokens_on_proposals", measured["functions"])
+        self.assertGreater(measured["total"]["seconds"], 0)
+        self.assertGreater(measured["total"]["peak_bytes"], 0)
+        self.assertLessEqual(sum(m["seconds"] for m in measured["blocks"].values()), measured["total"]["seconds"])
+        self.assertTrue(summary(report)[0].startswith("Scale 5"))
+
+    def test_compare(self):
+        baseline = benchmark([5], 3, memory=False)
+        report = copy.deepcopy(baseline)
+        self.assertEqual(compare(report, baseline), [])
+
+        name = "14 Calculate proposals' conviction"
+        report["scales"]["5"]["blocks"][name]["seconds"] += 1
+        regressions = compare(report, baseline)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn(name, regressions[0])
+        # Within the threshold
+        self.assertEqual(compare(report, baseline, threshold=1e6), [])
+
+        report["configuration"]["timesteps_days"] = 4
+        with self.assertRaises(ValueError):
+            compare(report, baseline)
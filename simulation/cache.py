@@ -0,0 +1,137 @@
+"""
+A cache of simulation results on disk, so that a configuration that has
+already been simulated (e.g. one of the UI's presets) is never simulated again.
+
+Results are stored as one JSON file per configuration, named after a hash of
+the configuration's arguments and of the model's source code: two
+configurations that only differ in argument order or in how their numbers are
+written (120 vs 120.0) share an entry, and changing the model invalidates every
+entry. Configurations without a random_seed are not cached, their results
+differ on every run.
+"""
+import functools
+import hashlib
+import json
+import os
+import tempfile
+from typing import Optional
+
+from simulation import CommonsSimulationConfiguration
+
+# The modules whose code decides what a configuration's results are.
+MODEL_MODULES = ["abcurve", "arraynetwork", "config", "convictionvoting", "engine", "entities", "hatch",
+                 "network_utils", "policies", "score", "simulation", "utils"]
+
+DEFAULT_MAX_ENTRIES = 1000
+
+
+@functools.lru_cache(maxsize=None)
+def model_version() -> str:
+    h = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in MODEL_MODULES:
+        with open(os.path.join(directory, module + ".py"), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def _canonical(value):
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def configuration_key(c: CommonsSimulationConfiguration) -> Optional[str]:
+    """
+    The name of c's cache entry, or None if c cannot be cached.
+    """
+    arguments = c.arguments()
+    if arguments["random_seed"] is None:
+        return None
+    canonical = json.dumps({name: _canonical(value) for name, value in arguments.items()}, sort_keys=True)
+    return hashlib.sha256((model_version() + canonical).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Keeps the result dicts of up to max_entries configurations in directory,
+    evicting the least recently used ones. Several processes may share a
+    directory: entries are written to a temporary file first and then renamed,
+    so a reader never sees half an entry.
+    """
+
+    def __init__(self, directory: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, c: CommonsSimulationConfiguration) -> Optional[dict]:
+        key = configuration_key(c)
+        if key is None:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                result = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        # The modification time tells which entries were used last.
+        try:
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return result
+
+    def put(self, c: CommonsSimulationConfiguration, result: dict):
+        key = configuration_key(c)
+        if key is None:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(result, f)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                entries.append((os.path.getmtime(os.path.join(self.directory, name)), name))
+            except FileNotFoundError:
+                # Evicted by another process in the meantime
+                pass
+        entries.sort()
+        for _, name in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_open_caches = {}
+
+
+def open_cache(directory: str, max_entries: int = DEFAULT_MAX_ENTRIES) -> ResultCache:
+    """
+    The ResultCache of directory, shared by every run of this process so that
+    its hit/miss counters add up.
+    """
+    key = (os.path.abspath(directory), max_entries)
+    if key not in _open_caches:
+        _open_caches[key] = ResultCache(directory, max_entries)
+    return _open_caches[key]
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from cache import ResultCache, configuration_key
+from simrunner import get_simulation_results
+from simulation import CommonsSimulationConfiguration
+
+
+class TestConfigurationKey(unittest.TestCase):
+    def test_canonical(self):
+        self.assertEqual(configuration_key(CommonsSimulationConfiguration(random_seed=1, vesting_80p_unlocked=120)),
+                         configuration_key(CommonsSimulationConfiguration(vesting_80p_unlocked=120.0, random_seed=1)))
+        self.assertNotEqual(configuration_key(CommonsSimulationConfiguration(random_seed=1)),
+                            configuration_key(CommonsSimulationConfiguration(random_seed=2)))
+        self.assertNotEqual(configuration_key(CommonsSimulationConfiguration(random_seed=1)),
+                            configuration_key(CommonsSimulationConfiguration(random_seed=1, kappa=3)))
+
+    def test_unseeded(self):
+        self.assertIsNone(configuration_key(CommonsSimulationConfiguration()))
+
+    def test_model_version(self):
+        c = CommonsSimulationConfiguration(random_seed=1)
+        key = configuration_key(c)
+        with patch("cache.model_version", return_value="another model"):
+            self.assertNotEqual(configuration_key(c), key)
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_get_put(self):
+        cache = ResultCache(self.directory)
+        c = CommonsSimulationConfiguration(random_seed=1)
+        self.assertIsNone(cache.get(c))
+        cache.put(c, {"score": 1})
+        self.assertEqual(cache.get(CommonsSimulationConfiguration(random_seed=1)), {"score": 1})
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1})
+        self.assertEqual([f for f in os.listdir(self.directory) if not f.endswith(".json")], [])
+
+    def test_unseeded_is_not_cached(self):
+        cache = ResultCache(self.directory)
+        cache.put(CommonsSimulationConfiguration(), {"score": 1})
+        self.assertIsNone(cache.get(CommonsSimulationConfiguration()))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_evicts_least_recently_used(self):
+        cache = ResultCache(self.directory, max_entries=2)
+        configurations = [CommonsSimulationConfiguration(random_seed=seed) for seed in range(3)]
+        cache.put(configurations[0], {"score": 0})
+        cache.put(configurations[1], {"score": 1})
+        # Make sure the modification times differ, and use 0 after 1
+        past = time.time() - 10
+        os.utime(os.path.join(self.directory, configuration_key(configurations[1]) + ".json"), (past, past))
+        os.utime(os.path.join(self.directory, configuration_key(configurations[0]) + ".json"), (past, past))
+        cache.get(configurations[0])
+        cache.put(configurations[2], {"score": 2})
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+        self.assertIsNone(cache.get(configurations[1]))
+        self.assertEqual(cache.get(configurations[0]), {"score": 0})
+
+    def test_get_simulation_results(self):
+        cache = ResultCache(self.directory)
+        c = CommonsSimulationConfiguration(random_seed=1, timesteps_days=300)
+        result, df_final = get_simulation_results(c, in_place=True, cache=cache)
+        self.assertIsNotNone(df_final)
+        with patch("simrunner.run_simulation_in_place") as run:
+            cached, df_final = get_simulation_results(CommonsSimulationConfiguration(random_seed=1, timesteps_days=300),
+                                                      in_place=True, cache=cache)
+            run.assert_not_called()
+        self.assertEqual(cached, result)
+        self.assertIsNone(df_final)
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1})
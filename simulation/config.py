@@ -2,6 +2,7 @@
 sentiment_decay = 0.005
 sentiment_sensitivity = 0.75
 candidate_proposals_cutoff = 0.75
+candidate_proposals_min_cutoff = 0.5
 delta_holdings_scale = 70000
 sentiment_bonus_proposal_becomes_active = 0.5
 sentiment_bonus_proposal_becomes_completed = 0.3
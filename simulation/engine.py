@@ -0,0 +1,122 @@
+"""
+Runs the partial_state_update_blocks without going through cadCAD.
+
+Our model only ever runs a single config with N=1, so cadCAD's Experiment,
+ExecutionContext and Executor are mostly overhead. execute() is a lightweight
+stand-in that returns the same records as cadCAD's raw_system_events.
+
+cadCAD 0.4.23 also deep-copies every state variable before each substep and
+keeps all of those copies as its raw records, so a long run with many
+Participants ends up holding a full copy of the network and the Commons for
+every substep. run_in_place() instead keeps a single mutable state: the
+policies and state update functions work on the same network and Commons
+objects all the way through, and only the scalar state variables are recorded
+at every substep. Copies of the full state are only made at the (timestep,
+substep) pairs that are asked for in snapshot_at.
+
+Policies and state update functions are called exactly like cadCAD calls them
+(same arguments, same order, same aggregation of policy outputs), so for a
+fixed random_seed the results are the same as with cadCAD. The history
+argument (sH) is always an empty list, none of the policies use it.
+"""
+import copy
+from functools import reduce
+from numbers import Number
+from typing import Dict, Iterable, List, Tuple
+
+import pandas as pd
+
+
+def aggregate_policy_outputs(outputs: List[dict]) -> dict:
+    """
+    Combines the outputs of all policies in a block into the _input of the
+    state update functions, the same way cadCAD's default policy_ops do: values
+    under the same key are added together.
+    """
+    if len(outputs) == 0:
+        return {}
+    # cadCAD collects the keys in a set, which decides the order in which the
+    # state update functions see them.
+    keys = list(set(reduce(lambda a, b: a + b, [list(o.keys()) for o in outputs])))
+    return {k: reduce(lambda a, b: a + b, [o[k] for o in outputs if k in o]) for k in keys}
+
+
+def run_block(block: dict, params: dict, substep: int, sH: list, s: dict) -> dict:
+    """
+    Runs one partial state update block against the state s and returns the
+    updated state variables. Every state update function sees the state as it
+    was before the block, just like in cadCAD.
+    """
+    outputs = [p(params, substep, sH, s) for p in block["policies"].values()]
+    _input = aggregate_policy_outputs(outputs)
+    return dict(f(params, substep, sH, s, _input) for f in block["variables"].values())
+
+
+def iterate(s: dict, simulation_parameters: dict, partial_state_update_blocks: List[dict], copy_state: bool):
+    """
+    Runs every block for every timestep, yielding the state after each
+    substep. With copy_state, every substep gets its own deep copy of the
+    state like in cadCAD, otherwise the same dict and objects are updated in
+    place and yielded every time.
+    """
+    params = simulation_parameters["M"]
+    sH = []
+    for timestep in [t + 1 for t in simulation_parameters["T"]]:
+        s = dict(s, substep=0)
+        for substep, block in enumerate(partial_state_update_blocks, start=1):
+            if copy_state:
+                s = copy.deepcopy(s)
+            s.update(run_block(block, params, substep, sH, s))
+            s["timestep"], s["substep"] = timestep, substep
+            yield s
+
+
+def execute(initial_conditions: dict, simulation_parameters: dict, partial_state_update_blocks: List[dict]) -> List[dict]:
+    """
+    Runs the simulation and returns one record (a full copy of the state) per
+    substep, plus the initial state, just like cadCAD's raw_system_events.
+    """
+    s = copy.deepcopy(initial_conditions)
+    s["simulation"], s["subset"], s["run"], s["substep"], s["timestep"] = 0, 0, 1, 0, 0
+    records = [s]
+    records.extend(iterate(s, simulation_parameters, partial_state_update_blocks, copy_state=True))
+    return records
+
+
+def states_in_place(initial_conditions: dict, simulation_parameters: dict, partial_state_update_blocks: List[dict]):
+    """
+    Yields the initial state and then the state after every substep, all of
+    them the same dict holding the same objects, updated in place. It is only
+    valid until the next state is asked for.
+    """
+    s = copy.deepcopy(initial_conditions)
+    s["run"], s["timestep"], s["substep"] = 1, 0, 0
+    yield s
+    yield from iterate(s, simulation_parameters, partial_state_update_blocks, copy_state=False)
+
+
+def _scalars(s: dict) -> dict:
+    return {k: v for k, v in s.items() if isinstance(v, Number) and not isinstance(v, bool)}
+
+
+def run_in_place(initial_conditions: dict, simulation_parameters: dict, partial_state_update_blocks: List[dict],
+                 snapshot_at: Iterable[Tuple[int, int]] = ()) -> Tuple[pd.DataFrame, Dict[Tuple[int, int], dict]]:
+    """
+    Runs the simulation on a single mutable copy of initial_conditions.
+
+    Returns a DataFrame with the scalar state variables (funding_pool,
+    token_price, sentiment...) at every timestep and substep, and a dict
+    {(timestep, substep): state} with a deep copy of the full state at each of
+    the requested snapshot_at points. (timestep 0, substep 0) is the initial
+    state.
+    """
+    snapshot_at = set(snapshot_at)
+    records = []
+    snapshots = {}
+
+    for s in states_in_place(initial_conditions, simulation_parameters, partial_state_update_blocks):
+        records.append(_scalars(s))
+        if (s["timestep"], s["substep"]) in snapshot_at:
+            snapshots[(s["timestep"], s["substep"])] = copy.deepcopy(s)
+
+    return pd.DataFrame(records), snapshots
@@ -0,0 +1,57 @@
+import unittest
+
+import pandas as pd
+
+from engine import aggregate_policy_outputs, execute, run_in_place
+from entities import ProposalStatus
+from network_utils import get_participants, get_proposals
+from simulation import CommonsSimulationConfiguration, bootstrap_simulation, partial_state_update_blocks
+
+
+class TestEngine(unittest.TestCase):
+    def test_aggregate_policy_outputs(self):
+        self.assertEqual(aggregate_policy_outputs([]), {})
+        self.assertEqual(aggregate_policy_outputs([{"a": 1, "b": [1]}]), {"a": 1, "b": [1]})
+        self.assertEqual(aggregate_policy_outputs([{"a": 1, "b": [1]}, {"a": 2, "b": [2]}]), {"a": 3, "b": [1, 2]})
+
+    def test_execute(self):
+        c = CommonsSimulationConfiguration(random_seed=1, timesteps_days=3)
+        records = execute(*bootstrap_simulation(c), partial_state_update_blocks)
+        blocks = len(partial_state_update_blocks)
+        self.assertEqual(len(records), 1 + 3 * blocks)
+        self.assertEqual([(r["timestep"], r["substep"]) for r in records[:blocks + 2]],
+                         [(0, 0)] + [(1, i) for i in range(1, blocks + 1)] + [(2, 1)])
+        self.assertEqual({(r["simulation"], r["subset"], r["run"]) for r in records}, {(0, 0, 1)})
+        self.assertEqual(list(records[0])[0], "network")
+
+        # Every record holds its own copy of the state.
+        self.assertIsNot(records[1]["network"], records[2]["network"])
+        self.assertIsNot(records[1]["commons"], records[2]["commons"])
+
+    def test_run_in_place_gives_the_same_results_as_execute(self):
+        for backend in ["digraph", "array"]:
+            c = CommonsSimulationConfiguration(random_seed=1, timesteps_days=20, network_backend=backend)
+            df, snapshots = run_in_place(*bootstrap_simulation(c), partial_state_update_blocks,
+                                         snapshot_at=[(0, 0), (10, 2), (20, 2)])
+
+            c = CommonsSimulationConfiguration(random_seed=1, timesteps_days=20, network_backend=backend)
+            records = execute(*bootstrap_simulation(c), partial_state_update_blocks)
+            expected = pd.DataFrame(records)[df.columns]
+            pd.testing.assert_frame_equal(df, expected)
+
+            self.assertEqual(list(snapshots), [(0, 0), (10, 2), (20, 2)])
+            for (timestep, substep), snapshot in snapshots.items():
+                record = next(r for r in records if r["timestep"] == timestep and r["substep"] == substep)
+                for status in ProposalStatus:
+                    self.assertEqual([i for i, _ in get_proposals(snapshot["network"], status)],
+                                     [i for i, _ in get_proposals(record["network"], status)])
+                self.assertEqual(len(get_participants(snapshot["network"])), len(get_participants(record["network"])))
+                self.assertEqual(snapshot["commons"]._funding_pool, record["commons"]._funding_pool)
+
+    def test_run_in_place_leaves_initial_conditions_alone(self):
+        c = CommonsSimulationConfiguration(random_seed=1, timesteps_days=5)
+        initial_conditions, simulation_parameters = bootstrap_simulation(c)
+        funding_pool = initial_conditions["commons"]._funding_pool
+        run_in_place(initial_conditions, simulation_parameters, partial_state_update_blocks)
+        self.assertEqual(initial_conditions["commons"]._funding_pool, funding_pool)
+        self.assertNotIn("timestep", initial_conditions)
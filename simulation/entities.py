@@ -7,8 +7,8 @@ import numpy as np
 
 import config
 from convictionvoting import trigger_threshold
-from hatch import TokenBatch
-from utils import attrs
+from hatch import TokenBatch, TokenBatches
+from utils import attrs, probabilities, random_numbers
 
 
 ProposalStatus = Enum("ProposalStatus", "CANDIDATE ACTIVE COMPLETED FAILED")
@@ -20,6 +20,7 @@ ProposalStatus = Enum("ProposalStatus", "CANDIDATE ACTIVE COMPLETED FAILED")
 
 class Proposal:
     def __init__(self, funds_requested: int, trigger: float):
+        self._status_observers = []
         self.conviction = 0
         self.status = ProposalStatus.CANDIDATE
         self.age = 0
@@ -29,6 +30,31 @@ class Proposal:
     def __repr__(self):
         return "<{} {}>".format(self.__class__.__name__, attrs(self))
 
+    def __setattr__(self, name, value):
+        """
+        Status transitions are announced to whoever called
+        observe_status_changes(), so that e.g. an ArrayNetwork can keep its
+        Proposals indexed by status without rescanning them.
+        """
+        if name == "status":
+            old = self.__dict__.get("status")
+            super().__setattr__(name, value)
+            if old != value:
+                for observer in self.__dict__.get("_status_observers", ()):
+                    observer(old, value)
+            return
+        super().__setattr__(name, value)
+
+    def observe_status_changes(self, observer):
+        """
+        observer(old_status, new_status) is called every time the status of
+        this Proposal changes.
+        """
+        self.__dict__.setdefault("_status_observers", []).append(observer)
+
+    def unobserve_status_changes(self, observer):
+        self.__dict__.get("_status_observers", []).remove(observer)
+
     def update_age(self):
         self.age += 1
         return self.age
@@ -60,6 +86,7 @@ class Proposal:
 
 class Participant:
     def __init__(self, holdings: TokenBatch, probability_func, random_number_func):
+        self._sentiment_observers = []
         self._probability_func = probability_func
         self._random_number_func = random_number_func
         self.sentiment = self._random_number_func()
@@ -68,6 +95,31 @@ class Participant:
     def __repr__(self):
         return "<{} {}>".format(self.__class__.__name__, attrs(self))
 
+    def __setattr__(self, name, value):
+        """
+        Sentiment changes are announced to whoever called
+        observe_sentiment_changes(), so that e.g. an ArrayNetwork can keep the
+        average sentiment without rescanning every Participant.
+        """
+        if name == "sentiment":
+            old = self.__dict__.get("sentiment")
+            super().__setattr__(name, value)
+            if old != value:
+                for observer in self.__dict__.get("_sentiment_observers", ()):
+                    observer(old, value)
+            return
+        super().__setattr__(name, value)
+
+    def observe_sentiment_changes(self, observer):
+        """
+        observer(old_sentiment, new_sentiment) is called every time the
+        sentiment of this Participant changes.
+        """
+        self.__dict__.setdefault("_sentiment_observers", []).append(observer)
+
+    def unobserve_sentiment_changes(self, observer):
+        self.__dict__.get("_sentiment_observers", []).remove(observer)
+
     def buy(self) -> float:
         """
         If the Participant decides to buy more tokens, returns the number of
@@ -174,21 +226,30 @@ class Participant:
             # these Proposals
             #
             # A Zargham work of art.
-            for candidate in candidate_proposals:
-                affinity = candidate_proposals[candidate]
+            if candidate_proposals:
                 # Hardcoded 0.75 instead of a configurable sentiment_sensitivity
                 # because modifying sentiment_sensitivity without changing the
                 # hardcoded cutoff value of 0.5 may cause unintended behaviour.
                 # Also, 0.75 is a reasonable number in this case.
                 cutoff = config.candidate_proposals_cutoff * np.max(list(candidate_proposals.values()))
-                if cutoff < .5:
-                    cutoff = .5
-
+                if cutoff < config.candidate_proposals_min_cutoff:
+                    cutoff = config.candidate_proposals_min_cutoff
+            for candidate in candidate_proposals:
+                affinity = candidate_proposals[candidate]
                 if affinity > cutoff:
                     new_voted_proposals[candidate] = affinity
 
         return new_voted_proposals
 
+    def skip_voting(self):
+        """
+        Draws the random number vote_on_candidate_proposals() would have drawn
+        (it always engages, the draw cannot change its decision), so that a
+        Participant whose vote is known to be the same as last time can be
+        skipped without changing the random numbers that follow.
+        """
+        self._probability_func(1.0)
+
     def stake_across_all_supported_proposals(self, supported_proposals: List[Tuple[float, int]]) -> dict:
         """
         Rebalances the Participant's tokens across the (possibly updated) list of Proposals
@@ -232,6 +293,50 @@ class Participant:
         return self.holdings.update_age()
 
 
+# The decisions of Participant.buy(), sell() and wants_to_exit() for a whole
+# population at once, given its columns (one value per Participant, in the same
+# order). They draw the same random numbers, in the same order, as calling the
+# methods on every Participant in turn would, so they give the same answers.
+def participants_buy(sentiment: np.ndarray, probability_func, random_number_func) -> np.ndarray:
+    """
+    The DAI every Participant buys tokens with, 0 if it does not buy.
+    """
+    engagement_rate = config.engagement_rate_multiplier_buy * sentiment
+    force = sentiment - config.sentiment_sensitivity
+    buys = probabilities(probability_func, engagement_rate) & (force > 0)
+    delta_holdings = np.zeros(len(sentiment))
+    delta_holdings[buys] = random_numbers(random_number_func, np.count_nonzero(buys)) * force[buys] \
+        * config.delta_holdings_scale
+    return delta_holdings
+
+
+def participants_sell(sentiment: np.ndarray, holdings: TokenBatches, rows: np.ndarray, probability_func,
+                      random_number_func) -> np.ndarray:
+    """
+    The tokens every Participant sells, 0 if it does not sell. The
+    Participants' holdings are the rows of holdings, only those of the
+    Participants that sell are looked at.
+    """
+    engagement_rate = config.engagement_rate_multiplier_sell * sentiment
+    force = sentiment - config.sentiment_sensitivity
+    sells = probabilities(probability_func, engagement_rate) & (force < 0)
+    delta_holdings = np.zeros(len(sentiment))
+    delta_holdings[sells] = random_numbers(random_number_func, np.count_nonzero(sells)) * -force[sells] \
+        * holdings.spendable(rows[sells])
+    return delta_holdings
+
+
+def participants_want_to_exit(sentiment: np.ndarray, vesting: np.ndarray, probability_func) -> np.ndarray:
+    """
+    Whether every Participant wants to exit.
+    """
+    may_exit = (sentiment < config.sentiment_sensitivity_exit) & (vesting == 0)
+    engagement_rate = config.engagement_rate_multiplier_exit * sentiment[may_exit]
+    exits = np.zeros(len(sentiment), dtype=bool)
+    exits[may_exit] = probabilities(probability_func, 1 - engagement_rate)
+    return exits
+
+
 class ParticipantSupport(NamedTuple):
     affinity: float
     tokens: float = 0.
@@ -6,8 +6,9 @@ import numpy as np
 import math
 
 import utils
-from entities import Participant, ParticipantSupport, Proposal, ProposalStatus
-from hatch import TokenBatch, VestingOptions
+from entities import (Participant, ParticipantSupport, Proposal, ProposalStatus, participants_buy,
+                      participants_sell, participants_want_to_exit)
+from hatch import TokenBatch, TokenBatches, VestingOptions
 from simulation import new_probability_func, new_random_number_func
 
 
@@ -37,6 +38,18 @@ class TestProposal(unittest.TestCase):
         self.p.status = ProposalStatus.ACTIVE
         self.assertTrue(math.isnan(self.p.update_threshold(500000.0, 3000.0, 10000.0)))
 
+    def test_observe_status_changes(self):
+        observer = MagicMock()
+        self.p.observe_status_changes(observer)
+        self.p.status = ProposalStatus.ACTIVE
+        self.p.status = ProposalStatus.ACTIVE
+        observer.assert_called_once_with(ProposalStatus.CANDIDATE, ProposalStatus.ACTIVE)
+
+        self.p.unobserve_status_changes(observer)
+        self.p.status = ProposalStatus.COMPLETED
+        observer.assert_called_once()
+        self.assertIn("status", repr(self.p))
+
     def test_has_enough_conviction(self):
         # a newly created Proposal can't expect to have any Conviction gathered at all
         self.assertFalse(self.p.has_enough_conviction(10000, 3e6, 0.2))
@@ -169,6 +182,18 @@ class TestParticipant(unittest.TestCase):
         }
         self.assertEqual(ans, reference)
 
+    def test_skip_voting(self):
+        """
+        Skipping a vote draws the same random numbers as voting.
+        """
+        voting = Participant(TokenBatch(100, 100), new_probability_func(seed=7), new_random_number_func(seed=7))
+        skipping = Participant(TokenBatch(100, 100), new_probability_func(seed=7), new_random_number_func(seed=7))
+        for candidate_proposals in [{}, {0: 1.0, 1: 0.6}]:
+            voting.vote_on_candidate_proposals(candidate_proposals)
+            skipping.skip_voting()
+        self.assertEqual([voting._probability_func(0.5) for _ in range(20)],
+                         [skipping._probability_func(0.5) for _ in range(20)])
+
     def test_stake_across_all_supported_proposals(self):
         """
         Test that the rebalancing code works as intended.
@@ -224,6 +249,38 @@ class TestParticipant(unittest.TestCase):
         self.assertFalse(self.p.wants_to_exit())
 
 
+class TestParticipantsDecisions(unittest.TestCase):
+    def setUp(self):
+        # Two of each function, so that the Participants and the batched
+        # decisions get the same draws
+        self.funcs = [(new_probability_func(seed=5), new_random_number_func(seed=5)) for _ in range(2)]
+        sentiment = np.linspace(0, 1, 200)
+        vesting = np.where(np.arange(200) % 3 == 0, 0, 100.0)
+        self.participants = []
+        for i in range(200):
+            p = Participant(TokenBatch(vesting[i], 500, vesting_options=VestingOptions(10, 30)),
+                            new_probability_func(seed=None), new_random_number_func(seed=None))
+            p._probability_func, p._random_number_func = self.funcs[0]
+            p.sentiment = sentiment[i]
+            self.participants.append(p)
+        self.sentiment = sentiment
+        self.vesting = vesting
+
+    def test_participants_buy(self):
+        self.assertEqual(participants_buy(self.sentiment, *self.funcs[1]).tolist(),
+                         [p.buy() for p in self.participants])
+
+    def test_participants_sell(self):
+        holdings = TokenBatches([p.holdings for p in self.participants])
+        rows = np.arange(len(self.participants))
+        self.assertEqual(participants_sell(self.sentiment, holdings, rows, *self.funcs[1]).tolist(),
+                         [p.sell() for p in self.participants])
+
+    def test_participants_want_to_exit(self):
+        self.assertEqual(participants_want_to_exit(self.sentiment, self.vesting, self.funcs[1][0]).tolist(),
+                         [bool(p.wants_to_exit()) for p in self.participants])
+
+
 class TestParticipantSupport(unittest.TestCase):
     def setUp(self):
         self.pSupport = ParticipantSupport(affinity=1)
@@ -1,8 +1,8 @@
 from typing import List, Tuple
 from abcurve import AugmentedBondingCurve
 from collections import namedtuple
-from utils import attrs
 import config
+import numpy as np
 
 
 def vesting_curve(day: int, cliff_days: int, halflife_days: float) -> float:
@@ -13,6 +13,25 @@ def vesting_curve(day: int, cliff_days: int, halflife_days: float) -> float:
     return 1 - config.vesting_curve_halflife**((day - cliff_days)/halflife_days)
 
 
+def unlocked_fractions(age_days: np.ndarray, cliff_days: np.ndarray, halflife_days: np.ndarray) -> np.ndarray:
+    """
+    TokenBatch.unlocked_fraction() for many TokenBatches at once. Holders share
+    a few vesting options and ages, so the power in vesting_curve() is only
+    evaluated once per distinct exponent, in Python, which also keeps the
+    results exactly those of unlocked_fraction() (numpy's power can differ in
+    the last bit).
+    """
+    fractions = np.ones(len(age_days))
+    vests = (cliff_days != 0) & (halflife_days != 0)
+    if not vests.any():
+        return fractions
+    exponents = (age_days[vests] - cliff_days[vests]) / halflife_days[vests]
+    distinct, inverse = np.unique(exponents, return_inverse=True)
+    u = np.array([1 - config.vesting_curve_halflife**e for e in distinct.tolist()])
+    fractions[vests] = np.where(u > 0, u, 0)[inverse.reshape(-1)]
+    return fractions
+
+
 def convert_80p_to_cliff_and_halflife(days: int, v_ratio: int = 2) -> Tuple[float, float]:
     """
     For user's convenience, we ask him after how many days he would like 80% of his tokens to be unlocked.
@@ -36,18 +55,71 @@ VestingOptions = namedtuple("VestingOptions", "cliff_days halflife_days")
 
 
 class TokenBatch:
+    """
+    The vesting and nonvesting tokens of a holder. They are kept in a row of a
+    TokenBatches: one of its own at first, then that of the population it is
+    added to (see TokenBatches.add()), so its attributes read and write that
+    row.
+    """
+    __slots__ = ("_batches", "_row")
+
     def __init__(self, vesting: float, nonvesting: float, vesting_options=None):
-        self.vesting = vesting
-        self.nonvesting = nonvesting
-        self.vesting_spent = 0.0
+        self._batches = TokenBatches()
+        self._row = self._batches._append(vesting, nonvesting, 0.0, 0,
+                                          0 if not vesting_options else vesting_options.cliff_days,
+                                          0 if not vesting_options else vesting_options.halflife_days)
 
-        self.age_days = 0
+    def __repr__(self):
+        return "<{} {}>".format(self.__class__.__name__, {name: getattr(self, name) for name in (
+            "age_days", "cliff_days", "halflife_days", "nonvesting", "vesting", "vesting_spent")})
 
-        self.cliff_days = 0 if not vesting_options else vesting_options.cliff_days
-        self.halflife_days = 0 if not vesting_options else vesting_options.halflife_days
+    @property
+    def vesting(self):
+        return self._batches._vesting.item(self._row)
 
-    def __repr__(self):
-        return "<{} {}>".format(self.__class__.__name__, attrs(self))
+    @vesting.setter
+    def vesting(self, value):
+        self._batches._vesting[self._row] = value
+
+    @property
+    def nonvesting(self):
+        return self._batches._nonvesting.item(self._row)
+
+    @nonvesting.setter
+    def nonvesting(self, value):
+        self._batches._nonvesting[self._row] = value
+
+    @property
+    def vesting_spent(self):
+        return self._batches._vesting_spent.item(self._row)
+
+    @vesting_spent.setter
+    def vesting_spent(self, value):
+        self._batches._vesting_spent[self._row] = value
+
+    @property
+    def age_days(self):
+        return self._batches.day - self._batches._born.item(self._row)
+
+    @age_days.setter
+    def age_days(self, value):
+        self._batches._set(self._batches._born, self._row, self._batches.day - value)
+
+    @property
+    def cliff_days(self):
+        return self._batches._cliff_days.item(self._row)
+
+    @cliff_days.setter
+    def cliff_days(self, value):
+        self._batches._set(self._batches._cliff_days, self._row, value)
+
+    @property
+    def halflife_days(self):
+        return self._batches._halflife_days.item(self._row)
+
+    @halflife_days.setter
+    def halflife_days(self, value):
+        self._batches._set(self._batches._halflife_days, self._row, value)
 
     @property
     def total(self):
@@ -79,12 +151,7 @@ class TokenBatch:
         """
         returns what fraction of the TokenBatch is unlocked to date
         """
-        if self.cliff_days and self.halflife_days:
-            u = vesting_curve(self.age_days,
-                              self.cliff_days, self.halflife_days)
-            return u if u > 0 else 0
-        else:
-            return 1.0
+        return self._batches.unlocked_fraction().item(self._row)
 
     def spend(self, x: float):
         """
@@ -112,6 +179,115 @@ class TokenBatch:
         return ((self.unlocked_fraction() * self.vesting) - self.vesting_spent) + self.nonvesting
 
 
+def _grow(column: np.ndarray, size: int) -> np.ndarray:
+    """
+    Returns a copy of column with room for at least size rows, doubling the
+    capacity so that adding rows stays amortized O(1).
+    """
+    capacity = max(len(column), 1)
+    if size <= len(column):
+        return column
+    while capacity < size:
+        capacity *= 2
+    grown = np.zeros(capacity, dtype=column.dtype)
+    grown[:len(column)] = column
+    return grown
+
+
+class TokenBatches:
+    """
+    The vesting state of many TokenBatches (e.g. those of all Participants),
+    kept as columns. The TokenBatches added to it read and write their row, so
+    that what is unlocked and spendable is computed for all of them, or for
+    the rows that are asked for, at once.
+
+    Ages are not kept per row: a row keeps the day it would have been created
+    on, and the age of every row is how many days went by since, so that
+    update_age() ages them all by moving day. The unlocked fractions of all
+    rows only change with the ages, they are computed once per day.
+    """
+
+    def __init__(self, token_batches: List[TokenBatch] = ()):
+        self.day = 0
+        self._size = 0
+        self._vesting = np.zeros(0)
+        self._nonvesting = np.zeros(0)
+        self._vesting_spent = np.zeros(0)
+        self._born = np.zeros(0)
+        self._cliff_days = np.zeros(0)
+        self._halflife_days = np.zeros(0)
+        self._unlocked = None
+        for tb in token_batches:
+            self.add(tb)
+
+    def __len__(self):
+        return self._size
+
+    def add(self, token_batch: TokenBatch) -> int:
+        """
+        Moves token_batch into a new row, and returns it. token_batch reads
+        and writes that row from then on. If it is kept here already, returns
+        its row.
+        """
+        if token_batch._batches is self:
+            return token_batch._row
+        row = self._append(token_batch.vesting, token_batch.nonvesting, token_batch.vesting_spent,
+                           token_batch.age_days, token_batch.cliff_days, token_batch.halflife_days)
+        token_batch._batches, token_batch._row = self, row
+        return row
+
+    def update_age(self, days: int = 1):
+        """
+        Adds days to the age of every row.
+        """
+        self.day += days
+        self._unlocked = None
+        return self.day
+
+    def columns(self, rows=None) -> Tuple[np.ndarray, ...]:
+        """
+        age_days, cliff_days, halflife_days, vesting, vesting_spent and
+        nonvesting of the rows (all of them by default).
+        """
+        rows = slice(0, self._size) if rows is None else rows
+        return (self.day - self._born[rows], self._cliff_days[rows], self._halflife_days[rows], self._vesting[rows],
+                self._vesting_spent[rows], self._nonvesting[rows])
+
+    def total(self, rows=None) -> np.ndarray:
+        rows = slice(0, self._size) if rows is None else rows
+        return (self._vesting[rows] - self._vesting_spent[rows]) + self._nonvesting[rows]
+
+    def unlocked_fraction(self, rows=None) -> np.ndarray:
+        if self._unlocked is None:
+            age_days, cliff_days, halflife_days, _, _, _ = self.columns()
+            self._unlocked = unlocked_fractions(age_days, cliff_days, halflife_days)
+            self._unlocked.flags.writeable = False
+        return self._unlocked if rows is None else self._unlocked[rows]
+
+    def spendable(self, rows=None) -> np.ndarray:
+        unlocked = self.unlocked_fraction(rows)
+        rows = slice(0, self._size) if rows is None else rows
+        return ((unlocked * self._vesting[rows]) - self._vesting_spent[rows]) + self._nonvesting[rows]
+
+    # Internals
+    def _append(self, vesting, nonvesting, vesting_spent, age_days, cliff_days, halflife_days) -> int:
+        row = self._size
+        self._size += 1
+        for name, value in [("_vesting", vesting), ("_nonvesting", nonvesting), ("_vesting_spent", vesting_spent),
+                            ("_born", self.day - age_days), ("_cliff_days", cliff_days),
+                            ("_halflife_days", halflife_days)]:
+            column = _grow(getattr(self, name), self._size)
+            column[row] = value
+            setattr(self, name, column)
+        self._unlocked = None
+        return row
+
+    def _set(self, column: np.ndarray, row: int, value):
+        # For the columns the unlocked fractions depend on
+        column[row] = value
+        self._unlocked = None
+
+
 def create_token_batches(hatcher_contributions: List[int], desired_token_price: float, cliff_days: float, halflife_days: float) -> Tuple[List[TokenBatch], float]:
     """
     hatcher_contributions: a list of hatcher contributions in DAI/ETH/whatever
@@ -148,22 +324,76 @@ class Commons:
         # Options
         self.exit_tribute = exit_tribute
 
-    def deposit(self, dai):
+        # token_price() is asked for after every block that may have changed
+        # the Commons, and most of them didn't. The last price is kept along
+        # with what it was computed from.
+        self._token_price = None
+        self._token_price_of = None
+        self.token_price_recomputations_avoided = 0
+
+    def quote_deposit(self, dai):
+        """
+        How many tokens depositing dai would mint, and at what realized price, without depositing it.
+        """
+        return self.bonding_curve.deposit(dai, self._collateral_pool, self._token_supply)
+
+    def quote_deposits(self, dai: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        quote_deposit() for every amount in dai, as if they were deposited one
+        after the other: each one mints along the curve where the previous one
+        left it, so the later ones pay more. Evaluated at once from the
+        cumulative amounts, the tokens minted by all of them are what
+        depositing their sum would mint.
+        """
+        dai = np.asarray(dai, dtype=float)
+        minted, _ = self.bonding_curve.deposit_many(np.cumsum(dai), self._collateral_pool, self._token_supply)
+        tokens = np.diff(minted, prepend=0.)
+        return tokens, dai / tokens
+
+    def deposit(self, dai, tokens=None):
         """
         Deposit DAI after the hatch phase. This means all the incoming deposit goes to the collateral pool.
+
+        tokens, if given, is what quote_deposit(dai) (or the sum of
+        quote_deposits()) said dai mints, and is not computed again.
         """
-        tokens, realized_price = self.bonding_curve.deposit(
-            dai, self._collateral_pool, self._token_supply)
+        if tokens is None:
+            tokens, realized_price = self.quote_deposit(dai)
+        else:
+            realized_price = dai / tokens
         self._token_supply += tokens
         self._collateral_pool += dai
         return tokens, realized_price
 
-    def burn(self, tokens):
+    def quote_burn(self, tokens):
+        """
+        How much DAI burning tokens would take out of the collateral pool (before the exit tribute), and at what
+        realized price, without burning them.
+        """
+        return self.bonding_curve.burn(tokens, self._collateral_pool, self._token_supply)
+
+    def quote_burns(self, tokens: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        quote_burn() for every amount in tokens, as if they were burned one
+        after the other, see quote_deposits().
+        """
+        tokens = np.asarray(tokens, dtype=float)
+        withdrawn, _ = self.bonding_curve.burn_many(np.cumsum(tokens), self._collateral_pool, self._token_supply)
+        dai = np.diff(withdrawn, prepend=0.)
+        return dai, dai / tokens
+
+    def burn(self, tokens, dai=None):
         """
         Burn tokens, with/without an exit tribute.
+
+        dai, if given, is what quote_burn(tokens) (or the sum of
+        quote_burns()) said burning them takes out of the collateral pool, and
+        is not computed again.
         """
-        dai, realized_price = self.bonding_curve.burn(
-            tokens, self._collateral_pool, self._token_supply)
+        if dai is None:
+            dai, realized_price = self.quote_burn(tokens)
+        else:
+            realized_price = dai / tokens
         self._token_supply -= tokens
         self._collateral_pool -= dai
         money_returned = dai
@@ -178,14 +408,19 @@ class Commons:
         """
         Given the size of the common's collateral pool, return how many tokens would x DAI buy you.
         """
-        price = self.bonding_curve.get_token_price(self._collateral_pool)
-        return dai / price
+        return dai / self.token_price()
 
     def token_price(self):
         """
         Query the bonding curve for the current token price, given the size of the commons's collateral pool.
         """
-        return self.bonding_curve.get_token_price(self._collateral_pool)
+        of = (self._collateral_pool, self.bonding_curve.kappa, self.bonding_curve.invariant)
+        if of == self._token_price_of:
+            self.token_price_recomputations_avoided += 1
+            return self._token_price
+        self._token_price = self.bonding_curve.get_token_price(self._collateral_pool)
+        self._token_price_of = of
+        return self._token_price
 
     def spend(self, amount):
         """
@@ -127,6 +127,63 @@ class TokenBatchTest(unittest.TestCase):
         self.assertEqual(b, (500, 500, 0))
 
 
+class TokenBatchesTest(unittest.TestCase):
+    def setUp(self):
+        self.token_batches = []
+        for i in range(300):
+            tb = TokenBatch(1000 + i, 10 * i, vesting_options=VestingOptions(30, 20) if i % 4 else None)
+            tb.update_age(i % 120)
+            if i % 5 == 0:
+                tb.spend(tb.spendable() / 2)
+            self.token_batches.append(tb)
+
+    def test_same_as_token_batches(self):
+        unlocked_fraction = [tb.unlocked_fraction() for tb in self.token_batches]
+        spendable = [tb.spendable() for tb in self.token_batches]
+        total = [tb.total for tb in self.token_batches]
+
+        batches = TokenBatches(self.token_batches)
+        self.assertEqual(len(batches), 300)
+        self.assertEqual(batches.unlocked_fraction().tolist(), unlocked_fraction)
+        self.assertEqual(batches.spendable().tolist(), spendable)
+        self.assertEqual(batches.total().tolist(), total)
+        self.assertEqual(batches.spendable([7, 2]).tolist(), [spendable[7], spendable[2]])
+        self.assertEqual([tb.spendable() for tb in self.token_batches], spendable)
+
+    def test_token_batches_are_rows(self):
+        batches = TokenBatches(self.token_batches)
+        tb = self.token_batches[9]
+        self.assertEqual(batches.add(tb), 9)
+
+        tb.spend(50)
+        self.assertEqual(batches.spendable([9])[0], tb.spendable())
+        self.assertEqual(batches.columns([9])[5].tolist(), [40])
+        self.assertEqual(batches.total([9])[0], tb.total)
+
+        # Ages are all moved at once, and the unlocked fractions are computed
+        # once per day
+        unlocked = batches.unlocked_fraction()
+        self.assertIs(batches.unlocked_fraction(), unlocked)
+        batches.update_age(30)
+        self.assertEqual(tb.age_days, 9 + 30)
+        self.assertEqual(batches.columns([9])[0].tolist(), [39])
+        self.assertGreater(tb.unlocked_fraction(), unlocked[9])
+        self.assertEqual(tb.unlocked_fraction(), vesting_curve(39, 30, 20))
+
+        tb.update_age(20)
+        self.assertEqual(batches.unlocked_fraction()[9], vesting_curve(59, 30, 20))
+
+        # A TokenBatch only ever has one row
+        other = TokenBatches([tb])
+        self.assertEqual(tb.age_days, 59)
+        other.update_age()
+        batches.update_age()
+        self.assertEqual(tb.age_days, 60)
+
+    def test_empty(self):
+        self.assertEqual(TokenBatches([]).spendable().tolist(), [])
+
+
 class CommonsTest(unittest.TestCase):
     def setUp(self):
         # 100,000 DAI invested for 1,000,000 tokens.
@@ -147,6 +204,20 @@ class CommonsTest(unittest.TestCase):
 
         self.assertEqual(self.commons.token_price(), 0.14)
 
+    def test_token_price_is_only_recomputed_when_needed(self):
+        price = self.commons.token_price()
+        self.assertEqual(self.commons.token_price(), price)
+        self.assertEqual(self.commons.token_price_recomputations_avoided, 1)
+
+        self.commons.deposit(1000)
+        self.assertEqual(self.commons.token_price(),
+                         self.commons.bonding_curve.get_token_price(self.commons._collateral_pool))
+        self.assertGreater(self.commons.token_price(), price)
+        self.assertEqual(self.commons.token_price_recomputations_avoided, 2)
+
+        self.assertEqual(self.commons.dai_to_tokens(10), 10 / self.commons.token_price())
+        self.assertEqual(self.commons.token_price_recomputations_avoided, 4)
+
     def test_deposit(self):
         # Deposits 1000 DAI.
         new_deposit = 1000
@@ -194,6 +265,38 @@ class CommonsTest(unittest.TestCase):
         self.assertEqual(self.commons._collateral_pool,
                          old_collateral_pool-(50000*realized_price))
 
+    def test_quote_deposits_one_after_the_other(self):
+        dai = [1000, 5000, 250, 20000]
+        tokens, realized_prices = self.commons.quote_deposits(dai)
+        total_tokens, _ = self.commons.quote_deposit(sum(dai))
+        self.assertAlmostEqual(tokens.sum(), total_tokens, places=6)
+        for amount, t, price in zip(dai, tokens, realized_prices):
+            expected_tokens, expected_price = self.commons.deposit(amount)
+            self.assertAlmostEqual(t, expected_tokens, places=6)
+            self.assertAlmostEqual(price, expected_price, places=12)
+        self.assertTrue(realized_prices[0] < realized_prices[1] < realized_prices[2] < realized_prices[3])
+
+    def test_deposit_quoted(self):
+        old_token_supply = self.commons._token_supply
+        tokens, realized_prices = self.commons.quote_deposits([1000, 5000])
+        self.assertEqual(self.commons._token_supply, old_token_supply)
+
+        self.assertEqual(self.commons.deposit(6000, tokens=tokens.sum()), (tokens.sum(), 6000 / tokens.sum()))
+        self.assertEqual(self.commons._token_supply, old_token_supply + tokens.sum())
+        self.assertEqual(self.commons._collateral_pool, 76000)
+
+    def test_quote_burns_one_after_the_other(self):
+        self.commons.exit_tribute = 0.02
+        tokens = [50000, 1000, 20000]
+        dai, realized_prices = self.commons.quote_burns(tokens)
+        self.assertAlmostEqual(dai.sum(), self.commons.quote_burn(sum(tokens))[0], places=6)
+        old_collateral_pool = self.commons._collateral_pool
+        self.assertEqual(self.commons.burn(sum(tokens), dai=dai.sum())[0], 0.98 * dai.sum())
+        self.assertEqual(self.commons._collateral_pool, old_collateral_pool - dai.sum())
+        # Later sales get less
+        self.assertTrue(realized_prices[0] > realized_prices[1] > realized_prices[2])
+        self.assertEqual(realized_prices[0], 0.1365)
+
     def test_dai_to_tokens(self):
         dai = 5000
         token_amount = self.commons.dai_to_tokens(dai)
@@ -114,16 +114,37 @@ class TestScore(unittest.TestCase):
                                                max_proposal_request=0.5,
                                                days_to_80p_of_max_voting_weight=30,
                                                exit_tribute=0.01,
-                                               timesteps_days=1095)
+                                               timesteps_days=1095, legacy_rng=True)
         c_good = CommonsSimulationConfiguration(random_seed=42, hatchers=20,
                                                 proposals=10, hatch_tribute=0.75,
                                                 max_proposal_request=0.15,
                                                 days_to_80p_of_max_voting_weight=60,
                                                 exit_tribute=0.30,
-                                                timesteps_days=1095)
+                                                timesteps_days=1095, legacy_rng=True)
         self.results_bad, _ = get_simulation_results(c_bad)
         self.results_good, _ = get_simulation_results(c_good)
 
     def test_conviction_is_updated_once_by_timestep(self):
         self.assertEqual(self.results_bad['score'], 485)
         self.assertEqual(self.results_good['score'], 1511)
+
+
+class TestInPlace(unittest.TestCase):
+    def test_in_place_gives_the_same_results_as_cadcad(self):
+        c = CommonsSimulationConfiguration(random_seed=1, timesteps_days=100)
+        results, df_final = get_simulation_results(c)
+        c = CommonsSimulationConfiguration(random_seed=1, timesteps_days=100)
+        results_in_place, df_final_in_place = get_simulation_results(c, in_place=True)
+
+        self.assertEqual(results_in_place, results)
+        self.assertEqual(list(df_final_in_place["token_supply"]), list(df_final["token_supply"]))
+
+    def test_native_engine_gives_the_same_results_as_cadcad(self):
+        c = CommonsSimulationConfiguration(random_seed=1, timesteps_days=100)
+        df = run_simulation(c)
+        c = CommonsSimulationConfiguration(random_seed=1, timesteps_days=100)
+        df_native = run_simulation(c, engine="native")
+
+        self.assertEqual(list(df_native.columns), list(df.columns))
+        columns = ["timestep", "substep", "funding_pool", "token_price", "sentiment"]
+        pd.testing.assert_frame_equal(df_native[columns], df[columns])
@@ -0,0 +1,76 @@
+"""
+Runs many replicates of the same CommonsSimulationConfiguration, each with its
+own random seed, across a pool of processes, and summarises how funding_pool,
+token_price, sentiment and the CommonsScore are distributed over them.
+
+The seed of every replicate is derived from the configuration's random_seed
+with numpy's SeedSequence, so the same random_seed always gives the same
+replicates no matter how many processes they run on.
+"""
+from multiprocessing import Pool
+from typing import List
+
+import numpy as np
+
+from simrunner import get_simulation_results
+from simulation import CommonsSimulationConfiguration
+
+METRICS = ["funding_pool", "token_price", "sentiment"]
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def replicate_seeds(random_seed: int, replicates: int) -> List[int]:
+    """
+    Derives one independent seed per replicate from random_seed.
+    np.random.RandomState only takes 32 bit seeds.
+    """
+    children = np.random.SeedSequence(random_seed).spawn(replicates)
+    return [int(child.generate_state(1)[0]) for child in children]
+
+
+def distribution(values: np.ndarray, quantiles=QUANTILES) -> dict:
+    """
+    Mean and quantiles over the replicates (the first axis) of values. Quantile
+    keys are strings so that the result can be dumped to JSON as is.
+    """
+    return {
+        "mean": np.mean(values, axis=0).tolist(),
+        "quantiles": {str(q): np.quantile(values, q, axis=0).tolist() for q in quantiles},
+    }
+
+
+def _run_replicate(job) -> dict:
+    arguments, in_place, engine = job
+    # Only the result dict is kept, an in place run need not record anything else.
+    result, _ = get_simulation_results(CommonsSimulationConfiguration(**arguments), in_place=in_place, engine=engine,
+                                       scalar_only=in_place)
+    return result
+
+
+def run_monte_carlo(c: CommonsSimulationConfiguration, replicates: int, processes: int = None,
+                    quantiles=QUANTILES, in_place=False, engine="cadcad") -> dict:
+    """
+    Runs replicates copies of c, processes at a time (all cores by default, 1
+    runs them in this process, which is handy for debugging), and returns the
+    distribution of each metric per timestep and of the score.
+
+    in_place and engine are passed on to get_simulation_results().
+    """
+    seeds = replicate_seeds(c.random_seed, replicates)
+    jobs = [(dict(c.arguments(), random_seed=seed), in_place, engine) for seed in seeds]
+
+    if processes == 1:
+        results = [_run_replicate(job) for job in jobs]
+    else:
+        with Pool(processes) as pool:
+            results = pool.map(_run_replicate, jobs)
+
+    summary = {
+        "replicates": replicates,
+        "seeds": seeds,
+        "timestep": results[0]["timestep"],
+    }
+    for metric in METRICS:
+        summary[metric] = distribution(np.array([r[metric] for r in results], dtype=np.float64), quantiles)
+    summary["score"] = distribution(np.array([r["score"] for r in results], dtype=np.float64), quantiles)
+    return summary
@@ -0,0 +1,50 @@
+import importlib.util
+import unittest
+
+import numpy as np
+
+from montecarlo import distribution, replicate_seeds, run_monte_carlo
+from simrunner import get_simulation_results
+from simulation import CommonsSimulationConfiguration
+
+
+class TestMonteCarlo(unittest.TestCase):
+    def test_replicate_seeds(self):
+        seeds = replicate_seeds(1, 5)
+        self.assertEqual(seeds, replicate_seeds(1, 5))
+        self.assertEqual(len(set(seeds)), 5)
+        self.assertNotEqual(seeds, replicate_seeds(2, 5))
+        # The first replicates do not depend on how many there are
+        self.assertEqual(replicate_seeds(1, 3), seeds[:3])
+
+    def test_distribution(self):
+        d = distribution(np.array([[1, 10], [2, 20], [3, 30]]), quantiles=(0.5, 1))
+        self.assertEqual(d["mean"], [2, 20])
+        self.assertEqual(d["quantiles"], {"0.5": [2, 20], "1": [3, 30]})
+
+    def test_run_monte_carlo(self):
+        c = CommonsSimulationConfiguration(random_seed=3, timesteps_days=300)
+        summary = run_monte_carlo(c, 2, processes=2, in_place=True)
+        self.assertEqual(summary["replicates"], 2)
+        self.assertEqual(summary["seeds"], replicate_seeds(3, 2))
+        self.assertEqual(summary["timestep"], list(range(1, 301)))
+
+        results = [get_simulation_results(CommonsSimulationConfiguration(random_seed=seed, timesteps_days=300),
+                                          in_place=True)[0] for seed in summary["seeds"]]
+        for metric in ["funding_pool", "token_price", "sentiment"]:
+            np.testing.assert_allclose(summary[metric]["mean"], np.mean([r[metric] for r in results], axis=0))
+            np.testing.assert_allclose(summary[metric]["quantiles"]["0.05"],
+                                       np.min([r[metric] for r in results], axis=0) * 0.95
+                                       + np.max([r[metric] for r in results], axis=0) * 0.05)
+        self.assertEqual(summary["score"]["mean"], np.mean([r["score"] for r in results]))
+
+    @unittest.skipUnless(importlib.util.find_spec("cadCAD"), "cadCAD is not installed")
+    def test_run_monte_carlo_cadcad(self):
+        """
+        Replicates that run on cadCAD in the same process must not collect the
+        configurations of the ones before them.
+        """
+        c = CommonsSimulationConfiguration(random_seed=3, timesteps_days=60)
+        summary = run_monte_carlo(c, 3, processes=1)
+        self.assertEqual(summary["timestep"], list(range(1, 61)))
+        self.assertEqual(summary, run_monte_carlo(c, 3, processes=1, in_place=True))
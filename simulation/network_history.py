@@ -0,0 +1,250 @@
+"""
+A compact history of the network over a run, instead of a deep copy of the
+whole graph at every timestep (see the network_snapshot block in
+simulation.py).
+
+The network is flattened into plain records: one tuple per node (the
+Participant's sentiment and holdings, or the Proposal's status, conviction,
+age, funds requested and trigger), one per edge (its attributes) and the
+graph attributes (latent affinities, archived support edges, but not the
+TokenBatches that keeps the holdings, which are recorded with each
+Participant, nor the last votes, which only spare the next vote some work).
+NetworkHistory keeps the records of the first recorded timestep and, for
+every following one, only what changed: added, changed and removed nodes,
+edges and graph attributes. New Participants and Proposals, status changes, stakes, sentiment
+and removals all come down to that.
+
+Every keyframe_interval timesteps the full records are kept again, so that
+network_at() rebuilds any timestep by applying at most keyframe_interval
+deltas, and replay() walks the whole history applying one delta per timestep.
+The networks are rebuilt with fresh Participant and Proposal objects, they
+can be analysed (or changed) without touching the history.
+"""
+import copy
+import pickle
+from bisect import bisect_right
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+import networkx as nx
+import numpy as np
+
+from arraynetwork import ArrayNetwork
+from entities import Participant, Proposal
+from hatch import TokenBatch
+
+DEFAULT_KEYFRAME_INTERVAL = 30
+
+NODE_PARTICIPANT = "participant"
+NODE_PROPOSAL = "proposal"
+
+# Graph attributes that are recorded elsewhere (token_batches, with the
+# Participants) or are only remembered to speed up the next timestep (votes,
+# see ParticipantVoting).
+UNRECORDED_GRAPH_ATTRS = frozenset(["token_batches", "votes"])
+
+
+class NetworkState(NamedTuple):
+    nodes: Dict[int, tuple]
+    edges: Dict[Tuple[int, int], tuple]
+    graph: Dict[tuple, object]
+
+
+class NetworkDelta(NamedTuple):
+    """
+    What changed from one recorded timestep to the next. nodes, edges and
+    graph hold the records that were added or changed, the removed_ lists the
+    keys that are gone.
+    """
+    nodes: Dict[int, tuple]
+    removed_nodes: List[int]
+    edges: Dict[Tuple[int, int], tuple]
+    removed_edges: List[Tuple[int, int]]
+    graph: Dict[tuple, object]
+    removed_graph: List[tuple]
+
+
+def _node_record(item) -> tuple:
+    if isinstance(item, Participant):
+        h = item.holdings
+        return (NODE_PARTICIPANT, item.sentiment, h.vesting, h.nonvesting, h.vesting_spent, h.age_days, h.cliff_days,
+                h.halflife_days)
+    if isinstance(item, Proposal):
+        return (NODE_PROPOSAL, item.status, item.conviction, item.age, item.funds_requested, item.trigger)
+    raise TypeError("Cannot record a node holding {!r}".format(item))
+
+
+def _node_item(record: tuple):
+    if record[0] == NODE_PARTICIPANT:
+        _, sentiment, vesting, nonvesting, vesting_spent, age_days, cliff_days, halflife_days = record
+        holdings = TokenBatch(vesting, nonvesting)
+        holdings.vesting_spent = vesting_spent
+        holdings.age_days = age_days
+        holdings.cliff_days = cliff_days
+        holdings.halflife_days = halflife_days
+        # The random functions are the simulation's, a rebuilt Participant is
+        # only meant to be looked at.
+        p = Participant(holdings, None, lambda: sentiment)
+        p._random_number_func = None
+        return p
+    _, status, conviction, age, funds_requested, trigger = record
+    p = Proposal(funds_requested, trigger)
+    p.status = status
+    p.conviction = conviction
+    p.age = age
+    return p
+
+
+def _graph_records(graph: dict) -> Dict[tuple, object]:
+    """
+    Flattens the graph attributes. A dict attribute (latent_affinities,
+    archived_support) becomes an empty dict under (key,) and one record per
+    entry under (key, entry), so that only the entries that changed end up in
+    a delta.
+    """
+    records = {}
+    for key, value in graph.items():
+        if key in UNRECORDED_GRAPH_ATTRS:
+            continue
+        if isinstance(value, dict):
+            records[(key,)] = {}
+            for entry, v in value.items():
+                records[(key, entry)] = copy.copy(v)
+        else:
+            records[(key,)] = copy.copy(value)
+    return records
+
+
+def _graph_attrs(records: Dict[tuple, object]) -> dict:
+    graph = {}
+    for key, value in records.items():
+        if len(key) == 1:
+            graph[key[0]] = copy.copy(value)
+    for key, value in records.items():
+        if len(key) == 2:
+            graph[key[0]][key[1]] = copy.copy(value)
+    return graph
+
+
+def _same(a, b) -> bool:
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return isinstance(a, np.ndarray) and isinstance(b, np.ndarray) and np.array_equal(a, b)
+    return a == b
+
+
+def _diff(old: dict, new: dict) -> Tuple[dict, list]:
+    changed = {k: v for k, v in new.items() if k not in old or not _same(old[k], v)}
+    removed = [k for k in old if k not in new]
+    return changed, removed
+
+
+def _apply(records: dict, changed: dict, removed: list):
+    for k in removed:
+        del records[k]
+    records.update(changed)
+
+
+def network_state(network) -> NetworkState:
+    """
+    The records of a DiGraph or ArrayNetwork.
+    """
+    nodes = {idx: _node_record(network.nodes[idx]["item"]) for idx in network.nodes}
+    edges = {(i, j): tuple(data.items()) for i, j, data in network.edges(data=True)}
+    return NetworkState(nodes, edges, _graph_records(network.graph))
+
+
+def build_network(state: NetworkState, backend=nx.DiGraph):
+    """
+    Rebuilds a network of class backend (nx.DiGraph or ArrayNetwork) out of
+    state.
+    """
+    g = nx.DiGraph()
+    g.graph.update(_graph_attrs(state.graph))
+    for idx, record in state.nodes.items():
+        g.add_node(idx, item=_node_item(record))
+    for (i, j), record in state.edges.items():
+        g.add_edge(i, j, **dict(record))
+    return ArrayNetwork.from_digraph(g) if backend is ArrayNetwork else g
+
+
+class NetworkHistory:
+    """
+    record() the network once per timestep, in order, then ask for the
+    network at any recorded timestep with network_at(), or for all of them
+    with replay().
+    """
+
+    def __init__(self, keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL):
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be at least 1")
+        self.keyframe_interval = keyframe_interval
+        self.timesteps: List[int] = []
+        self.keyframes: List[NetworkState] = []
+        # deltas[p] leads from the records of timesteps[p - 1] to those of
+        # timesteps[p], deltas[0] is None.
+        self.deltas: List[NetworkDelta] = []
+        self.backend = nx.DiGraph
+        self._last: NetworkState = None
+
+    def __len__(self):
+        return len(self.timesteps)
+
+    def record(self, timestep: int, network):
+        if self.timesteps and timestep <= self.timesteps[-1]:
+            raise ValueError("Timestep {} was recorded after timestep {}".format(timestep, self.timesteps[-1]))
+        state = network_state(network)
+        if not self.timesteps:
+            self.backend = type(network)
+            self.deltas.append(None)
+        else:
+            nodes, removed_nodes = _diff(self._last.nodes, state.nodes)
+            edges, removed_edges = _diff(self._last.edges, state.edges)
+            graph, removed_graph = _diff(self._last.graph, state.graph)
+            self.deltas.append(NetworkDelta(nodes, removed_nodes, edges, removed_edges, graph, removed_graph))
+        if len(self.timesteps) % self.keyframe_interval == 0:
+            self.keyframes.append(state)
+        self.timesteps.append(timestep)
+        self._last = state
+
+    def state_at(self, timestep: int) -> NetworkState:
+        position = bisect_right(self.timesteps, timestep) - 1
+        if position < 0 or self.timesteps[position] != timestep:
+            raise KeyError("Timestep {} was not recorded".format(timestep))
+        keyframe = self.keyframes[position // self.keyframe_interval]
+        state = NetworkState(dict(keyframe.nodes), dict(keyframe.edges), dict(keyframe.graph))
+        for delta in self.deltas[position - position % self.keyframe_interval + 1:position + 1]:
+            self._apply(state, delta)
+        return state
+
+    def network_at(self, timestep: int):
+        """
+        A new network, of the class that was recorded, as it was at timestep.
+        """
+        return build_network(self.state_at(timestep), self.backend)
+
+    def replay(self) -> Iterator[Tuple[int, object]]:
+        """
+        Yields (timestep, network) for every recorded timestep, in order.
+        """
+        if not self.timesteps:
+            return
+        first = self.keyframes[0]
+        state = NetworkState(dict(first.nodes), dict(first.edges), dict(first.graph))
+        for timestep, delta in zip(self.timesteps, self.deltas):
+            if delta is not None:
+                self._apply(state, delta)
+            yield timestep, build_network(state, self.backend)
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, path: str) -> "NetworkHistory":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    @staticmethod
+    def _apply(state: NetworkState, delta: NetworkDelta):
+        _apply(state.nodes, delta.nodes, delta.removed_nodes)
+        _apply(state.edges, delta.edges, delta.removed_edges)
+        _apply(state.graph, delta.graph, delta.removed_graph)
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from arraynetwork import ArrayNetwork
+from engine import run_in_place
+from network_history import NetworkHistory, network_state
+from network_utils import get_participants, get_proposals_conviction_list
+from simrunner import run_simulation_with_history
+from simulation import CommonsSimulationConfiguration, bootstrap_simulation, partial_state_update_blocks
+
+
+def run_both(**kwargs):
+    """
+    The history of a run, and deep copies of its network at a few timesteps
+    to check it against.
+    """
+    timesteps = [0, 1, 7, 30, 31, 59, 150, 300]
+    c = CommonsSimulationConfiguration(random_seed=1, timesteps_days=300, **kwargs)
+    _, snapshots = run_in_place(*bootstrap_simulation(c), partial_state_update_blocks,
+                                snapshot_at=[(t, 2 if t else 0) for t in timesteps])
+    history = run_simulation_with_history(
+        CommonsSimulationConfiguration(random_seed=1, timesteps_days=300, **kwargs), keyframe_interval=30)
+    return history, {t: s["network"] for (t, _), s in snapshots.items()}
+
+
+class TestNetworkHistory(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.history, cls.networks = run_both()
+
+    def assertSameNetwork(self, network, expected):
+        self.assertIs(type(network), type(expected))
+        state, expected_state = network_state(network), network_state(expected)
+        self.assertEqual(state.nodes, expected_state.nodes)
+        self.assertEqual(state.edges, expected_state.edges)
+        self.assertEqual(state.graph.keys(), expected_state.graph.keys())
+        for key, value in state.graph.items():
+            np.testing.assert_array_equal(value, expected_state.graph[key])
+        self.assertEqual(list(network.nodes), list(expected.nodes))
+        self.assertEqual(dict(get_participants(network)).keys(), dict(get_participants(expected)).keys())
+        self.assertEqual(get_proposals_conviction_list(network), get_proposals_conviction_list(expected))
+
+    def test_network_at(self):
+        history, networks = self.history, self.networks
+        self.assertEqual(history.timesteps, list(range(301)))
+        self.assertEqual(len(history.keyframes), 11)
+        for t, network in networks.items():
+            self.assertSameNetwork(history.network_at(t), network)
+        with self.assertRaises(KeyError):
+            history.network_at(301)
+
+    def test_replay(self):
+        history, networks = self.history, self.networks
+        replayed = 0
+        for t, network in history.replay():
+            if t in networks:
+                self.assertSameNetwork(network, networks[t])
+                replayed += 1
+        self.assertEqual(replayed, len(networks))
+
+    def test_array_network_with_sparse_archived_support(self):
+        history, networks = run_both(network_backend="array", support_edges="sparse")
+        for t in [1, 150, 300]:
+            self.assertIsInstance(history.network_at(t), ArrayNetwork)
+            self.assertSameNetwork(history.network_at(t), networks[t])
+        self.assertEqual(history.network_at(300).median_affinity(), networks[300].median_affinity())
+        self.assertTrue(history.network_at(300).graph["archived_support"])
+        self.assertIn("votes", networks[300].graph)
+        self.assertNotIn("votes", history.network_at(300).graph)
+
+    def test_deltas_are_small(self):
+        history, networks = self.history, self.networks
+        delta = history.deltas[200]
+        state = network_state(networks[300])
+        self.assertLess(len(delta.nodes), len(state.nodes))
+        # Influence and conflict edges never change once they are created
+        self.assertLess(len(delta.edges), len(state.edges))
+
+    def test_rebuilt_networks_are_independent(self):
+        history, networks = self.history, self.networks
+        network = history.network_at(30)
+        for _, participant in get_participants(network):
+            participant.sentiment = 0
+        self.assertSameNetwork(history.network_at(30), networks[30])
+
+    def test_save_and_load(self):
+        history, networks = self.history, self.networks
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "history.pickle")
+            history.save(path)
+            loaded = NetworkHistory.load(path)
+        self.assertSameNetwork(loaded.network_at(150), networks[150])
+
+    def test_record_in_order(self):
+        history, networks = self.history, self.networks
+        with self.assertRaises(ValueError):
+            history.record(300, networks[300])
@@ -1,15 +1,26 @@
+from array import array
 from typing import Dict, List, Tuple
 
 import networkx as nx
 import numpy as np
 from networkx.classes.reportviews import NodeDataView
 
+import config
+from arraynetwork import ArrayNetwork
 from convictionvoting import trigger_threshold
 from entities import Participant, ParticipantSupport, Proposal, ProposalStatus
-from hatch import TokenBatch
+from hatch import TokenBatch, TokenBatches
+
+# The support edges of an archived Proposal, one row per Participant, see
+# archive_proposal().
+ARCHIVED_SUPPORT_DTYPE = np.dtype([("participant", np.int64), ("affinity", np.float64), ("tokens", np.float64),
+                                   ("conviction", np.float64), ("is_author", bool)])
 
 
 def get_edges_by_type(network: nx.DiGraph, edge_type_selection: str, participant_idx: int = None):
+    if isinstance(network, ArrayNetwork):
+        return network.edges_by_type(edge_type_selection, participant_idx)
+
     def filter_by_type(n1, n2):
         if (participant_idx is None or n1 == participant_idx) and network.edges[(n1, n2)]["type"] == edge_type_selection:
             return True
@@ -29,6 +40,9 @@ def get_edges_by_participant_and_type(network: nx.DiGraph, participant_idx: int,
 
 
 def get_proposals(network: nx.DiGraph, status: ProposalStatus = None):
+    if isinstance(network, ArrayNetwork):
+        return network.proposals(status)
+
     def filter_proposal(n):
         if isinstance(network.nodes[n]["item"], Proposal):
             if status:
@@ -41,6 +55,9 @@ def get_proposals(network: nx.DiGraph, status: ProposalStatus = None):
 
 
 def get_participants(network: nx.DiGraph) -> NodeDataView:
+    if isinstance(network, ArrayNetwork):
+        return network.participants()
+
     def filter_participant(n):
         if isinstance(network.nodes[n]["item"], Participant):
             return True
@@ -64,6 +81,10 @@ def add_proposal(network: nx.DiGraph, p: Proposal, proposed_by: int, random_numb
     j = max(network.nodes) + 1
     network.add_node(j, item=p)
     network = setup_support_edges(network, random_number_func, j)
+    if not network.has_edge(proposed_by, j):
+        # Sparse support edges: the author's affinity was too low to get an
+        # edge, and is about to be replaced anyway.
+        pop_latent_affinity(network, proposed_by)
     # The Participant who created this Proposal must have maximum affinity and need to be marked as author
     network.add_edge(proposed_by, j, support=ParticipantSupport(affinity=1, tokens=0, conviction=0, is_author=True), type="support")
     return network, j
@@ -72,11 +93,65 @@ def add_proposal(network: nx.DiGraph, p: Proposal, proposed_by: int, random_numb
 def add_participant(network: nx.DiGraph, p: Participant, exponential_func, random_number_func) -> Tuple[nx.DiGraph, int]:
     j = max(network.nodes) + 1
     network.add_node(j, item=p)
+    get_token_batches(network, [(j, p)])
     # network = setup_influence_edges_single(network, j, exponential_func) # TODO: Disabled as these aren't being used on any model policy
     network = setup_support_edges(network, random_number_func, j)
     return network, j
 
 
+def remove_participant(network: nx.DiGraph, idx: int) -> nx.DiGraph:
+    network.remove_node(idx)
+    network.graph.get("latent_affinities", {}).pop(idx, None)
+    network.graph.get("votes", (None, {}))[1].pop(idx, None)
+    archived_support = network.graph.get("archived_support", {})
+    for proposal_idx, archived in archived_support.items():
+        kept = archived["participant"] != idx
+        if not kept.all():
+            archived_support[proposal_idx] = archived[kept]
+    return network
+
+
+def archive_proposal(network: nx.DiGraph, proposal_idx: int) -> nx.DiGraph:
+    """
+    Moves the support edges of a FAILED or COMPLETED Proposal out of the
+    network, into an ARCHIVED_SUPPORT_DTYPE array in
+    network.graph["archived_support"][proposal_idx]. Nothing votes on or
+    stakes on such a Proposal any more, so the policies need not walk past its
+    edges every substep. The Proposal itself stays in the network, and the
+    edges' affinities still count towards the median affinity.
+
+    as_digraph(network, archived=True) puts the edges back, e.g. for export.
+    """
+    supports = [(i, support) for i, _, support in network.in_edges(proposal_idx, data="support") if support]
+    network.graph.setdefault("archived_support", {})[proposal_idx] = np.array(
+        [(i, support.affinity, support.tokens, support.conviction, support.is_author) for i, support in supports],
+        dtype=ARCHIVED_SUPPORT_DTYPE)
+    for i, support in supports:
+        network.remove_edge(i, proposal_idx)
+        add_latent_affinity(network, i, support.affinity)
+    return network
+
+
+def add_latent_affinity(network: nx.DiGraph, participant_idx: int, affinity: float):
+    """
+    Remembers the affinity of a support edge that is not in the network,
+    because a network with sparse support edges did not create it (see
+    setup_support_edges()) or because it was archived.
+    """
+    if isinstance(network, ArrayNetwork):
+        return network.add_latent_affinity(participant_idx, affinity)
+    network.graph.setdefault("latent_affinities", {}).setdefault(participant_idx, array("d")).append(affinity)
+
+
+def pop_latent_affinity(network: nx.DiGraph, participant_idx: int) -> float:
+    """
+    Forgets the affinity that was last remembered for participant_idx.
+    """
+    if isinstance(network, ArrayNetwork):
+        return network.pop_latent_affinity(participant_idx)
+    return network.graph["latent_affinities"][participant_idx].pop()
+
+
 def create_network(token_batches: List[TokenBatch], probability_func, random_number_func) -> nx.DiGraph:
     """
     Creates a new DiGraph with Participants corresponding to the input
@@ -88,9 +163,27 @@ def create_network(token_batches: List[TokenBatch], probability_func, random_num
         # Make the initial participants have sentiments between 0.5 and 1
         p_instance.sentiment = 0.5 + 0.5 * random_number_func()
         network.add_node(i, item=p_instance)
+    network.graph["token_batches"] = TokenBatches(token_batches)
     return network
 
 
+def get_token_batches(network: nx.DiGraph, participants=None) -> Tuple[TokenBatches, np.ndarray]:
+    """
+    network.graph["token_batches"], the TokenBatches that keeps the holdings of
+    the network's Participants, and the rows of the holdings of participants
+    (get_participants(network) by default). Holdings it does not keep yet, as
+    in a network that was put together by hand or rebuilt by NetworkHistory,
+    are added to it first.
+    """
+    token_batches = network.graph.get("token_batches")
+    if token_batches is None:
+        token_batches = network.graph["token_batches"] = TokenBatches()
+    if participants is None:
+        participants = get_participants(network)
+    rows = np.array([token_batches.add(participant.holdings) for _, participant in participants], dtype=int)
+    return token_batches, rows
+
+
 def influence(exponential_func, scale=1, sigmas=3):
     """
     Calculates the likelihood of one node having influence over another node. If
@@ -206,7 +299,16 @@ def setup_support_edges(network: nx.DiGraph, random_number_func, idx=None) -> nx
     Takes an optional node index. If the node is a Participant, it will setup
     support edges to other Proposal nodes and vice versa if the node is a
     Proposal.
+
+    If the network has sparse support edges (network.graph["sparse_support"]),
+    an edge is only created if its affinity is high enough for the Participant
+    to ever vote on the Proposal, see Participant.vote_on_candidate_proposals().
+    The other edges would never carry tokens or conviction, only their affinity
+    is kept (for the median affinity), in network.graph["latent_affinities"].
+    The same random numbers are drawn either way.
     """
+    sparse = network.graph.get("sparse_support", False)
+
     def create_support_edge(n, i, j, random_number_func):
         # Token Holder -> Proposal Relationship
         # Looks like Zargham skewed this distribution heavily towards
@@ -215,6 +317,9 @@ def setup_support_edges(network: nx.DiGraph, random_number_func, idx=None) -> nx
         # will be a few Proposals that they really care about.
         rv = random_number_func()
         a_rv = 1-4*(1-rv)*rv
+        if sparse and a_rv <= config.candidate_proposals_min_cutoff:
+            add_latent_affinity(n, i, a_rv)
+            return n
         n.add_edge(i, j, support=ParticipantSupport(affinity=a_rv, tokens=0, conviction=0), type="support")
         return n
     participants = dict(get_participants(network))
@@ -236,12 +341,16 @@ def setup_support_edges(network: nx.DiGraph, random_number_func, idx=None) -> nx
     return network
 
 
-def bootstrap_network(n_participants: List[TokenBatch], n_proposals: int, funding_pool: float, token_supply: float, max_proposal_request: float, probability_func, random_number_func, gamma_func, exponential_func) -> nx.DiGraph:
+def bootstrap_network(n_participants: List[TokenBatch], n_proposals: int, funding_pool: float, token_supply: float, max_proposal_request: float, probability_func, random_number_func, gamma_func, exponential_func, sparse_support=False) -> nx.DiGraph:
     """
     Convenience function that creates a network ready for simulation in
     the Python notebook in one line.
+
+    sparse_support=True only creates the support edges that can carry stake,
+    see setup_support_edges().
     """
     n = create_network(n_participants, probability_func, random_number_func)
+    n.graph["sparse_support"] = sparse_support
 
     for _ in range(n_proposals):
         idx = len(n)
@@ -256,6 +365,8 @@ def bootstrap_network(n_participants: List[TokenBatch], n_proposals: int, fundin
 
 
 def calc_total_funds_requested(network: nx.DiGraph):
+    if isinstance(network, ArrayNetwork):
+        return network.total_funds_requested()
     candidates = get_proposals(network, status=ProposalStatus.CANDIDATE)
     fund_requests = [j[1].funds_requested for j in candidates]
     total_funds_requested = np.sum(fund_requests)
@@ -263,11 +374,16 @@ def calc_total_funds_requested(network: nx.DiGraph):
 
 
 def calc_median_affinity(network: nx.DiGraph):
+    if isinstance(network, ArrayNetwork):
+        return network.median_affinity()
+
     supporters = get_edges_by_type(network, 'support')
-    if len(supporters) == 0:
+    affinities = [network.edges[e]['support'].affinity for e in supporters]
+    for latent in network.graph.get("latent_affinities", {}).values():
+        affinities.extend(latent)
+    if len(affinities) == 0:
         raise Exception("The network has 0 support edges!")
 
-    affinities = [network.edges[e]['support'].affinity for e in supporters]
     median_affinity = np.median(affinities)
     return median_affinity
 
@@ -277,6 +393,8 @@ def calc_total_conviction(network: nx.DiGraph, proposal_idx: int) -> float:
     if not isinstance(proposal, Proposal):
         raise Exception(
             "proposal_idx must point to a node that has a Proposal")
+    if isinstance(network, ArrayNetwork):
+        return network.total_conviction(proposal_idx)
 
     incoming_edges = network.in_edges(proposal_idx, data="support")
     convictions = [support.conviction for _, _, support in incoming_edges if support]
@@ -284,6 +402,32 @@ def calc_total_conviction(network: nx.DiGraph, proposal_idx: int) -> float:
     return np.sum(convictions)
 
 
+def update_conviction(network: nx.DiGraph, alpha: float) -> List[Tuple[int, int]]:
+    """
+    Calculates conviction = tokens + alpha * prior conviction for every support
+    edge to a CANDIDATE Proposal, as one NumPy operation over all of them.
+    Returns the support edges that were updated.
+
+    An ArrayNetwork already keeps tokens and conviction in contiguous arrays.
+    For a DiGraph they are gathered into arrays first and the results are
+    written back to the edges afterwards.
+    """
+    if isinstance(network, ArrayNetwork):
+        return network.edges_of_rows(network.update_conviction(alpha, ProposalStatus.CANDIDATE))
+
+    edges = [(i, j) for i, j in get_edges_by_type(network, "support")
+             if network.nodes[j]["item"].status == ProposalStatus.CANDIDATE]
+    supports = [network.edges[e]["support"] for e in edges]
+    tokens = np.array([s.tokens for s in supports], dtype=np.float64)
+    prior_conviction = np.array([s.conviction for s in supports], dtype=np.float64)
+
+    conviction = tokens + alpha * prior_conviction
+
+    for e, support, c in zip(edges, supports, conviction.tolist()):
+        network.edges[e]["support"] = support._replace(conviction=c)
+    return edges
+
+
 def calc_total_affinity(network: nx.DiGraph) -> float:
     view = network.edges(data="support")
     affinities = [support.affinity for _, _, support in view]
@@ -291,6 +435,8 @@ def calc_total_affinity(network: nx.DiGraph) -> float:
 
 
 def calc_avg_sentiment(network: nx.DiGraph) -> float:
+    if isinstance(network, ArrayNetwork):
+        return network.avg_sentiment()
     participants = get_participants(network)
     sentiment_total = 0.0
     for _, participant in participants:
@@ -309,6 +455,31 @@ def find_in_edges_of_type_for_proposal(network: nx.DiGraph, proposal_idx: int, e
     return ans
 
 
+def as_digraph(network, archived=False) -> nx.DiGraph:
+    """
+    Returns the network as a networkx DiGraph, materialising it if the
+    simulation was run with the ArrayNetwork backend.
+
+    With archived=True, the support edges of archived Proposals are put back
+    (in a copy), see archive_proposal().
+    """
+    if isinstance(network, ArrayNetwork):
+        network = network.to_digraph()
+    elif archived:
+        network = network.copy()
+    if archived:
+        # The affinities of the edges put back are not latent any more
+        latent_affinities = {i: array("d", a) for i, a in network.graph.get("latent_affinities", {}).items()}
+        for proposal_idx, archived_support in network.graph.pop("archived_support", {}).items():
+            for i, affinity, tokens, conviction, is_author in archived_support.tolist():
+                network.add_edge(i, proposal_idx, support=ParticipantSupport(
+                    affinity=affinity, tokens=tokens, conviction=conviction, is_author=is_author), type="support")
+                latent_affinities[i].remove(affinity)
+        if latent_affinities:
+            network.graph["latent_affinities"] = latent_affinities
+    return network
+
+
 def get_proposals_conviction_list(network):
     """
     Convenience function. Return a list of proposals' conviction of
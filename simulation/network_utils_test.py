@@ -7,12 +7,13 @@ import numpy as np
 from entities import Participant, Proposal, ProposalStatus
 from hatch import TokenBatch, VestingOptions
 from utils import new_probability_func, new_exponential_func, new_gamma_func, new_random_number_func
-from network_utils import (add_proposal, add_participant, bootstrap_network, calc_avg_sentiment,
+from network_utils import (add_proposal, add_participant, archive_proposal, as_digraph, bootstrap_network, calc_avg_sentiment,
                            calc_median_affinity, calc_total_affinity, calc_total_conviction,
                            calc_total_funds_requested, find_in_edges_of_type_for_proposal, get_edges_by_type, get_edges_by_participant_and_type,
-                           get_participants, get_proposals, get_proposals_conviction_list,
+                           get_participants, get_proposals, get_proposals_conviction_list, get_token_batches,
+                           remove_participant,
                            setup_conflict_edges, setup_influence_edges_bulk,
-                           setup_influence_edges_single, setup_support_edges)
+                           setup_influence_edges_single, setup_support_edges, update_conviction)
 
 
 class TestNetworkUtils(unittest.TestCase):
@@ -34,6 +35,32 @@ class TestNetworkUtils(unittest.TestCase):
         res = get_participants(self.network)
         self.assertEqual(len(res), 5)
 
+    def test_get_token_batches(self):
+        # Put together by hand, the holdings are added when they are asked for
+        self.assertNotIn("token_batches", self.network.graph)
+        token_batches, rows = get_token_batches(self.network)
+        self.assertIs(self.network.graph["token_batches"], token_batches)
+        self.assertEqual(rows.tolist(), [0, 1, 2, 3, 4])
+
+        participant = self.network.nodes[4]["item"]
+        participant.holdings = TokenBatch(10, 5)
+        token_batches.update_age(3)
+        _, rows = get_token_batches(self.network, [(4, participant)])
+        self.assertEqual(rows.tolist(), [5])
+        self.assertEqual(token_batches.total(rows).tolist(), [15])
+        self.assertEqual(participant.holdings.age_days, 0)
+
+        network = bootstrap_network([TokenBatch(1000, 0) for _ in range(4)], 1, 3000, 4e6, 0.2,
+                                    self.params["probability_func"], self.params["random_number_func"],
+                                    self.params["gamma_func"], self.params["exponential_func"])
+        token_batches = network.graph["token_batches"]
+        self.assertEqual(len(token_batches), 4)
+        network, j = add_participant(network, Participant(TokenBatch(0, 50), self.params["probability_func"],
+                                                          self.params["random_number_func"]),
+                                     self.params["exponential_func"], self.params["random_number_func"])
+        self.assertEqual(get_token_batches(network)[1].tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(token_batches.total().tolist(), [1000, 1000, 1000, 1000, 50])
+
     def test_get_proposals(self):
         res = get_proposals(self.network)
         self.assertEqual(len(res), 5)
@@ -217,11 +244,85 @@ class TestNetworkUtils(unittest.TestCase):
             self.assertIsInstance(network.nodes[i]["item"], Participant)
             self.assertIsInstance(network.nodes[j]["item"], Proposal)
 
+    def test_setup_support_edges_sparse(self):
+        """
+        Tests that a network with sparse support edges only gets the edges that
+        could ever be voted on, and keeps the affinities of the others.
+        """
+        dense = setup_support_edges(self.network.copy(), new_random_number_func(seed=1))
+        sparse = self.network.copy()
+        sparse.graph["sparse_support"] = True
+        sparse = setup_support_edges(sparse, new_random_number_func(seed=1))
+
+        kept = [(i, j) for i, j, support in dense.edges(data="support") if support.affinity > 0.5]
+        self.assertGreater(len(kept), 0)
+        self.assertLess(len(kept), 25)
+        self.assertEqual(list(sparse.edges), kept)
+        for i, j in kept:
+            self.assertEqual(sparse.edges[i, j]["support"], dense.edges[i, j]["support"])
+        latent = sparse.graph["latent_affinities"]
+        self.assertEqual(sum(len(a) for a in latent.values()) + len(kept), 25)
+        self.assertTrue(all(a <= 0.5 for affinities in latent.values() for a in affinities))
+        self.assertEqual(calc_median_affinity(sparse), calc_median_affinity(dense))
+
+    def test_sparse_support_edges_follow_the_network(self):
+        """
+        Tests that the median affinity of a network with sparse support edges
+        stays the same as with dense ones when Proposals and Participants come
+        and go.
+        """
+        dense = setup_support_edges(self.network.copy(), new_random_number_func(seed=3))
+        sparse = self.network.copy()
+        sparse.graph["sparse_support"] = True
+        sparse = setup_support_edges(sparse, new_random_number_func(seed=3))
+        dense_rng, sparse_rng = new_random_number_func(seed=4), new_random_number_func(seed=4)
+
+        for author in [0, 2, 4, 6, 8]:
+            dense, j = add_proposal(dense, Proposal(10, 5), author, dense_rng)
+            sparse, _ = add_proposal(sparse, Proposal(10, 5), author, sparse_rng)
+            self.assertTrue(sparse.edges[author, j]["support"].is_author)
+            self.assertEqual(calc_median_affinity(sparse), calc_median_affinity(dense))
+
+        dense = remove_participant(dense, 2)
+        sparse = remove_participant(sparse, 2)
+        self.assertNotIn(2, sparse.graph["latent_affinities"])
+        self.assertEqual(calc_median_affinity(sparse), calc_median_affinity(dense))
+
+    def test_archive_proposal(self):
+        """
+        Tests that archiving a Proposal moves its support edges out of the
+        network, and that they can be put back.
+        """
+        network = setup_support_edges(self.network, new_random_number_func(seed=1))
+        network, j = add_proposal(network, Proposal(23, 111), 0, new_random_number_func(seed=2))
+        network.edges[2, j]["support"] = network.edges[2, j]["support"]._replace(tokens=5, conviction=7)
+        full = network.copy()
+        median_affinity = calc_median_affinity(network)
+
+        network = archive_proposal(network, j)
+        self.assertIn(j, network.nodes)
+        self.assertEqual(find_in_edges_of_type_for_proposal(network, j, "support"), [])
+        self.assertEqual(len(network.edges), 25)
+        self.assertEqual(calc_median_affinity(network), median_affinity)
+
+        restored = as_digraph(network, archived=True)
+        self.assertEqual(len(network.edges), 25)
+        self.assertEqual(sorted(restored.edges), sorted(full.edges))
+        for e in full.edges:
+            self.assertEqual(restored.edges[e]["support"], full.edges[e]["support"])
+        self.assertEqual(calc_median_affinity(restored), median_affinity)
+
+        network = remove_participant(network, 2)
+        full.remove_node(2)
+        self.assertEqual(network.graph["archived_support"][j]["participant"].tolist(), [0, 4, 6, 8])
+        self.assertEqual(calc_median_affinity(network), calc_median_affinity(full))
+        self.assertEqual(sorted(as_digraph(network, archived=True).edges), sorted(full.edges))
+
     def test_bootstrap_network(self):
         """
         Tests that the network was created and that the subcomponents work too.
         """
-        token_batches = [TokenBatch(1000, VestingOptions(10, 30))
+        token_batches = [TokenBatch(1000, 0, vesting_options=VestingOptions(10, 30))
                          for _ in range(4)]
         network = bootstrap_network(token_batches,
                                     1, 3000, 4e6, 0.2, self.params["probability_func"],
@@ -297,6 +398,23 @@ class TestNetworkUtils(unittest.TestCase):
             ans = calc_total_conviction(self.network, i)
             self.assertEqual(ans, 5)
 
+    def test_update_conviction(self):
+        """
+        Ensure that conviction = tokens + alpha * prior conviction is applied
+        to every support edge of a CANDIDATE Proposal, and only to those.
+        """
+        self.network = setup_support_edges(self.network, self.params["random_number_func"])
+        self.network.nodes[3]["item"].status = ProposalStatus.ACTIVE
+        for u, v in get_edges_by_type(self.network, "support"):
+            self.network.edges[u, v]["support"] = self.network.edges[u, v]["support"]._replace(tokens=10, conviction=2)
+
+        updated = update_conviction(self.network, 0.5)
+        self.assertEqual(len(updated), 20)
+        for u, v in get_edges_by_type(self.network, "support"):
+            expected = 2 if v == 3 else 11
+            self.assertEqual(self.network.edges[u, v]["support"].conviction, expected)
+            self.assertEqual((u, v) in updated, v != 3)
+
     def test_calc_total_affinity(self):
         """
         Ensure that the affinities in the support edges add up to >0 (since they
@@ -1,14 +1,15 @@
 import config
-import copy
 import numpy as np
 
 import config
 from convictionvoting import trigger_threshold
-from entities import Participant, Proposal, ProposalStatus
+from entities import (Participant, Proposal, ProposalStatus, participants_buy, participants_sell,
+                      participants_want_to_exit)
 from hatch import TokenBatch
-from network_utils import (add_proposal, add_participant, calc_median_affinity, calc_total_conviction,
-                           calc_total_funds_requested, find_in_edges_of_type_for_proposal, get_edges_by_type,
-                           get_participants, get_proposals, get_proposals_by_participant_and_status)
+from network_utils import (add_proposal, add_participant, archive_proposal, calc_median_affinity,
+                           calc_total_conviction, calc_total_funds_requested, find_in_edges_of_type_for_proposal,
+                           get_participants, get_proposals, get_proposals_by_participant_and_status,
+                           get_token_batches, remove_participant, update_conviction)
 
 
 class GenerateNewParticipant:
@@ -87,10 +88,13 @@ class GenerateNewParticipant:
 
     @staticmethod
     def su_update_participants_token_batch_age(params, step, sL, s, _input, **kwargs):
+        """
+        Ages the holdings of all Participants by a day at once, see
+        TokenBatches.update_age().
+        """
         network = s["network"]
-        participants = get_participants(network)
-        for i, participant in participants:
-            participant.update_token_batch_age()
+        token_batches, _ = get_token_batches(network)
+        token_batches.update_age()
 
         return "network", network
 
@@ -194,6 +198,21 @@ class ActiveProposals:
 
         return "network", network
 
+    @staticmethod
+    def su_archive_failed_and_completed_proposals(params, step, sL, s, _input, **kwargs):
+        """
+        Once the Participants' sentiment has been updated, nothing looks at the
+        support edges of FAILED or COMPLETED Proposals any more. Move them out
+        of the network, so that it only holds CANDIDATE and ACTIVE ones.
+        """
+        network = s["network"]
+        policy_output_passthru = s["policy_output"]
+
+        for idx in policy_output_passthru["failed"] + policy_output_passthru["succeeded"]:
+            network = archive_proposal(network, idx)
+
+        return "network", network
+
 
 class ProposalFunding:
     @staticmethod
@@ -267,18 +286,12 @@ class ProposalFunding:
         network = s["network"]
         alpha = params["alpha_days_to_80p_of_max_voting_weight"]
 
-        support_edges = get_edges_by_type(network, "support")
-        for i, j in support_edges:
-            proposal_status = network.nodes[j]['item'].status
-            if proposal_status == ProposalStatus.CANDIDATE:
-                edge = network.edges[i, j]
-                prior_conviction = edge['support'].conviction
-                current_tokens = edge['support'].tokens
-
-                edge['support'] = edge['support']._replace(conviction=current_tokens + alpha*prior_conviction)
-                if params.get("debug") and s["timestep"] == 1:
-                    print("ProposalFunding: Participant {} initially has staked {} tokens on Proposal {}, which will result in {} conviction in the next timestep".format(
-                        i, current_tokens, j, edge["support"].conviction))
+        updated_edges = update_conviction(network, alpha)
+        if params.get("debug") and s["timestep"] == 1:
+            for i, j in updated_edges:
+                support = network.edges[i, j]["support"]
+                print("ProposalFunding: Participant {} initially has staked {} tokens on Proposal {}, which will result in {} conviction in the next timestep".format(
+                    i, support.tokens, j, support.conviction))
 
         return "network", network
 
@@ -294,12 +307,29 @@ class ParticipantVoting:
 
         Then, Participant.stake_across_all_supported_proposals() will tell us
         how much it will stake on each of them.
+
+        A Participant's stakes only depend on its holdings and on the
+        candidate Proposals it has support edges to, so only the Participants
+        for which either changed since the last vote are asked again. The
+        others would stake exactly what is already on their support edges, and
+        are left out of the result. What every Participant was asked with is
+        returned as "votes", for su_update_participants_votes() to keep.
         """
         network = s["network"]
         participants = get_participants(network)
+        candidates = frozenset(idx for idx, _ in get_proposals(network, status=ProposalStatus.CANDIDATE))
+        unchanged = ParticipantVoting._unchanged_votes(network, candidates)
+        votes = {}
 
         participants_stakes = {}
         for participant_idx, participant in participants:
+            total = participant.holdings.total
+            vote = unchanged(participant_idx, total)
+            if vote is not None:
+                participant.skip_voting()
+                votes[participant_idx] = vote
+                continue
+
             proposal_idx_affinity = {}  # {4: 0.9, 5: 0.9}
             candidate_proposals = get_proposals_by_participant_and_status(
                 network, participant_idx=participant_idx, status_filter=[ProposalStatus.CANDIDATE])
@@ -316,13 +346,42 @@ class ParticipantVoting:
                 stake_across_all_supported_proposals_input)
 
             participants_stakes[participant_idx] = stakes
+            votes[participant_idx] = (total, frozenset(proposal_idx_affinity))
 
             if params.get("debug"):
                 if proposals_that_participant_cares_enough_to_vote_on:
                     print("ParticipantVoting: Participant {} was given Proposals with corresponding affinities {} and he decided to vote on {}, distributing his tokens thusly {}".format(
                         participant_idx, proposal_idx_affinity, proposals_that_participant_cares_enough_to_vote_on, stakes))
 
-        return {"participants_stake_on_proposals": participants_stakes}
+        return {"participants_stake_on_proposals": participants_stakes, "votes": (candidates, votes)}
+
+    @staticmethod
+    def _unchanged_votes(network, candidates: frozenset):
+        """
+        Returns unchanged(participant_idx, total), which gives what the
+        Participant was last asked with (network.graph["votes"]), if its vote
+        cannot have changed since: it has the same total holdings, and no
+        candidate Proposal it had support edges to stopped being one, nor did
+        one it has support edges to become one. remove_participant() forgets
+        the votes of a Participant, so a new one never gets them.
+        """
+        last_candidates, votes = network.graph.get("votes", (None, {}))
+        if last_candidates is None:
+            return lambda participant_idx, total: None
+        removed = last_candidates - candidates
+        # New Proposals, and new edges to them, are only ever added as
+        # candidates
+        supporting_added = {i for j in candidates - last_candidates for i, _ in network.in_edges(j)}
+
+        def unchanged(participant_idx, total):
+            vote = votes.get(participant_idx)
+            if vote is None or participant_idx in supporting_added:
+                return None
+            last_total, last_candidates_seen = vote
+            if last_total == total and last_candidates_seen.isdisjoint(removed):
+                return vote
+            return None
+        return unchanged
 
     @staticmethod
     def su_update_participants_votes(params, step, sL, s, _input, **kwargs):
@@ -330,8 +389,13 @@ class ParticipantVoting:
         Simply update the support edges with the new amount of tokens the
         Participant has staked on the Proposal. Leave the conviction calculation
         to another state update function.
+
+        The votes the policy was given are kept in network.graph["votes"] for
+        the next one.
         """
         network = s["network"]
+        if "votes" in _input:
+            network.graph["votes"] = _input["votes"]
         _input = _input["participants_stake_on_proposals"]
 
         for participant_idx, v in _input.items():
@@ -342,7 +406,9 @@ class ParticipantVoting:
                 # the affinities in
                 # p_participant_votes_on_proposal_according_to_affinity()
                 # Also, do not recalculate conviction here. Leave that to ProposalFunding.su_calculate_conviction()
-                network[participant_idx][proposal_idx]["support"] = network[participant_idx][proposal_idx]["support"]._replace(tokens=tokens_staked)
+                support = network[participant_idx][proposal_idx]["support"]
+                if support.tokens != tokens_staked:
+                    network[participant_idx][proposal_idx]["support"] = support._replace(tokens=tokens_staked)
 
         return "network", network
 
@@ -361,36 +427,54 @@ class ParticipantBuysTokens:
     update function changes the Commons object each time a Participant buys
     in/sells out, then it would have to update the network and commons object in
     the same function, which is not allowed in cadCAD.
+
+    With params["slippage"] == "sequential", Participants buy (and sell) one
+    after the other instead, each at the price the previous ones left. The
+    policy works out every Participant's tokens and price at once with
+    Commons.quote_deposits(), and the state update functions apply them
+    without evaluating the curve again.
     """
     @staticmethod
     def p_decide_to_buy_tokens_bulk(params, step, sL, s, **kwargs):
         network = s["network"]
         commons = s["commons"]
-        participants = get_participants(network)
-        ans = {}
-        total_dai = 0
-        for i, participant in participants:
-            # If a participant decides to buy, it will be specified in units of DAI.
-            # If a participant decides to sell, it will be specified in units of tokens.
-            x = participant.buy()
-            if x > 0:
-                total_dai += x
-                ans[i] = x
+        participants = list(get_participants(network))
+        # If a participant decides to buy, it will be specified in units of DAI.
+        # If a participant decides to sell, it will be specified in units of tokens.
+        idxs = [i for i, _ in participants]
+        sentiment = np.array([participant.sentiment for _, participant in participants], dtype=float)
+        x = participants_buy(sentiment, params["probability_func"], params["random_number_func"])
+        buyers = np.flatnonzero(x > 0)
+        ans = dict(zip([idxs[k] for k in buyers], x[buyers].tolist()))
+        total_dai = sum(ans.values())
 
         # Now that we have the sum of DAI, ask the Commons object how many
         # tokens this would be minted as a result. This will be inaccurate due
         # to slippage, and we need the result of this policy to be final to
-        # avoid chaining 2 state update functions, so we run the deposit on a
-        # throwaway copy of Commons
+        # avoid chaining 2 state update functions, so we only quote the
+        # deposit here
         if total_dai == 0:
             if params.get("debug"):
                 print(
                     "ParticipantBuysTokens: No Participants bought tokens in timestep {}".format(step))
             return {"participant_decisions": ans, "total_dai": 0, "tokens": 0, "token_price": 0, "final_token_distribution": {}}
 
+        elif params.get("slippage") == "sequential":
+            # Every Participant buys after the previous one, and gets the
+            # tokens its own DAI mints at that point of the curve.
+            participant_tokens, participant_prices = commons.quote_deposits(x[buyers])
+            tokens = participant_tokens.sum()
+            final_token_distribution = dict(zip(ans, (participant_tokens / tokens).tolist()))
+            if params.get("debug"):
+                print("ParticipantBuysTokens: These Participants have decided to buy tokens with this amount of DAI: "
+                      "{}, at these prices: {}".format(ans, participant_prices))
+            return {"participant_decisions": ans, "total_dai": total_dai, "tokens": tokens,
+                    "token_price": total_dai / tokens, "final_token_distribution": final_token_distribution,
+                    "participant_tokens": dict(zip(ans, participant_tokens.tolist())),
+                    "participant_prices": dict(zip(ans, participant_prices.tolist()))}
+
         else:
-            commons2 = copy.copy(commons)
-            tokens, token_price = commons2.deposit(total_dai)
+            tokens, token_price = commons.quote_deposit(total_dai)
 
             final_token_distribution = {}
             for i in ans:
@@ -408,7 +492,10 @@ class ParticipantBuysTokens:
     def su_buy_participants_tokens(params, step, sL, s, _input, **kwargs):
         commons = s["commons"]
 
-        if _input["total_dai"] > 0:
+        if _input["total_dai"] > 0 and "participant_tokens" in _input:
+            # Already evaluated along the curve by quote_deposits()
+            commons.deposit(_input["total_dai"], tokens=_input["tokens"])
+        elif _input["total_dai"] > 0:
             tokens, realized_price = commons.deposit(_input["total_dai"])
             if _input["tokens"] != tokens or _input["token_price"] != realized_price:
                 raise Exception("ParticipantBuysTokens: {} tokens were minted at a price of {} (expected: {} with price {})".format(
@@ -423,9 +510,14 @@ class ParticipantBuysTokens:
         final_token_distribution = _input["final_token_distribution"]
         tokens = _input["tokens"]
 
+        participant_tokens = _input.get("participant_tokens")
+
         for participant_idx, decision in decisions.items():
-            network.nodes[participant_idx]["item"].increase_holdings(
-                final_token_distribution[participant_idx] * tokens)
+            if participant_tokens is not None:
+                network.nodes[participant_idx]["item"].increase_holdings(participant_tokens[participant_idx])
+            else:
+                network.nodes[participant_idx]["item"].increase_holdings(
+                    final_token_distribution[participant_idx] * tokens)
 
         return "network", network
 
@@ -435,30 +527,44 @@ class ParticipantSellsTokens:
     def p_decide_to_sell_tokens_bulk(params, step, sL, s, **kwargs):
         network = s["network"]
         commons = s["commons"]
-        participants = get_participants(network)
-        ans = {}
-        total_tokens = 0
-        for i, participant in participants:
-            # If a participant decides to buy, it will be specified in units of DAI.
-            # If a participant decides to sell, it will be specified in units of tokens.
-            x = participant.sell()
-            if x > 0:
-                total_tokens += x
-                ans[i] = x
+        participants = list(get_participants(network))
+        # If a participant decides to buy, it will be specified in units of DAI.
+        # If a participant decides to sell, it will be specified in units of tokens.
+        idxs = [i for i, _ in participants]
+        sentiment = np.array([participant.sentiment for _, participant in participants], dtype=float)
+        holdings, rows = get_token_batches(network, participants)
+        x = participants_sell(sentiment, holdings, rows, params["probability_func"], params["random_number_func"])
+        sellers = np.flatnonzero(x > 0)
+        ans = dict(zip([idxs[k] for k in sellers], x[sellers].tolist()))
+        total_tokens = sum(ans.values())
 
         # Now that we have the sum of tokens, ask the Commons object how many
         # DAI would be redeemed as a result. This will be inaccurate due
         # to slippage, and we need the result of this policy to be final to
-        # avoid chaining 2 state update functions, so we run the operation on a
-        # throwaway copy of Commons
+        # avoid chaining 2 state update functions, so we only quote the
+        # operation here
         if total_tokens == 0:
             if params.get("debug"):
                 print(
                     "ParticipantSellsTokens: No Participants sold tokens in timestep {}".format(step))
             return {"participant_decisions": ans, "total_tokens": 0, "dai_returned": 0, "realized_price": 0}
+        elif params.get("slippage") == "sequential":
+            # Every Participant sells after the previous one, see
+            # ParticipantBuysTokens.p_decide_to_buy_tokens_bulk()
+            participant_dai, participant_prices = commons.quote_burns(x[sellers])
+            dai = participant_dai.sum()
+            dai_returned = (1 - commons.exit_tribute) * dai if commons.exit_tribute else dai
+            if params.get("debug"):
+                print("ParticipantSellsTokens: These Participants have decided to sell this many tokens: {}, at these "
+                      "prices: {}".format(ans, participant_prices))
+            return {"participant_decisions": ans, "total_tokens": total_tokens, "dai_returned": dai_returned,
+                    "realized_price": dai / total_tokens, "dai_withdrawn": dai,
+                    "participant_dai": dict(zip(ans, participant_dai.tolist())),
+                    "participant_prices": dict(zip(ans, participant_prices.tolist()))}
         else:
-            commons2 = copy.copy(commons)
-            dai_returned, realized_price = commons2.burn(total_tokens)
+            dai_returned, realized_price = commons.quote_burn(total_tokens)
+            if commons.exit_tribute:
+                dai_returned = (1 - commons.exit_tribute) * dai_returned
 
             final_dai_distribution = {}
             for i in ans:
@@ -475,7 +581,10 @@ class ParticipantSellsTokens:
     def su_burn_participants_tokens(params, step, sL, s, _input, **kwargs):
         commons = s["commons"]
 
-        if _input["total_tokens"] > 0:
+        if _input["total_tokens"] > 0 and "participant_dai" in _input:
+            # Already evaluated along the curve by quote_burns()
+            commons.burn(_input["total_tokens"], dai=_input["dai_withdrawn"])
+        elif _input["total_tokens"] > 0:
             dai_returned, realized_price = commons.burn(_input["total_tokens"])
             if _input["dai_returned"] != dai_returned or _input["realized_price"] != realized_price:
                 raise Exception("ParticipantSellsTokens: {} DAI was returned at a price of {} (expected: {} with price {})".format(
@@ -499,15 +608,17 @@ class ParticipantExits:
     @staticmethod
     def p_participant_decides_if_he_wants_to_exit(params, step, sL, s, **kwargs):
         network = s["network"]
-        participants = get_participants(network)
+        participants = list(get_participants(network))
+        sentiment = np.array([participant.sentiment for _, participant in participants], dtype=float)
+        vesting = np.array([participant.holdings.vesting for _, participant in participants], dtype=float)
+        exits = participants_want_to_exit(sentiment, vesting, params["probability_func"])
         defectors = {}
-        for i, participant in participants:
-            e = participant.wants_to_exit()
-            if e:
-                defectors[i] = {
-                    "sentiment": participant.sentiment,
-                    "holdings": participant.holdings.total,
-                }
+        for k in np.flatnonzero(exits):
+            i, participant = participants[k]
+            defectors[i] = {
+                "sentiment": participant.sentiment,
+                "holdings": participant.holdings.total,
+            }
 
         if params.get("debug"):
             print("ParticipantExits: Participants {} (2nd number is their sentiment) want to exit".format(
@@ -520,7 +631,7 @@ class ParticipantExits:
         defectors = _input["defectors"]
 
         for i, _ in defectors.items():
-            network.remove_node(i)
+            network = remove_participant(network, i)
 
         return "network", network
 
@@ -10,12 +10,12 @@ import networkx as nx
 from utils import (new_probability_func, new_exponential_func,
                    new_gamma_func, new_random_number_func,
                    new_choice_func)
-from entities import Proposal, ProposalStatus
+from entities import Participant, ParticipantSupport, Proposal, ProposalStatus
 from hatch import Commons, TokenBatch, VestingOptions
-from network_utils import (add_proposal, bootstrap_network,
-                           calc_total_conviction, get_edges_by_type,
+from network_utils import (add_proposal, bootstrap_network, calc_median_affinity,
+                           calc_total_conviction, find_in_edges_of_type_for_proposal, get_edges_by_type,
                            get_participants, get_proposals,
-                           setup_conflict_edges)
+                           remove_participant, setup_conflict_edges)
 from policies import (ActiveProposals, GenerateNewFunding,
                       GenerateNewParticipant, GenerateNewProposal,
                       ParticipantBuysTokens, ParticipantExits,
@@ -261,6 +261,17 @@ class TestActiveProposals(unittest.TestCase):
         self.assertEqual(network1.nodes[5]
                          ["item"].status, ProposalStatus.COMPLETED)
 
+    def test_su_archive_failed_and_completed_proposals(self):
+        network = copy.copy(self.network)
+        median_affinity = calc_median_affinity(network)
+        _, network = ActiveProposals.su_archive_failed_and_completed_proposals(
+            None, 0, 0, {"network": network, "policy_output": {"failed": [4], "succeeded": []}}, {})
+        self.assertEqual(find_in_edges_of_type_for_proposal(network, 4, "support"), [])
+        self.assertEqual(len(find_in_edges_of_type_for_proposal(network, 5, "support")), 4)
+        self.assertIn(4, network.nodes)
+        self.assertEqual(len(network.graph["archived_support"][4]), 4)
+        self.assertEqual(calc_median_affinity(network), median_affinity)
+
 
 class TestProposalFunding(unittest.TestCase):
     def setUp(self):
@@ -405,14 +416,11 @@ class TestParticipantVoting(unittest.TestCase):
         ans = ParticipantVoting.p_participant_votes_on_proposal_according_to_affinity(
             self.params, 0, 0, {"network": copy.copy(self.network), "funding_pool": 1000, "token_supply": 1000})
 
-        reference = {
-            'participants_stake_on_proposals': {0: {4: 500.0, 5: 500.0},
-                                                1: {4: 500.0, 5: 500.0},
-                                                2: {4: 500.0, 5: 500.0},
-                                                3: {4: 500.0, 5: 500.0}
-                                                }
-        }
-        self.assertEqual(ans, reference)
+        reference = {0: {4: 500.0, 5: 500.0},
+                     1: {4: 500.0, 5: 500.0},
+                     2: {4: 500.0, 5: 500.0},
+                     3: {4: 500.0, 5: 500.0}}
+        self.assertEqual(ans["participants_stake_on_proposals"], reference)
 
     def test_p_participant_votes_on_proposal_according_to_affinity_vesting_nonvesting(self):
         """
@@ -428,14 +436,11 @@ class TestParticipantVoting(unittest.TestCase):
         ans = ParticipantVoting.p_participant_votes_on_proposal_according_to_affinity(
             self.params, 0, 0, {"network": copy.copy(self.network), "funding_pool": 1000, "token_supply": 1000})
 
-        reference = {
-            'participants_stake_on_proposals': {0: {4: 1000.0, 5: 1000.0},
-                                                1: {4: 1000.0, 5: 1000.0},
-                                                2: {4: 1000.0, 5: 1000.0},
-                                                3: {4: 1000.0, 5: 1000.0}
-                                                }
-        }
-        self.assertEqual(ans, reference)
+        reference = {0: {4: 1000.0, 5: 1000.0},
+                     1: {4: 1000.0, 5: 1000.0},
+                     2: {4: 1000.0, 5: 1000.0},
+                     3: {4: 1000.0, 5: 1000.0}}
+        self.assertEqual(ans["participants_stake_on_proposals"], reference)
 
     def test_su_update_participants_votes(self):
         """
@@ -451,6 +456,52 @@ class TestParticipantVoting(unittest.TestCase):
         self.assertEqual(network_copy[0][5]["support"].tokens, 400)
 
 
+    def test_only_changed_participants_vote_again(self):
+        """
+        A Participant is only asked again if its holdings, or the candidate
+        Proposals it supports, changed since the last vote.
+        """
+        def vote():
+            ans = ParticipantVoting.p_participant_votes_on_proposal_according_to_affinity(
+                self.params, 0, 0, {"network": self.network, "funding_pool": 1000, "token_supply": 1000})
+            ParticipantVoting.su_update_participants_votes(
+                self.params, 0, 0, {"network": self.network, "funding_pool": 1000, "token_supply": 1000}, ans)
+            return ans["participants_stake_on_proposals"]
+
+        ans = ParticipantVoting.p_participant_votes_on_proposal_according_to_affinity(
+            self.params, 0, 0, {"network": self.network, "funding_pool": 1000, "token_supply": 1000})
+        self.assertNotIn("votes", self.network.graph)
+        self.assertEqual(ans["votes"], (frozenset([4, 5]), {i: (1000, frozenset([4, 5])) for i in range(4)}))
+
+        self.assertEqual(list(vote()), [0, 1, 2, 3])
+        self.assertEqual(self.network.graph["votes"], ans["votes"])
+        with patch("entities.Participant.skip_voting") as skip_voting:
+            self.assertEqual(vote(), {})
+            self.assertEqual(skip_voting.call_count, 4)
+
+        self.network.nodes[1]["item"].increase_holdings(1000)
+        self.assertEqual(vote(), {1: {4: 1000.0, 5: 1000.0}})
+        self.assertEqual(self.network[1][5]["support"].tokens, 1000)
+
+        # A candidate stops being one
+        self.network.nodes[5]["item"].status = ProposalStatus.ACTIVE
+        self.assertEqual(vote(), {0: {4: 1000.0}, 1: {4: 2000.0}, 2: {4: 1000.0}, 3: {4: 1000.0}})
+        self.assertEqual(vote(), {})
+
+        # A new candidate, only Participant 2 has a support edge to it
+        self.network.add_node(6, item=Proposal(100, 1))
+        self.network.add_edge(2, 6, support=ParticipantSupport(affinity=0.9), type="support")
+        self.assertEqual(vote(), {2: {4: 500.0, 6: 500.0}})
+
+        # A new Participant that gets the index of one that left
+        remove_participant(self.network, 3)
+        self.assertNotIn(3, self.network.graph["votes"][1])
+        self.network.add_node(3, item=Participant(TokenBatch(1000, 0), self.params["probability_func"],
+                                                  self.params["random_number_func"]))
+        self.network.add_edge(3, 4, support=ParticipantSupport(affinity=0.9), type="support")
+        self.assertEqual(vote(), {3: {4: 1000.0}})
+
+
 class TestParticipantBuysTokens(unittest.TestCase):
     def setUp(self):
         self.params = {
@@ -471,8 +522,8 @@ class TestParticipantBuysTokens(unittest.TestCase):
                               "funding_pool": 1000, "token_supply": 1000}
 
     def test_p_decide_to_buy_tokens_bulk(self):
-        with patch("entities.Participant.buy") as p:
-            p.return_value = 1000.0
+        with patch("policies.participants_buy") as p:
+            p.return_value = np.full(4, 1000.0)
             a = ParticipantBuysTokens.p_decide_to_buy_tokens_bulk(
                 self.params, 0, 0, self.default_state)
             decisions = a["participant_decisions"]
@@ -483,8 +534,8 @@ class TestParticipantBuysTokens(unittest.TestCase):
                     final_token_distribution[participant_idx], 0.25)
 
     def test_p_decide_to_buy_tokens_bulk_no_tokens_bought(self):
-        with patch("entities.Participant.buy") as p:
-            p.return_value = 0.0
+        with patch("policies.participants_buy") as p:
+            p.return_value = np.full(4, 0.0)
             a = ParticipantBuysTokens.p_decide_to_buy_tokens_bulk(
                 self.params, 0, 0, self.default_state)
 
@@ -544,6 +595,33 @@ class TestParticipantBuysTokens(unittest.TestCase):
                 network.nodes[i]["item"].holdings.nonvesting, 1362.3724356957946)
 
 
+    def test_sequential_slippage(self):
+        params = dict(self.params, slippage="sequential")
+        with patch("policies.participants_buy") as p:
+            p.return_value = np.full(4, 1000.0)
+            a = ParticipantBuysTokens.p_decide_to_buy_tokens_bulk(params, 0, 0, self.default_state)
+
+        bulk_tokens, _ = self.commons.quote_deposit(4000)
+        self.assertAlmostEqual(a["tokens"], bulk_tokens, places=9)
+        self.assertEqual(list(a["participant_tokens"]), [0, 1, 2, 3])
+        # The first buyer gets the most tokens, at the lowest price
+        prices = list(a["participant_prices"].values())
+        self.assertEqual(prices, sorted(prices))
+        self.assertLess(prices[0], a["token_price"])
+        self.assertGreater(prices[-1], a["token_price"])
+
+        old_token_supply = self.commons._token_supply
+        with patch.object(self.commons.bonding_curve, "deposit") as deposit:
+            _, commons = ParticipantBuysTokens.su_buy_participants_tokens(params, 0, 0, self.default_state, a)
+            deposit.assert_not_called()
+        self.assertEqual(commons._token_supply, old_token_supply + a["tokens"])
+
+        old_holdings = {i: self.network.nodes[i]["item"].holdings.nonvesting for i in a["participant_tokens"]}
+        _, network = ParticipantBuysTokens.su_update_participants_tokens(params, 0, 0, self.default_state, a)
+        for i, tokens in a["participant_tokens"].items():
+            self.assertEqual(network.nodes[i]["item"].holdings.nonvesting, old_holdings[i] + tokens)
+
+
 class TestParticipantSellsTokens(unittest.TestCase):
     def setUp(self):
         self.params = {
@@ -564,8 +642,8 @@ class TestParticipantSellsTokens(unittest.TestCase):
                               "funding_pool": 1000, "token_supply": 1000}
 
     def test_p_decide_to_sell_tokens_bulk(self):
-        with patch("entities.Participant.sell") as p:
-            p.return_value = 20.0
+        with patch("policies.participants_sell") as p:
+            p.return_value = np.full(4, 20.0)
             a = ParticipantSellsTokens.p_decide_to_sell_tokens_bulk(
                 self.params, 0, 0, self.default_state)
 
@@ -579,8 +657,8 @@ class TestParticipantSellsTokens(unittest.TestCase):
             self.assertEqual(a, expected_a)
 
     def test_p_decide_to_sell_tokens_bulk_no_tokens_sold(self):
-        with patch("entities.Participant.sell") as p:
-            p.return_value = 0.0
+        with patch("policies.participants_sell") as p:
+            p.return_value = np.full(4, 0.0)
             a = ParticipantSellsTokens.p_decide_to_sell_tokens_bulk(
                 self.params, 0, 0, self.default_state)
 
@@ -635,6 +713,28 @@ class TestParticipantSellsTokens(unittest.TestCase):
                 network.nodes[i]["item"].holdings.nonvesting, 980.0)
 
 
+    def test_sequential_slippage(self):
+        self.commons.exit_tribute = 0.1
+        params = dict(self.params, slippage="sequential")
+        with patch("policies.participants_sell") as p:
+            p.return_value = np.full(4, 20.0)
+            a = ParticipantSellsTokens.p_decide_to_sell_tokens_bulk(params, 0, 0, self.default_state)
+
+        self.assertAlmostEqual(a["dai_withdrawn"], 122.88, places=9)
+        self.assertEqual(a["dai_returned"], 0.9 * a["dai_withdrawn"])
+        # The first seller gets the best price
+        prices = list(a["participant_prices"].values())
+        self.assertEqual(prices, sorted(prices, reverse=True))
+        self.assertAlmostEqual(sum(a["participant_dai"].values()), a["dai_withdrawn"], places=9)
+
+        old_funding_pool = self.commons._funding_pool
+        with patch.object(self.commons.bonding_curve, "burn") as burn:
+            _, commons = ParticipantSellsTokens.su_burn_participants_tokens(params, 0, 0, self.default_state, a)
+            burn.assert_not_called()
+        self.assertEqual(commons._token_supply, 920.0)
+        self.assertEqual(commons._funding_pool, old_funding_pool + 0.1 * a["dai_withdrawn"])
+
+
 class TestParticipantExits(unittest.TestCase):
     def setUp(self):
         self.params = {
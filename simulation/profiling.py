@@ -0,0 +1,126 @@
+"""
+Profiling hooks for the partial_state_update_blocks: profiled_blocks() wraps
+every policy and state update function so that it counts its calls and times
+them, without touching the functions themselves or the engine that runs them.
+"""
+import time
+import tracemalloc
+from typing import Dict, List, Tuple
+
+
+class Meter:
+    """
+    Accumulates the calls, wall time and (with tracemalloc running) memory of
+    one block or function. peak_bytes is the most memory a single call had
+    allocated at any point, retained_bytes what all calls left allocated.
+
+    Meters nest (a block's Meter runs around its functions' Meters). Every
+    start() resets tracemalloc's peak, so the peak an outer Meter had seen so
+    far is kept in _peak until the inner one stops.
+    """
+    _peak = 0
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.
+        self.peak_bytes = 0
+        self.retained_bytes = 0
+
+    def start(self):
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            self._memory = current
+            self._outer_peak = max(Meter._peak, peak)
+            Meter._peak = current
+            tracemalloc.reset_peak()
+        self._time = time.perf_counter()
+
+    def stop(self):
+        self.seconds += time.perf_counter() - self._time
+        self.calls += 1
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, Meter._peak)
+            self.peak_bytes = max(self.peak_bytes, peak - self._memory)
+            self.retained_bytes += current - self._memory
+            Meter._peak = max(self._outer_peak, peak)
+
+    def as_dict(self, memory=True) -> dict:
+        if not memory:
+            return {"calls": self.calls, "seconds": self.seconds}
+        return {"calls": self.calls, "seconds": self.seconds, "peak_bytes": self.peak_bytes,
+                "retained_bytes": self.retained_bytes}
+
+
+def metered(f, meter: Meter, kind: str):
+    """
+    Wraps the policy (kind "policies") or state update function (kind
+    "variables") f so that every call records itself in meter. The wrappers
+    keep the signatures of such functions: cadCAD tells a state update
+    function's arguments apart by counting them.
+    """
+    if kind == "policies":
+        def policy(params, substep, sH, s, **kwargs):
+            meter.start()
+            try:
+                return f(params, substep, sH, s, **kwargs)
+            finally:
+                meter.stop()
+        return policy
+    if kind == "variables":
+        def state_update(params, substep, sH, s, _input, **kwargs):
+            meter.start()
+            try:
+                return f(params, substep, sH, s, _input, **kwargs)
+            finally:
+                meter.stop()
+        return state_update
+    raise ValueError("kind must be \"policies\" or \"variables\", not {!r}".format(kind))
+
+
+class Profile:
+    """
+    The Meters of every policy and state update function, by block label and
+    then by "policies" or "variables" and name. Blocks that share a label
+    (Sync state variables) share their Meters.
+    """
+
+    def __init__(self):
+        self.meters: Dict[str, Dict[str, Dict[str, Meter]]] = {}
+
+    def meter(self, label: str, kind: str, name: str) -> Meter:
+        block = self.meters.setdefault(label, {"policies": {}, "variables": {}})
+        return block[kind].setdefault(name, Meter())
+
+    def as_dict(self) -> dict:
+        """
+        {label: {"calls": ..., "seconds": ..., "policies": {name: {"calls":
+        ..., "seconds": ...}}, "variables": {...}}}. A block's seconds are
+        those of its functions, its calls the number of times it ran.
+        """
+        profile = {}
+        for label, block in self.meters.items():
+            functions = list(block["policies"].values()) + list(block["variables"].values())
+            profile[label] = {
+                "calls": max([m.calls for m in block["variables"].values()], default=0),
+                "seconds": sum(m.seconds for m in functions),
+                "policies": {name: m.as_dict(memory=False) for name, m in block["policies"].items()},
+                "variables": {name: m.as_dict(memory=False) for name, m in block["variables"].items()},
+            }
+        return profile
+
+
+def profiled_blocks(blocks: List[dict], profile: Profile = None) -> Tuple[List[dict], Profile]:
+    """
+    Returns copies of blocks whose functions record themselves in profile (a
+    new one by default), and profile.
+    """
+    profile = Profile() if profile is None else profile
+    copies = []
+    for block in blocks:
+        copy = dict(block, policies={}, variables={})
+        for kind in ["policies", "variables"]:
+            for name, f in block[kind].items():
+                copy[kind][name] = metered(f, profile.meter(block["label"], kind, name), kind)
+        copies.append(copy)
+    return copies, profile
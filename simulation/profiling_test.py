@@ -0,0 +1,75 @@
+import tracemalloc
+import unittest
+
+from profiling import Meter, metered, profiled_blocks
+from simulation import partial_state_update_blocks
+
+
+def policy(params, substep, sH, s):
+    return {"x": 1}
+
+
+def state_update(params, substep, sH, s, _input):
+    return "x", s["x"] + _input["x"]
+
+
+class TestProfiling(unittest.TestCase):
+    def test_profiled_blocks(self):
+        blocks = [
+            {"label": "Add", "policies": {"one": policy}, "variables": {"x": state_update}},
+            {"label": "Sync", "policies": {}, "variables": {"x": state_update}},
+            {"label": "Sync", "policies": {}, "variables": {"x": state_update}},
+        ]
+        profiled, profile = profiled_blocks(blocks)
+        self.assertEqual(blocks[0]["policies"]["one"], policy)
+        self.assertEqual(profiled[0]["label"], "Add")
+        s = {"x": 0}
+        for _ in range(2):
+            _input = profiled[0]["policies"]["one"](None, 1, [], s)
+            self.assertEqual(profiled[0]["variables"]["x"](None, 1, [], s, _input), ("x", 1))
+            for block in profiled[1:]:
+                block["variables"]["x"](None, 2, [], s, {"x": 2})
+
+        p = profile.as_dict()
+        self.assertEqual(list(p), ["Add", "Sync"])
+        self.assertEqual(p["Add"]["calls"], 2)
+        self.assertEqual(p["Add"]["policies"]["one"]["calls"], 2)
+        self.assertEqual(p["Sync"]["calls"], 4)
+        self.assertEqual(p["Sync"]["policies"], {})
+        self.assertEqual(p["Add"]["seconds"], p["Add"]["policies"]["one"]["seconds"] +
+                         p["Add"]["variables"]["x"]["seconds"])
+
+    def test_signatures(self):
+        """
+        cadCAD picks how to call a state update function from its
+        co_argcount, the wrappers must have the same as the functions.
+        """
+        profiled, _ = profiled_blocks(partial_state_update_blocks)
+        for block, profiled_block in zip(partial_state_update_blocks, profiled):
+            for kind in ["policies", "variables"]:
+                for name, f in block[kind].items():
+                    self.assertEqual(profiled_block[kind][name].__code__.co_argcount, f.__code__.co_argcount,
+                                     "{} {}".format(block["label"], name))
+        self.assertEqual(profiled[1]["variables"]["network"].__code__.co_argcount, 5)
+        with self.assertRaises(ValueError):
+            metered(policy, Meter(), "policy")
+
+    def test_nested_peaks(self):
+        outer, inner = Meter(), Meter()
+
+        def allocate(params, substep, sH, s):
+            return bytearray(10 << 20)
+
+        tracemalloc.start()
+        try:
+            outer.start()
+            x = bytearray(20 << 20)
+            del x
+            metered(allocate, inner, "policies")(None, 1, [], {})
+            outer.stop()
+        finally:
+            tracemalloc.stop()
+        self.assertGreaterEqual(outer.peak_bytes, 20 << 20)
+        self.assertGreaterEqual(inner.peak_bytes, 10 << 20)
+        self.assertLess(inner.peak_bytes, 20 << 20)
+
@@ -12,9 +12,13 @@ class CommonsScore(object):
 
     def __init__(self, params: CommonsSimulationConfiguration, df_final,
                  sigma=130, sigma_token_price=2, sigma_funded=5, penalty=-0.2,
-                 final_sentiment_threshold=0.75, min_sentiment_threshold=0.5):
+                 final_sentiment_threshold=0.75, min_sentiment_threshold=0.5,
+                 last_network=None):
         self.params = params
         self.df_final = df_final
+        # df_final only has a network column when it comes from cadCAD, so
+        # runs without it have to pass the last network in.
+        self.last_network = last_network
         self.sigma = sigma
         self.metrics: Metrics = None
         self.sigma_token_price = sigma_token_price
@@ -131,7 +135,9 @@ class CommonsScore(object):
         '''
             Calculates the final score using all the defined metrics methods in this class
         '''
-        last_network = self.df_final.iloc[-1, 0]
+        last_network = self.last_network
+        if last_network is None:
+            last_network = self.df_final.iloc[-1, 0]
         p_candidates = get_proposals(
             last_network, status=ProposalStatus.CANDIDATE)
         candidates = len(p_candidates)
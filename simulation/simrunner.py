@@ -2,29 +2,49 @@
 # coding: utf-8
 
 import argparse
+import copy
 import json
+import os
+import sys
 from network_utils import get_participants, get_proposals
 
 import pandas as pd
-from cadCAD.configuration import Experiment
-from cadCAD.configuration.utils import config_sim
-from cadCAD.engine import ExecutionContext, ExecutionMode, Executor
-from cadCAD import configs
 
+from cache import DEFAULT_MAX_ENTRIES, ResultCache, open_cache
+from engine import execute, run_in_place, states_in_place
 from entities import ProposalStatus
+from network_history import DEFAULT_KEYFRAME_INTERVAL, NetworkHistory
+from profiling import profiled_blocks
 from score import CommonsScore
+from trajectory import TrajectoryWriter, read_trajectory
 from simulation import (CommonsSimulationConfiguration, bootstrap_simulation,
                         partial_state_update_blocks)
-from utils import new_random_number_func
 
 
-def run_simulation(c: CommonsSimulationConfiguration):
+def run_simulation(c: CommonsSimulationConfiguration, engine="cadcad", blocks=partial_state_update_blocks):
+    """
+    engine="native" runs the partial_state_update_blocks with engine.execute()
+    instead of cadCAD, which gives the same records without cadCAD's setup and
+    per substep overhead.
+    """
     initial_conditions, simulation_parameters = bootstrap_simulation(c)
 
+    if engine == "native":
+        return pd.DataFrame(execute(initial_conditions, simulation_parameters, blocks))
+
+    # Only import cadCAD when it is used, it takes a while.
+    from cadCAD.configuration import Experiment
+    from cadCAD.engine import ExecutionContext, ExecutionMode, Executor
+    from cadCAD import configs
+
+    # Every Experiment appends to cadCAD's module-global configs, and the
+    # Executor runs all of them. A process that runs more than one simulation
+    # (a worker, Monte Carlo replicates, sweep points) must only run this one.
+    del configs[:]
     exp = Experiment()
     exp.append_configs(
         initial_state=initial_conditions,
-        partial_state_update_blocks=partial_state_update_blocks,
+        partial_state_update_blocks=blocks,
         sim_configs=simulation_parameters
     )
 
@@ -39,19 +59,165 @@ def run_simulation(c: CommonsSimulationConfiguration):
     return df
 
 
-def get_simulation_results(c):
-    df = run_simulation(c)
-    df_final = df[df.substep.eq(2)]
-    random_func = new_random_number_func(None)
+def run_simulation_in_place(c: CommonsSimulationConfiguration, snapshot_at=(), blocks=partial_state_update_blocks):
+    """
+    Like run_simulation(), but without cadCAD: a single network and Commons are
+    updated in place, only the scalar state variables are recorded, and full
+    copies of the state are only kept at the (timestep, substep) pairs in
+    snapshot_at. See engine.run_in_place().
+    """
+    initial_conditions, simulation_parameters = bootstrap_simulation(c)
+    return run_in_place(initial_conditions, simulation_parameters, blocks, snapshot_at=snapshot_at)
+
+
+def run_simulation_to_trajectory(c: CommonsSimulationConfiguration, path: str, blocks=partial_state_update_blocks):
+    """
+    Runs c in place, writing the scalar state of every substep to the
+    trajectory in directory path (see trajectory.TrajectoryWriter). Returns a
+    copy of the network at substep 2 of the last timestep, the one the results
+    are made of.
+    """
+    initial_conditions, simulation_parameters = bootstrap_simulation(c)
+    last = (c.timesteps_days, 2)
+    with TrajectoryWriter(path) as writer:
+        for s in states_in_place(initial_conditions, simulation_parameters, blocks):
+            writer.append(s)
+            if (s["timestep"], s["substep"]) == last:
+                network = copy.deepcopy(s["network"])
+    return network
+
+
+def run_simulation_with_history(c: CommonsSimulationConfiguration, substep: int = 2,
+                                keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL,
+                                blocks=partial_state_update_blocks) -> NetworkHistory:
+    """
+    Runs c in place and records the network at the given substep of every
+    timestep, and the initial network as timestep 0, in a NetworkHistory.
+    """
+    initial_conditions, simulation_parameters = bootstrap_simulation(c)
+    history = NetworkHistory(keyframe_interval)
+    for s in states_in_place(initial_conditions, simulation_parameters, blocks):
+        if s["substep"] in (0, substep):
+            history.record(s["timestep"], s["network"])
+    return history
+
+
+REPORTED_COLUMNS = ["timestep", "funding_pool", "token_price", "sentiment"]
+
+
+def get_simulation_results(c, in_place=False, engine="cadcad", cache: ResultCache = None, scalar_only=False,
+                           profile=False, trajectory: str = None):
+    """
+    Returns the result dict of c and the substep 2 records it was built from.
+
+    scalar_only runs in place and only records the columns of the result dict
+    at substep 2, keeping nothing but the last network, so that memory grows
+    with a few floats per timestep. The records then only have those columns.
+
+    With a cache, a configuration that is found in it is not simulated again:
+    its cached result dict is returned, with None instead of the records.
+
+    profile adds the calls and time of every policy and state update function
+    by block label to the result dict, as "profile", see profiling.Profile.
+
+    trajectory runs in place and writes the scalar state of every substep to
+    that directory. The records are then read back from it, memory mapped
+    (see trajectory.read_trajectory()).
+
+    A profiled run, or one that writes a trajectory, is always simulated and
+    not cached.
+    """
+    if profile or trajectory is not None:
+        blocks, run_profile = partial_state_update_blocks, None
+        if profile:
+            blocks, run_profile = profiled_blocks(blocks)
+        result, df_final = _simulate(c, in_place, engine, scalar_only, blocks, trajectory)
+        if profile:
+            result["profile"] = run_profile.as_dict()
+        return result, df_final
+
+    if cache is not None:
+        result = cache.get(c)
+        if result is not None:
+            return result, None
+        result, df_final = _simulate(c, in_place, engine, scalar_only)
+        cache.put(c, result)
+        return result, df_final
+
+    return _simulate(c, in_place, engine, scalar_only)
+
 
-    last_network = df_final.iloc[-1, 0]
+def _simulate(c, in_place, engine, scalar_only, blocks=partial_state_update_blocks, trajectory=None):
+    if trajectory is not None:
+        last_network = run_simulation_to_trajectory(c, trajectory, blocks)
+        df_final = read_trajectory(trajectory, substep=2)
+    elif scalar_only:
+        rows = []
+        for row, network in _reported_rows(c, blocks):
+            rows.append(row)
+        df_final = pd.DataFrame(rows, columns=REPORTED_COLUMNS)
+        last_network = network
+    elif in_place:
+        # The results are taken from the substep 2 records, so that is the
+        # only point where the network is needed.
+        last = (c.timesteps_days, 2)
+        df, snapshots = run_simulation_in_place(c, snapshot_at=[last], blocks=blocks)
+        df_final = df[df.substep.eq(2)]
+        last_network = snapshots[last]["network"]
+    else:
+        df = run_simulation(c, engine=engine, blocks=blocks)
+        df_final = df[df.substep.eq(2)]
+        last_network = df_final.iloc[-1, 0]
+    return summarise_results(c, df_final, last_network), df_final
+
+
+def stream_simulation(c: CommonsSimulationConfiguration):
+    """
+    Runs the simulation in place like get_simulation_results(c, in_place=True),
+    but yields {"timestep": t, "funding_pool": ..., "token_price": ...,
+    "sentiment": ...} as soon as the values that get reported for timestep t
+    are known, and finally {"result": result} with the same result dict as
+    get_simulation_results().
+
+    The reported values are those of substep 2, so the simulation stops right
+    after substep 2 of the last timestep: nothing after it changes the result.
+    """
+    rows = []
+    for row, network in _reported_rows(c):
+        rows.append(row)
+        yield row
+
+    df_final = pd.DataFrame(rows, columns=REPORTED_COLUMNS)
+    yield {"result": summarise_results(c, df_final, network)}
+
+
+def _reported_rows(c: CommonsSimulationConfiguration, blocks=partial_state_update_blocks):
+    """
+    Runs c in place and yields the REPORTED_COLUMNS of every timestep's
+    substep 2, with the network at that point. The network is the one being
+    updated in place, it only stays as it is after the last timestep.
+    """
+    initial_conditions, simulation_parameters = bootstrap_simulation(c)
+    for s in states_in_place(initial_conditions, simulation_parameters, blocks):
+        if s["substep"] != 2:
+            continue
+        yield {k: s[k] for k in REPORTED_COLUMNS}, s["network"]
+        if s["timestep"] == c.timesteps_days:
+            return
+
+
+def summarise_results(c: CommonsSimulationConfiguration, df_final: pd.DataFrame, last_network) -> dict:
+    """
+    Builds the result dict out of the substep 2 records of a run (df_final)
+    and the network at the last of them.
+    """
     candidates = len(get_proposals(last_network, status=ProposalStatus.CANDIDATE))
     actives = len(get_proposals(last_network, status=ProposalStatus.ACTIVE))
     completed = len(get_proposals(last_network, status=ProposalStatus.COMPLETED))
     failed = len(get_proposals(last_network, status=ProposalStatus.FAILED))
     participants = len(get_participants(last_network))
 
-    score = CommonsScore(params=c, df_final=df_final)
+    score = CommonsScore(params=c, df_final=df_final, last_network=last_network)
 
     result = {
         "timestep": list(df_final["timestep"]),
@@ -68,10 +234,10 @@ def get_simulation_results(c):
             "total": candidates + actives + completed + failed
         }
     }
-    return result, df_final
+    return result
 
 
-if __name__ == "__main__":
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
     c_default = CommonsSimulationConfiguration()
     parser.add_argument("--hatchers", type=int, default=c_default.hatchers)
@@ -91,9 +257,111 @@ if __name__ == "__main__":
                         default=c_default.timesteps_days)
     parser.add_argument("--random_seed", type=int,
                         default=c_default.random_seed)
-    args = parser.parse_args()
+    parser.add_argument("--network_backend", choices=["digraph", "array"],
+                        default=c_default.network_backend)
+    parser.add_argument("--support_edges", choices=["dense", "sparse"],
+                        default=c_default.support_edges,
+                        help="Only create the support edges that Participants could ever vote on")
+    parser.add_argument("--slippage", choices=["bulk", "sequential"], default=c_default.slippage,
+                        help="Let the Participants that buy or sell in a timestep share one price, or trade one "
+                             "after the other")
+    parser.add_argument("--legacy_rng", action="store_true",
+                        help="Draw the same random numbers for a random_seed as before the draws were buffered")
+    parser.add_argument("--in_place", action="store_true",
+                        help="Update a single network in place instead of letting cadCAD copy it every substep")
+    parser.add_argument("--engine", choices=["cadcad", "native"], default="cadcad",
+                        help="Run the simulation with cadCAD or with the lightweight native executor")
+    parser.add_argument("--scalar_only", action="store_true",
+                        help="Run in place and only keep what the results are made of")
+    parser.add_argument("--profile", action="store_true",
+                        help="Add the calls and time of every policy and state update function to the result")
+    parser.add_argument("--trajectory", type=str, default=None,
+                        help="Run in place and write the scalar state of every substep to this directory, "
+                             "one memory mapped column per state variable")
+    parser.add_argument("--replicates", type=int, default=None,
+                        help="Run this many Monte Carlo replicates and print their distribution")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Number of processes the replicates run on, all cores by default")
+    parser.add_argument("--stream", action="store_true",
+                        help="Print every timestep's results as a JSON line as soon as they are known")
+    parser.add_argument("--cache_dir", type=str, default=os.environ.get("SIMULATION_CACHE_DIR"),
+                        help="Keep results in this directory and reuse them instead of simulating the same "
+                             "configuration again (defaults to $SIMULATION_CACHE_DIR)")
+    parser.add_argument("--cache_size", type=int,
+                        default=int(os.environ.get("SIMULATION_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+                        help="Number of results the cache keeps, least recently used ones are evicted first")
+    return parser
+
 
-    c = CommonsSimulationConfiguration(**vars(args))
+def _cache_from_args(args: dict):
+    cache_dir = args.pop("cache_dir")
+    cache_size = args.pop("cache_size")
+    return open_cache(cache_dir, cache_size) if cache_dir else None
+
+
+def run_from_args(args: dict) -> dict:
+    """
+    Runs the simulation described by the parsed command line arguments and
+    returns the result dict that the command line prints.
+    """
+    args = dict(args)
+    args.pop("stream")
+    in_place = args.pop("in_place")
+    engine = args.pop("engine")
+    scalar_only = args.pop("scalar_only")
+    profile = args.pop("profile")
+    trajectory = args.pop("trajectory")
+    replicates = args.pop("replicates")
+    processes = args.pop("processes")
+    cache = _cache_from_args(args)
+
+    c = CommonsSimulationConfiguration(**args)
     print("Running sim config", c)
-    o, _ = get_simulation_results(c)
-    print(json.dumps(o))
+    if replicates:
+        from montecarlo import run_monte_carlo
+        return run_monte_carlo(c, replicates, processes=processes, in_place=in_place, engine=engine)
+    o, _ = get_simulation_results(c, in_place=in_place, engine=engine, cache=cache, scalar_only=scalar_only,
+                                  profile=profile, trajectory=trajectory)
+    if cache is not None:
+        print("Result cache", cache.stats())
+    return o
+
+
+def stream_from_args(args: dict):
+    """
+    Like run_from_args(), but yields the events of stream_simulation(). Only
+    the arguments of the configuration itself are used, a stream always runs
+    in place.
+    """
+    args = {k: v for k, v in args.items() if k not in ["stream", "in_place", "engine", "scalar_only", "profile",
+                                                       "trajectory", "replicates", "processes"]}
+    cache = _cache_from_args(args)
+    c = CommonsSimulationConfiguration(**args)
+    print("Running sim config", c, file=sys.stderr)
+    if cache is None:
+        return stream_simulation(c)
+    return _stream_cached(c, cache)
+
+
+def _stream_cached(c: CommonsSimulationConfiguration, cache: ResultCache):
+    result = cache.get(c)
+    if result is not None:
+        for i in range(len(result["timestep"])):
+            yield {k: result[k][i] for k in REPORTED_COLUMNS}
+    else:
+        for event in stream_simulation(c):
+            if "result" not in event:
+                yield event
+        result = event["result"]
+        cache.put(c, result)
+    print("Result cache", cache.stats(), file=sys.stderr)
+    yield {"result": result}
+
+
+if __name__ == "__main__":
+    args = vars(build_parser().parse_args())
+    if args["stream"]:
+        for event in stream_from_args(args):
+            print(json.dumps(event), flush=True)
+    else:
+        print(json.dumps(run_from_args(args)))
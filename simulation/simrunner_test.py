@@ -0,0 +1,69 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from cache import open_cache
+from simrunner import build_parser, get_simulation_results, stream_from_args, stream_simulation
+from simulation import CommonsSimulationConfiguration, partial_state_update_blocks
+from trajectory import read_trajectory
+
+
+class TestGetSimulationResults(unittest.TestCase):
+    def test_scalar_only(self):
+        c = CommonsSimulationConfiguration(random_seed=1, timesteps_days=300)
+        result, df_final = get_simulation_results(c, in_place=True)
+        scalar_result, scalar_df_final = get_simulation_results(
+            CommonsSimulationConfiguration(random_seed=1, timesteps_days=300), scalar_only=True)
+
+        self.assertEqual(scalar_result, result)
+        self.assertEqual(list(scalar_df_final.columns), ["timestep", "funding_pool", "token_price", "sentiment"])
+        self.assertEqual(len(scalar_df_final), 300)
+        np.testing.assert_array_equal(scalar_df_final["sentiment"], df_final["sentiment"])
+
+    def test_profile(self):
+        result, _ = get_simulation_results(CommonsSimulationConfiguration(random_seed=1, timesteps_days=300),
+                                           scalar_only=True)
+        profiled, _ = get_simulation_results(CommonsSimulationConfiguration(random_seed=1, timesteps_days=300),
+                                             scalar_only=True, profile=True)
+        profile = profiled.pop("profile")
+        self.assertEqual(profiled, result)
+
+        voting = profile["Participant votes on proposal according to affinity"]
+        # scalar_only stops right after substep 2 of the last timestep
+        self.assertEqual(voting["calls"], 299)
+        self.assertEqual(voting["policies"]["participants_stake_tokens_on_proposals"]["calls"], 299)
+        self.assertEqual(profile["Sync state variables"]["variables"]["sentiment"]["calls"], 4 * 299)
+        self.assertGreater(voting["seconds"], 0)
+
+    def test_trajectory(self):
+        result, df_final = get_simulation_results(CommonsSimulationConfiguration(random_seed=1, timesteps_days=300),
+                                                  in_place=True)
+        with tempfile.TemporaryDirectory() as path:
+            trajectory_result, trajectory_df_final = get_simulation_results(
+                CommonsSimulationConfiguration(random_seed=1, timesteps_days=300), trajectory=path)
+            self.assertEqual(trajectory_result, result)
+            self.assertEqual(len(trajectory_df_final), 300)
+            for column in ["funding_pool", "token_price", "sentiment"]:
+                np.testing.assert_array_equal(trajectory_df_final[column], df_final[column])
+            self.assertEqual(len(read_trajectory(path)), 1 + 300 * len(partial_state_update_blocks))
+
+
+class TestStreamSimulation(unittest.TestCase):
+    def test_stream_gives_the_same_results(self):
+        events = list(stream_simulation(CommonsSimulationConfiguration(random_seed=1, timesteps_days=300)))
+        result, _ = get_simulation_results(CommonsSimulationConfiguration(random_seed=1, timesteps_days=300),
+                                           in_place=True)
+
+        self.assertEqual(len(events), 301)
+        self.assertEqual(events[-1], {"result": result})
+        for i, event in enumerate(events[:-1]):
+            self.assertEqual(event, {k: result[k][i] for k in ["timestep", "funding_pool", "token_price", "sentiment"]})
+
+    def test_stream_from_cache(self):
+        with tempfile.TemporaryDirectory() as d:
+            argv = ["-T", "300", "--random_seed", "1", "--stream", "--cache_dir", d]
+            events = list(stream_from_args(vars(build_parser().parse_args(argv))))
+            cached = list(stream_from_args(vars(build_parser().parse_args(argv))))
+            self.assertEqual(open_cache(d).stats(), {"hits": 1, "misses": 1})
+        self.assertEqual(cached, events)
@@ -1,4 +1,5 @@
 from typing import Tuple
+import inspect
 import numpy as np
 import copy
 from hatch import (create_token_batches, Commons,
@@ -10,6 +11,7 @@ from policies import (GenerateNewParticipant, GenerateNewProposal,
                       ParticipantVoting, ParticipantSellsTokens,
                       ParticipantBuysTokens, ParticipantExits,
                       ParticipantSentiment)
+from arraynetwork import ArrayNetwork
 from network_utils import bootstrap_network, calc_avg_sentiment
 from utils import (new_probability_func, new_exponential_func, new_gamma_func,
                    new_random_number_func, new_choice_func)
@@ -44,6 +46,20 @@ def update_avg_sentiment(params, step, sL, s, _input):
     s = calc_avg_sentiment(network)
     return "sentiment", s
 
+
+def sync_recomputations_avoided(s: dict) -> dict:
+    """
+    How often the sync_state_variables blocks got the token price and the
+    average sentiment of state s from a cache, because nothing they depend on
+    had changed since they were last computed. The average sentiment is only
+    cached by an ArrayNetwork.
+    """
+    return {
+        "token_price": s["commons"].token_price_recomputations_avoided,
+        "sentiment": getattr(s["network"], "avg_sentiment_recomputations_avoided", 0),
+    }
+
+
 def network_deepcopy(params, step, sL, s, _input):
     network = s["network"]
     return "network", copy.deepcopy(network)
@@ -92,7 +108,11 @@ class CommonsSimulationConfiguration:
                  days_to_80p_of_max_voting_weight=10,
                  max_proposal_request=0.2,
                  timesteps_days=730,
-                 random_seed=None):
+                 random_seed=None,
+                 network_backend="digraph",
+                 support_edges="dense",
+                 slippage="bulk",
+                 legacy_rng=False):
         self.hatchers = hatchers
         self.proposals = proposals
         self.hatch_tribute = hatch_tribute
@@ -109,11 +129,32 @@ class CommonsSimulationConfiguration:
         self.timesteps_days = timesteps_days  # Simulate 2*365=730 days
 
         self.random_seed = random_seed
-        self.probability_func = new_probability_func(random_seed)
-        self.exponential_func = new_exponential_func(random_seed)
-        self.gamma_func = new_gamma_func(random_seed)
-        self.random_number_func = new_random_number_func(random_seed)
-        self.choice_func = new_choice_func(random_seed)
+
+        # "digraph" runs the policies on a networkx DiGraph, "array" on an
+        # ArrayNetwork. Both give the same results for the same random_seed.
+        self.network_backend = network_backend
+
+        # "dense" creates a support edge from every Participant to every
+        # Proposal, "sparse" only those the Participant could ever vote on.
+        # Voting works the same either way, see setup_support_edges().
+        self.support_edges = support_edges
+
+        # "bulk" lets all Participants that buy (or sell) in a timestep share
+        # the realized price of their total, "sequential" has them buy (or
+        # sell) one after the other, so that each one moves the price for the
+        # next.
+        self.slippage = slippage
+
+        # The random number generators draw from numpy Generators by default.
+        # legacy_rng=True draws the same numbers for a random_seed as before
+        # they were buffered, e.g. to reproduce older results.
+        self.legacy_rng = legacy_rng
+
+        self.probability_func = new_probability_func(random_seed, legacy_rng)
+        self.exponential_func = new_exponential_func(random_seed, legacy_rng)
+        self.gamma_func = new_gamma_func(random_seed, legacy_rng)
+        self.random_number_func = new_random_number_func(random_seed, legacy_rng)
+        self.choice_func = new_choice_func(random_seed, legacy_rng)
 
         self.speculation_days = int(.2 * vesting_80p_unlocked) + int(0.6 * vesting_80p_unlocked * self.random_number_func())
         self.multiplier_new_participants = 1 + int(9 * self.random_number_func())
@@ -121,6 +162,15 @@ class CommonsSimulationConfiguration:
     def __repr__(self):
         return "<{} {}>".format(self.__class__.__name__, attrs(self))
 
+    def arguments(self) -> dict:
+        """
+        The keyword arguments this configuration was created with. Unlike the
+        configuration itself (which holds the random number generators), they
+        can be pickled and sent to another process, or changed to create a
+        similar configuration.
+        """
+        return {name: getattr(self, name) for name in inspect.signature(self.__init__).parameters}
+
     def alpha(self) -> float:
         """
         Converts days_to_80p_of_max_voting_weight to alpha.
@@ -149,7 +199,10 @@ def bootstrap_simulation(c: CommonsSimulationConfiguration):
                       hatch_tribute=c.hatch_tribute, exit_tribute=c.exit_tribute, kappa=c.kappa)
     network = bootstrap_network(
         token_batches, c.proposals, commons._funding_pool, commons._token_supply, c.max_proposal_request,
-        c.probability_func, c.random_number_func, c.gamma_func, c.exponential_func)
+        c.probability_func, c.random_number_func, c.gamma_func, c.exponential_func,
+        sparse_support=c.support_edges == "sparse")
+    if c.network_backend == "array":
+        network = ArrayNetwork.from_digraph(network)
 
     initial_conditions = {
         "network": network,
@@ -173,6 +226,7 @@ def bootstrap_simulation(c: CommonsSimulationConfiguration):
             "debug": False,
             "alpha_days_to_80p_of_max_voting_weight": c.alpha(),
             "max_proposal_request": c.max_proposal_request,
+            "slippage": c.slippage,
             "random_seed": c.random_seed,
             "probability_func": c.probability_func,
             "exponential_func": c.exponential_func,
@@ -267,6 +321,13 @@ partial_state_update_blocks = [
             "network": ParticipantExits.su_update_sentiment_when_proposal_becomes_failed_or_completed,
         }
     },
+    {
+        "label": "Archive failed and completed proposals",
+        "policies": {},
+        "variables": {
+            "network": ActiveProposals.su_archive_failed_and_completed_proposals,
+        }
+    },
     {
         "label": "Participant votes on proposal according to affinity",
         "policies": {
@@ -323,4 +384,5 @@ partial_state_update_blocks = [
     },
     sync_state_variables,
     # network_snapshot,  # Enable it only if running an A/B testing or parameter sweep with a no_deepcopy version of cadCAD
+    # (simrunner.run_simulation_with_history() records a compact network_history.NetworkHistory instead)
 ]
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Sweeps the Commons parameters: runs a CommonsSimulationConfiguration for every
+point of a grid (or of a Latin hypercube sample) of hatch_tribute,
+exit_tribute, kappa, vesting_80p_unlocked, days_to_80p_of_max_voting_weight and
+max_proposal_request, on a pool of processes, all in one Python process tree
+instead of one simrunner.py launch per point.
+
+Every finished point is appended to a CSV file as one row (its parameters,
+followed by the summary of its results) as soon as it is done, so a long sweep
+can be inspected while it is still running. A point that fails gets its error
+in the error column, its traceback on stderr, and the sweep says how many
+points failed once it is done (and exits with status 1). With a trajectories directory, the
+scalar state of every substep of every point is kept there as well, see
+trajectory.read_trajectory().
+"""
+import argparse
+import csv
+import itertools
+import os
+import sys
+import traceback
+from multiprocessing import Pool
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from simrunner import get_simulation_results
+from simulation import CommonsSimulationConfiguration
+
+SWEEP_PARAMETERS = {
+    "hatch_tribute": float,
+    "exit_tribute": float,
+    "kappa": int,
+    "vesting_80p_unlocked": int,
+    "days_to_80p_of_max_voting_weight": int,
+    "max_proposal_request": float,
+}
+
+RESULT_COLUMNS = ["score", "participants", "candidates", "actives", "completed", "failed",
+                  "final_funding_pool", "final_token_price", "final_sentiment",
+                  "mean_funding_pool", "mean_token_price", "mean_sentiment", "error"]
+
+
+def grid(ranges: Dict[str, Sequence]) -> List[dict]:
+    """
+    The cartesian product of the values of every parameter.
+    """
+    names = list(ranges)
+    return [dict(zip(names, values)) for values in itertools.product(*[ranges[n] for n in names])]
+
+
+def latin_hypercube(bounds: Dict[str, Tuple[float, float]], samples: int, seed: int = None) -> List[dict]:
+    """
+    samples points where every parameter's [low, high] range is split into
+    samples equal strata and every stratum is used exactly once. Integer
+    parameters are rounded.
+    """
+    random_state = np.random.RandomState(seed)
+    points = [{} for _ in range(samples)]
+    for name, (low, high) in bounds.items():
+        u = (random_state.permutation(samples) + random_state.rand(samples)) / samples
+        values = low + (high - low) * u
+        for point, value in zip(points, values.tolist()):
+            point[name] = round(value) if SWEEP_PARAMETERS.get(name) is int else value
+    return points
+
+
+def summarise(result: dict) -> dict:
+    """
+    Flattens the result dict of get_simulation_results() into one row.
+    """
+    return {
+        "score": result["score"],
+        "participants": result["participants"],
+        "candidates": result["proposals"]["candidates"],
+        "actives": result["proposals"]["actives"],
+        "completed": result["proposals"]["completed"],
+        "failed": result["proposals"]["failed"],
+        "final_funding_pool": result["funding_pool"][-1],
+        "final_token_price": result["token_price"][-1],
+        "final_sentiment": result["sentiment"][-1],
+        "mean_funding_pool": np.mean(result["funding_pool"]),
+        "mean_token_price": np.mean(result["token_price"]),
+        "mean_sentiment": np.mean(result["sentiment"]),
+        "error": "",
+    }
+
+
+def _run_point(job) -> dict:
+    arguments, point, in_place, engine, trajectory = job
+    try:
+        c = CommonsSimulationConfiguration(**dict(arguments, **point))
+        # Only the result dict is kept, an in place run need not record anything else.
+        result, _ = get_simulation_results(c, in_place=in_place, engine=engine, scalar_only=in_place,
+                                           trajectory=trajectory)
+        row = summarise(result)
+    except Exception as e:
+        # One point that cannot be simulated or scored should not throw away
+        # the rest of the sweep, run_sweep() reports it once the sweep is done.
+        traceback.print_exc()
+        row = dict({column: np.nan for column in RESULT_COLUMNS}, error=repr(e))
+    if trajectory is not None:
+        row["trajectory"] = trajectory
+    return dict(point, **row)
+
+
+def run_sweep(c: CommonsSimulationConfiguration, points: List[dict], output: str, processes: int = None,
+              in_place=False, engine="cadcad", trajectories: str = None) -> pd.DataFrame:
+    """
+    Runs c with the parameters of every point replaced, processes points at a
+    time (all cores by default, 1 runs them in this process), appending each
+    finished point as a row of the CSV file output. Rows are written in the
+    order the points finish. Returns all rows once the sweep is done, after
+    printing how many points failed to stderr if any did (their error column
+    is not empty).
+
+    With trajectories, point i is run in place and its trajectory written to
+    the directory trajectories/point-i, which the row's "trajectory" column
+    tells.
+    """
+    jobs = [(c.arguments(), point, in_place, engine,
+             None if trajectories is None else os.path.join(trajectories, "point-{}".format(i)))
+            for i, point in enumerate(points)]
+    columns = list(points[0]) + RESULT_COLUMNS + ([] if trajectories is None else ["trajectory"])
+    rows = []
+
+    with open(output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        f.flush()
+
+        def write(row):
+            writer.writerow(row)
+            f.flush()
+            rows.append(row)
+
+        if processes == 1:
+            for job in jobs:
+                write(_run_point(job))
+        else:
+            with Pool(processes) as pool:
+                for row in pool.imap_unordered(_run_point, jobs):
+                    write(row)
+
+    failed = [row for row in rows if row["error"]]
+    if failed:
+        print("{} of {} points failed, first error: {}".format(len(failed), len(rows), failed[0]["error"]),
+              file=sys.stderr)
+    return pd.DataFrame(rows, columns=columns)
+
+
+def parse_range(s: str, cast) -> List:
+    """
+    "a,b,c" is a list of values, "low:high:num" is num evenly spaced values
+    from low to high, both inclusive.
+    """
+    if ":" in s:
+        low, high, num = s.split(":")
+        return [cast(v) for v in np.linspace(float(low), float(high), int(num)).tolist()]
+    return [cast(v) for v in s.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    c_default = CommonsSimulationConfiguration()
+    for name in SWEEP_PARAMETERS:
+        parser.add_argument("--" + name, type=str, default=None,
+                            help="Values to sweep, either a,b,c or low:high:num")
+    parser.add_argument("--sample", choices=["grid", "lhs"], default="grid",
+                        help="Cartesian product of the values, or a Latin hypercube sample within their min/max")
+    parser.add_argument("--samples", type=int, default=10,
+                        help="Number of points of the Latin hypercube sample")
+    parser.add_argument("--hatchers", type=int, default=c_default.hatchers)
+    parser.add_argument("--proposals", type=int, default=c_default.proposals)
+    parser.add_argument("-T", "--timesteps_days", type=int,
+                        default=c_default.timesteps_days)
+    parser.add_argument("--random_seed", type=int,
+                        default=c_default.random_seed)
+    parser.add_argument("--network_backend", choices=["digraph", "array"],
+                        default=c_default.network_backend)
+    parser.add_argument("--support_edges", choices=["dense", "sparse"],
+                        default=c_default.support_edges,
+                        help="Only create the support edges that Participants could ever vote on")
+    parser.add_argument("--slippage", choices=["bulk", "sequential"], default=c_default.slippage,
+                        help="Let the Participants that buy or sell in a timestep share one price, or trade one "
+                             "after the other")
+    parser.add_argument("--legacy_rng", action="store_true")
+    parser.add_argument("--in_place", action="store_true")
+    parser.add_argument("--engine", choices=["cadcad", "native"], default="cadcad")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--trajectories", type=str, default=None,
+                        help="Also write the trajectory of every point to a directory in this one")
+    parser.add_argument("-o", "--output", type=str, default="sweep.csv")
+    args = parser.parse_args()
+
+    ranges = {name: parse_range(getattr(args, name), cast) for name, cast in SWEEP_PARAMETERS.items()
+              if getattr(args, name) is not None}
+    if not ranges:
+        parser.error("give at least one parameter to sweep")
+    if args.sample == "grid":
+        points = grid(ranges)
+    else:
+        points = latin_hypercube({name: (min(v), max(v)) for name, v in ranges.items()},
+                                 args.samples, args.random_seed)
+
+    c = CommonsSimulationConfiguration(hatchers=args.hatchers, proposals=args.proposals,
+                                       timesteps_days=args.timesteps_days, random_seed=args.random_seed,
+                                       network_backend=args.network_backend, support_edges=args.support_edges,
+                                       slippage=args.slippage, legacy_rng=args.legacy_rng)
+    print("Sweeping {} points, writing to {}".format(len(points), args.output))
+    df = run_sweep(c, points, args.output, processes=args.processes, in_place=args.in_place, engine=args.engine,
+                   trajectories=args.trajectories)
+    if df["error"].astype(bool).any():
+        sys.exit(1)
@@ -0,0 +1,88 @@
+import contextlib
+import importlib.util
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from simulation import CommonsSimulationConfiguration
+from sweep import grid, latin_hypercube, parse_range, run_sweep
+from trajectory import read_trajectory
+
+
+class TestSweep(unittest.TestCase):
+    def test_grid(self):
+        points = grid({"kappa": [2, 3], "exit_tribute": [0.1, 0.2, 0.3]})
+        self.assertEqual(len(points), 6)
+        self.assertEqual(points[0], {"kappa": 2, "exit_tribute": 0.1})
+        self.assertEqual(points[-1], {"kappa": 3, "exit_tribute": 0.3})
+
+    def test_latin_hypercube(self):
+        points = latin_hypercube({"exit_tribute": (0.0, 1.0), "kappa": (1, 10)}, 5, seed=1)
+        self.assertEqual(len(points), 5)
+        # Every fifth of the range is used exactly once
+        strata = sorted(int(p["exit_tribute"] * 5) for p in points)
+        self.assertEqual(strata, [0, 1, 2, 3, 4])
+        self.assertTrue(all(isinstance(p["kappa"], int) and 1 <= p["kappa"] <= 10 for p in points))
+        self.assertEqual(points, latin_hypercube({"exit_tribute": (0.0, 1.0), "kappa": (1, 10)}, 5, seed=1))
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range("2,3,5", int), [2, 3, 5])
+        self.assertEqual(parse_range("0.1:0.3:3", float), [0.1, 0.2, 0.3])
+
+    def test_run_sweep(self):
+        c = CommonsSimulationConfiguration(random_seed=1, timesteps_days=60)
+        points = grid({"exit_tribute": [0.1, 0.5]})
+        with tempfile.TemporaryDirectory() as d:
+            output = os.path.join(d, "sweep.csv")
+            df = run_sweep(c, points, output, processes=1, in_place=True)
+            written = pd.read_csv(output)
+
+        self.assertEqual(list(df["exit_tribute"]), [0.1, 0.5])
+        self.assertEqual(list(written.columns), list(df.columns))
+        np.testing.assert_allclose(written["final_funding_pool"], df["final_funding_pool"])
+        self.assertTrue(written["error"].isna().all())
+
+    @unittest.skipUnless(importlib.util.find_spec("cadCAD"), "cadCAD is not installed")
+    def test_run_sweep_cadcad(self):
+        """
+        Points that run on cadCAD in the same process must not collect the
+        configurations of the ones before them.
+        """
+        c = CommonsSimulationConfiguration(random_seed=1, timesteps_days=60)
+        points = grid({"exit_tribute": [0.1, 0.3, 0.5]})
+        with tempfile.TemporaryDirectory() as d:
+            df = run_sweep(c, points, os.path.join(d, "sweep.csv"), processes=1)
+            in_place = run_sweep(c, points, os.path.join(d, "in_place.csv"), processes=1, in_place=True)
+
+        self.assertEqual(list(df["error"]), ["", "", ""])
+        self.assertEqual(list(df["final_funding_pool"]), list(in_place["final_funding_pool"]))
+        self.assertEqual(list(df["score"]), list(in_place["score"]))
+
+    def test_run_sweep_failures(self):
+        c = CommonsSimulationConfiguration(random_seed=1, timesteps_days=60)
+        points = grid({"exit_tribute": [0.1, 0.5]})
+        stderr = io.StringIO()
+        with tempfile.TemporaryDirectory() as d, contextlib.redirect_stderr(stderr), \
+                patch("sweep.get_simulation_results", side_effect=ValueError("bad point")):
+            df = run_sweep(c, points, os.path.join(d, "sweep.csv"), processes=1, in_place=True)
+
+        self.assertEqual(list(df["error"]), ["ValueError('bad point')"] * 2)
+        self.assertTrue(df["score"].isna().all())
+        self.assertIn("Traceback", stderr.getvalue())
+        self.assertIn("2 of 2 points failed, first error: ValueError('bad point')", stderr.getvalue())
+
+    def test_run_sweep_trajectories(self):
+        c = CommonsSimulationConfiguration(random_seed=1, timesteps_days=60)
+        points = grid({"exit_tribute": [0.1, 0.5]})
+        with tempfile.TemporaryDirectory() as d:
+            df = run_sweep(c, points, os.path.join(d, "sweep.csv"), processes=1,
+                           trajectories=os.path.join(d, "trajectories"))
+            for _, row in df.iterrows():
+                trajectory = read_trajectory(row["trajectory"], substep=2)
+                self.assertEqual(len(trajectory), 60)
+                self.assertEqual(trajectory["funding_pool"].iloc[-1], row["final_funding_pool"])
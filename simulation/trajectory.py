@@ -0,0 +1,108 @@
+"""
+A trajectory is the scalar state of a run (funding_pool, token_price,
+sentiment...) at every substep, stored column by column: a directory with one
+.npy file per column. Unlike a DataFrame holding the network and Commons of
+every substep, it takes a few bytes per substep, and read_trajectory() memory
+maps the columns instead of loading them, so that the trajectories of a large
+sweep can be analysed without holding them all in RAM.
+
+TrajectoryWriter appends to the columns as the simulation goes, so nothing but
+a small buffer is kept in memory while writing either.
+"""
+import os
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+TRAJECTORY_COLUMNS = {
+    "timestep": np.int64,
+    "substep": np.int64,
+    "funding_pool": np.float64,
+    "collateral_pool": np.float64,
+    "token_supply": np.float64,
+    "token_price": np.float64,
+    "sentiment": np.float64,
+}
+
+BUFFERED_ROWS = 4096
+
+
+def _column_path(path: str, column: str) -> str:
+    return os.path.join(path, column + ".npy")
+
+
+def _write_header(f, dtype, rows: int):
+    np.lib.format.write_array_header_1_0(f, {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                             "fortran_order": False, "shape": (rows,)})
+
+
+class TrajectoryWriter:
+    """
+    Appends the TRAJECTORY_COLUMNS of states to the trajectory in directory
+    path. The .npy headers are written again with the final number of rows on
+    close(), use it as a context manager.
+    """
+
+    def __init__(self, path: str, columns: Dict[str, type] = None):
+        self.path = path
+        self.columns = TRAJECTORY_COLUMNS if columns is None else columns
+        self.rows = 0
+        self._buffer = {column: [] for column in self.columns}
+        os.makedirs(path, exist_ok=True)
+        self._files = {}
+        for column, dtype in self.columns.items():
+            f = open(_column_path(path, column), "wb")
+            _write_header(f, dtype, 0)
+            self._files[column] = f
+        # The header is padded to a fixed size, as long as the number of rows
+        # is not absurdly long it can be written again in place.
+        self._data_offset = {column: f.tell() for column, f in self._files.items()}
+
+    def append(self, s: dict):
+        for column, values in self._buffer.items():
+            values.append(s[column])
+        self.rows += 1
+        if len(self._buffer["timestep"]) >= BUFFERED_ROWS:
+            self.flush()
+
+    def flush(self):
+        for column, values in self._buffer.items():
+            np.asarray(values, dtype=self.columns[column]).tofile(self._files[column])
+            values.clear()
+
+    def close(self):
+        self.flush()
+        for column, f in self._files.items():
+            f.seek(0)
+            _write_header(f, self.columns[column], self.rows)
+            if f.tell() != self._data_offset[column]:
+                raise ValueError("The header of {} changed size".format(_column_path(self.path, column)))
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_trajectory(path: str, substep: int = None, columns: List[str] = None) -> pd.DataFrame:
+    """
+    Maps the trajectory in directory path back as a DataFrame whose columns
+    are read-only views of the memory mapped files, nothing is copied.
+
+    With a substep, only the rows of that substep are kept (still without
+    copying: every timestep has the same number of substeps, so they are a
+    strided view), like df[df.substep.eq(substep)] but indexed from 0.
+    """
+    if substep is not None and substep < 1:
+        raise ValueError("Only the initial state has substep 0")
+    columns = list(TRAJECTORY_COLUMNS) if columns is None else columns
+    arrays = {column: np.load(_column_path(path, column), mmap_mode="r") for column in set(columns) | {"timestep"}}
+    if substep is not None:
+        # Row 0 is the initial state, then come the substeps of timestep 1.
+        substeps = int(np.searchsorted(arrays["timestep"], 2)) - 1
+        arrays = {column: a[substep::substeps] for column, a in arrays.items()}
+    # Plain ndarray views of the memmaps, as pandas keeps the subclass.
+    return pd.DataFrame({column: np.asarray(arrays[column]) for column in columns}, copy=False)
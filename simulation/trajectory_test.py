@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from trajectory import TRAJECTORY_COLUMNS, TrajectoryWriter, read_trajectory
+
+
+def is_mapped(a: np.ndarray) -> bool:
+    while a is not None:
+        if isinstance(a, np.memmap):
+            return True
+        a = a.base
+    return False
+
+
+def states(timesteps, substeps):
+    yield {"timestep": 0, "substep": 0, "funding_pool": 0., "collateral_pool": 0., "token_supply": 0.,
+           "token_price": 0., "sentiment": 0.75, "network": None}
+    for t in range(1, timesteps + 1):
+        for s in range(1, substeps + 1):
+            yield {"timestep": t, "substep": s, "funding_pool": t * 100. + s, "collateral_pool": 1., "token_supply": 2.,
+                   "token_price": t / 10, "sentiment": 1 / (t + s), "network": None}
+
+
+class TestTrajectory(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "trajectory")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, timesteps, substeps):
+        with TrajectoryWriter(self.path) as writer:
+            for s in states(timesteps, substeps):
+                writer.append(s)
+        return pd.DataFrame([{k: s[k] for k in TRAJECTORY_COLUMNS} for s in states(timesteps, substeps)])
+
+    def test_read_what_was_written(self):
+        # More rows than are buffered, so that the columns are appended to
+        with patch("trajectory.BUFFERED_ROWS", 7):
+            expected = self.write(10, 5)
+        df = read_trajectory(self.path)
+        pd.testing.assert_frame_equal(df, expected)
+        self.assertEqual(sorted(os.listdir(self.path)), sorted(column + ".npy" for column in TRAJECTORY_COLUMNS))
+
+    def test_zero_copy(self):
+        self.write(10, 5)
+        df = read_trajectory(self.path)
+        values = df["funding_pool"].to_numpy()
+        self.assertTrue(is_mapped(values))
+        self.assertFalse(values.flags.writeable)
+        self.assertEqual(len(np.load(os.path.join(self.path, "funding_pool.npy"), mmap_mode="r")), 51)
+
+    def test_substep(self):
+        expected = self.write(10, 5)
+        for substep in [1, 2, 5]:
+            df = read_trajectory(self.path, substep=substep)
+            pd.testing.assert_frame_equal(df, expected[expected.substep.eq(substep)].reset_index(drop=True))
+            self.assertTrue(is_mapped(df["sentiment"].to_numpy()))
+        self.assertEqual(list(read_trajectory(self.path, substep=2, columns=["sentiment"]).columns), ["sentiment"])
+        with self.assertRaises(ValueError):
+            read_trajectory(self.path, substep=0)
+
+    def test_single_timestep(self):
+        expected = self.write(1, 3)
+        pd.testing.assert_frame_equal(read_trajectory(self.path, substep=3), expected.iloc[[3]].reset_index(drop=True))
@@ -1,47 +1,150 @@
 import numpy as np
 from inspect import getmembers
 from types import FunctionType
-from scipy.stats import expon, gamma
 
 
-
-def new_probability_func(seed):
-    random_state = np.random.RandomState(seed)
+# Every factory below returns a function that serves single draws. Drawing
+# from numpy one value at a time (and even more so through scipy.stats' rvs(),
+# which validates its arguments on every call) is slow, so the draws are taken
+# BUFFER_SIZE at a time and handed out one by one.
+#
+# By default the draws come from a numpy Generator. With legacy=True they come
+# from a np.random.RandomState instead, which reproduces exactly the same
+# sequence as the old one-draw-per-call functions did for the same seed (array
+# draws consume the RandomState the same way as repeated scalar draws).
+BUFFER_SIZE = 1024
+
+
+class BufferedDraws:
+    """
+    Hands out the values of draw(BUFFER_SIZE) one at a time, calling draw again
+    when they have all been used.
+    """
+
+    def __init__(self, draw, size=BUFFER_SIZE):
+        self._draw = draw
+        self._size = size
+        self._buffer = []
+        self._next = 0
+
+    def __call__(self) -> float:
+        if self._next == len(self._buffer):
+            self._buffer = self._draw(self._size).tolist()
+            self._next = 0
+        value = self._buffer[self._next]
+        self._next += 1
+        return value
+
+    def take(self, n: int) -> np.ndarray:
+        """
+        The next n values as an array, the same ones that n calls would have
+        returned.
+        """
+        values = []
+        while len(values) < n:
+            if self._next == len(self._buffer):
+                self._buffer = self._draw(self._size).tolist()
+                self._next = 0
+            end = min(len(self._buffer), self._next + n - len(values))
+            values.extend(self._buffer[self._next:end])
+            self._next = end
+        return np.array(values, dtype=float)
+
+
+def new_random_state(seed, legacy=False):
+    if legacy:
+        return np.random.RandomState(seed)
+    return np.random.default_rng(seed)
+
+
+def _uniform_draws(random_state):
+    if isinstance(random_state, np.random.RandomState):
+        return BufferedDraws(random_state.rand)
+    return BufferedDraws(random_state.random)
+
+
+def new_probability_func(seed, legacy=False):
+    uniform = _uniform_draws(new_random_state(seed, legacy))
     def probability(rate):
         if rate > 1.0:
             raise Exception("Rate has a maximum value of 1.0")
-        return random_state.rand() < rate
+        return uniform() < rate
+    def probabilities(rates: np.ndarray) -> np.ndarray:
+        if np.any(rates > 1.0):
+            raise Exception("Rate has a maximum value of 1.0")
+        return uniform.take(len(rates)) < rates
+    probability.batch = probabilities
     return probability
 
 
-def new_exponential_func(seed):
-    random_state = np.random.RandomState(seed)
+def new_exponential_func(seed, legacy=False):
+    random_state = new_random_state(seed, legacy)
+    standard_exponential = BufferedDraws(lambda size: random_state.standard_exponential(size))
     def exponential(loc, scale):
-        return expon.rvs(loc=loc, scale=scale, random_state=random_state)
+        # This is how expon.rvs(loc=loc, scale=scale) scales its draws.
+        return standard_exponential() * scale + loc
     return exponential
 
 
-def new_gamma_func(seed):
-    random_state = np.random.RandomState(seed)
+def new_gamma_func(seed, legacy=False):
+    random_state = new_random_state(seed, legacy)
+    if legacy:
+        # Buffers for different alphas would share random_state, so they can't
+        # reproduce the old sequence once alpha varies. Gamma draws are rare
+        # (one per proposal), so legacy mode doesn't buffer them at all.
+        def legacy_gamma_func(alpha, loc, scale):
+            return random_state.standard_gamma(alpha) * scale + loc
+        return legacy_gamma_func
+    # alpha is almost always the same, but keep one buffer per alpha in case
+    # it isn't.
+    standard_gammas = {}
     def gamma_func(alpha, loc, scale):
-        return gamma.rvs(alpha, loc=loc, scale=scale, random_state=random_state)
+        if alpha not in standard_gammas:
+            standard_gammas[alpha] = BufferedDraws(lambda size: random_state.standard_gamma(alpha, size))
+        # This is how gamma.rvs(alpha, loc=loc, scale=scale) scales its draws.
+        return standard_gammas[alpha]() * scale + loc
     return gamma_func
 
 
-def new_random_number_func(seed):
-    random_state = np.random.RandomState(seed)
+def new_random_number_func(seed, legacy=False):
+    uniform = _uniform_draws(new_random_state(seed, legacy))
     def random_number_func():
-        return random_state.rand()
+        return uniform()
+    random_number_func.batch = uniform.take
     return random_number_func
 
 
-def new_choice_func(seed):
-    random_state = np.random.RandomState(seed)
+def new_choice_func(seed, legacy=False):
+    # Only called once per timestep with a list of varying length, not worth
+    # buffering.
+    random_state = new_random_state(seed, legacy)
     def choice_func(choice_list):
         return random_state.choice(choice_list)
     return choice_func
 
 
+# The functions above also have a batch attribute that draws many values at once,
+# the same ones that calling them in a loop would. Functions that don't (e.g.
+# stand-ins in tests) are called in a loop instead.
+def probabilities(probability_func, rates: np.ndarray) -> np.ndarray:
+    """
+    One probability_func(rate) per rate, as an array of bools.
+    """
+    rates = np.asarray(rates, dtype=float)
+    if hasattr(probability_func, "batch"):
+        return probability_func.batch(rates)
+    return np.array([bool(probability_func(rate)) for rate in rates], dtype=bool)
+
+
+def random_numbers(random_number_func, n: int) -> np.ndarray:
+    """
+    n random_number_func() draws as an array.
+    """
+    if hasattr(random_number_func, "batch"):
+        return random_number_func.batch(n)
+    return np.array([random_number_func() for _ in range(n)], dtype=float)
+
+
 """
 Helper functions from
 https://stackoverflow.com/questions/192109/is-there-a-built-in-function-to-print-all-the-current-properties-and-values-of-a
@@ -2,6 +2,7 @@ import unittest
 import networkx as nx
 import utils
 import numpy as np
+from unittest.mock import MagicMock
 
 
 class TestUtils(unittest.TestCase):
@@ -33,3 +34,65 @@ class TestUtils(unittest.TestCase):
         count_list = list(range(10))
         result = choice_func(count_list)
         self.assertTrue(result in count_list)
+
+    def test_legacy_draws_reproduce_unbuffered_draws(self):
+        from scipy.stats import expon, gamma
+        n = utils.BUFFER_SIZE + 10
+
+        random_state = np.random.RandomState(1)
+        probability_func = utils.new_probability_func(1, legacy=True)
+        self.assertEqual([probability_func(0.3) for _ in range(n)], [random_state.rand() < 0.3 for _ in range(n)])
+
+        random_state = np.random.RandomState(1)
+        exponential_func = utils.new_exponential_func(1, legacy=True)
+        self.assertEqual([exponential_func(loc=5, scale=100) for _ in range(n)],
+                         [expon.rvs(loc=5, scale=100, random_state=random_state) for _ in range(n)])
+
+        random_state = np.random.RandomState(1)
+        gamma_func = utils.new_gamma_func(1, legacy=True)
+        self.assertEqual([gamma_func(3, loc=0.001, scale=10000) for _ in range(n)],
+                         [gamma.rvs(3, loc=0.001, scale=10000, random_state=random_state) for _ in range(n)])
+
+        random_state = np.random.RandomState(1)
+        gamma_func = utils.new_gamma_func(1, legacy=True)
+        alphas = [3, 2] * (n // 2)
+        self.assertEqual([gamma_func(alpha, loc=0.001, scale=10000) for alpha in alphas],
+                         [gamma.rvs(alpha, loc=0.001, scale=10000, random_state=random_state) for alpha in alphas])
+
+        random_state = np.random.RandomState(1)
+        random_number_func = utils.new_random_number_func(1, legacy=True)
+        self.assertEqual([random_number_func() for _ in range(n)], [random_state.rand() for _ in range(n)])
+
+    def test_draws_are_deterministic_per_seed(self):
+        for factory in [utils.new_random_number_func, lambda seed: lambda: utils.new_exponential_func(seed)(0, 1)]:
+            self.assertEqual(factory(7)(), factory(7)())
+            self.assertNotEqual(factory(7)(), factory(8)())
+        gamma_func_a, gamma_func_b = utils.new_gamma_func(7), utils.new_gamma_func(7)
+        self.assertEqual([gamma_func_a(3, 0, 1) for _ in range(3000)], [gamma_func_b(3, 0, 1) for _ in range(3000)])
+
+    def test_buffered_draws(self):
+        draw = MagicMock(side_effect=lambda size: np.arange(size))
+        buffered = utils.BufferedDraws(draw, size=3)
+        self.assertEqual([buffered() for _ in range(7)], [0, 1, 2, 0, 1, 2, 0])
+        self.assertEqual(draw.call_count, 3)
+        self.assertEqual(buffered.take(4).tolist(), [1, 2, 0, 1])
+        self.assertEqual(buffered(), 2)
+        self.assertEqual(buffered.take(0).tolist(), [])
+
+    def test_batches_draw_the_same_numbers(self):
+        for legacy in [False, True]:
+            random_number_func_a = utils.new_random_number_func(7, legacy)
+            random_number_func_b = utils.new_random_number_func(7, legacy)
+            self.assertEqual(utils.random_numbers(random_number_func_a, 2000).tolist(),
+                             [random_number_func_b() for _ in range(2000)])
+
+            probability_func_a = utils.new_probability_func(7, legacy)
+            probability_func_b = utils.new_probability_func(7, legacy)
+            rates = np.linspace(0, 1, 2000)
+            self.assertEqual(utils.probabilities(probability_func_a, rates).tolist(),
+                             [probability_func_b(rate) for rate in rates])
+
+        with self.assertRaises(Exception):
+            utils.probabilities(utils.new_probability_func(7), np.array([0.5, 1.5]))
+        # Functions without batches are called in a loop
+        self.assertEqual(utils.probabilities(lambda rate: rate > 0.5, np.array([0.2, 0.7])).tolist(), [False, True])
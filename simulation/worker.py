@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+A long-lived simulation worker. server/server.js keeps a pool of these running
+so that a request does not have to pay for starting Python and importing
+pandas/scipy/networkx before it can start simulating.
+
+The protocol is one JSON object per line. The worker reads jobs from stdin:
+
+    {"id": 1, "args": {"hatchers": 5, "timesteps_days": 730, ...}}
+
+where args are the simrunner.py command line arguments (without the leading
+dashes; true means a flag is set), and writes one line per job to stdout:
+
+    {"id": 1, "result": {...}}      the same dict simrunner.py prints
+    {"id": 1, "error": "..."}       if the job could not be run
+
+With "stream": true among the args, every timestep is sent as soon as it is
+known, before the result:
+
+    {"id": 1, "progress": {"timestep": 1, "funding_pool": ..., ...}}
+
+Anything the simulation itself prints goes to stderr, so that stdout only
+carries responses.
+"""
+import contextlib
+import json
+import sys
+import traceback
+from typing import List
+
+from simrunner import build_parser, run_from_args, stream_from_args
+
+
+def to_argv(args: dict) -> List[str]:
+    argv = []
+    for name, value in args.items():
+        if value is True:
+            argv.append("--" + name)
+        elif value is not False and value is not None:
+            argv.extend(["--" + name, str(value)])
+    return argv
+
+
+def handle(job: dict, emit=lambda response: None) -> dict:
+    """
+    Runs a job and returns its final response. Progress responses of streamed
+    jobs are passed to emit as they come.
+    """
+    response = {"id": job.get("id")}
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            args = vars(build_parser().parse_args(to_argv(job.get("args", {}))))
+            if not args["stream"]:
+                response["result"] = run_from_args(args)
+                return response
+            for event in stream_from_args(args):
+                if "result" in event:
+                    response["result"] = event["result"]
+                else:
+                    emit({"id": job.get("id"), "progress": event})
+    except SystemExit:
+        # argparse has already explained what is wrong on stderr
+        response["error"] = "invalid arguments: {}".format(job.get("args"))
+    except Exception as e:
+        traceback.print_exc()
+        response["error"] = repr(e)
+    return response
+
+
+def serve(stdin=sys.stdin, stdout=sys.stdout):
+    def write(response):
+        stdout.write(json.dumps(response) + "\n")
+        stdout.flush()
+
+    for line in stdin:
+        if not line.strip():
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError as e:
+            response = {"id": None, "error": "malformed job: {}".format(e)}
+        else:
+            response = handle(job, emit=write)
+        write(response)
+
+
+if __name__ == "__main__":
+    serve()
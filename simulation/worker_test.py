@@ -0,0 +1,51 @@
+import importlib.util
+import io
+import json
+import unittest
+
+from simrunner import build_parser, run_from_args
+from worker import handle, serve, to_argv
+
+
+class TestWorker(unittest.TestCase):
+    def test_to_argv(self):
+        self.assertEqual(to_argv({"hatchers": 5, "in_place": True, "legacy_rng": False, "random_seed": None}),
+                         ["--hatchers", "5", "--in_place"])
+
+    def test_handle(self):
+        args = {"timesteps_days": 300, "random_seed": 1, "in_place": True}
+        response = handle({"id": 3, "args": args})
+        self.assertEqual(response["id"], 3)
+        self.assertEqual(response["result"], run_from_args(vars(build_parser().parse_args(to_argv(args)))))
+
+        response = handle({"id": 4, "args": {"kappa": "x"}})
+        self.assertEqual(response["id"], 4)
+        self.assertIn("invalid arguments", response["error"])
+        self.assertNotIn("result", response)
+
+    def test_handle_stream(self):
+        progress = []
+        response = handle({"id": 5, "args": {"timesteps_days": 300, "random_seed": 1, "stream": True}},
+                          emit=progress.append)
+        result = handle({"id": 6, "args": {"timesteps_days": 300, "random_seed": 1, "in_place": True}})["result"]
+        self.assertEqual(response, {"id": 5, "result": result})
+        self.assertEqual([p["id"] for p in progress], [5] * 300)
+        self.assertEqual([p["progress"]["sentiment"] for p in progress], result["sentiment"])
+
+    @unittest.skipUnless(importlib.util.find_spec("cadCAD"), "cadCAD is not installed")
+    def test_handle_cadcad_jobs(self):
+        """
+        A worker runs many jobs on cadCAD, each one must only simulate its own
+        configuration.
+        """
+        for job_id in [7, 8]:
+            response = handle({"id": job_id, "args": {"timesteps_days": 60, "random_seed": 1}})
+            self.assertEqual(response["result"]["timestep"], list(range(1, 61)))
+
+    def test_serve(self):
+        stdin = io.StringIO('{"id": 1, "args": {"kappa": "x"}}\n\nnot json\n')
+        stdout = io.StringIO()
+        serve(stdin, stdout)
+        responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([r["id"] for r in responses], [1, None])
+        self.assertTrue(all("error" in r for r in responses))